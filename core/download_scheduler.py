@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Global admission control for downloads.
+
+QueueManager only serializes one user's tasks; this caps the whole bot:
+- DOWNLOAD_GLOBAL_LIMIT jobs at once, plus a per-platform cap
+  (DOWNLOAD_PLATFORM_LIMITS, e.g. "youtube=3,tiktok=2,instagram=2");
+- priority lanes: inline placeholders (LANE_INLINE) go before chat links (LANE_CHAT),
+  which go before background work (LANE_BACKGROUND);
+- inside a lane users are served round-robin, so one user's 20 links don't block
+  everybody else;
+- a waiter can pass on_position(pos) to show its place in the queue; once it gets
+  a slot after a position was shown, on_position(0) is called once.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+LANE_INLINE = 0
+LANE_CHAT = 1
+LANE_BACKGROUND = 2
+_LANES = (LANE_INLINE, LANE_CHAT, LANE_BACKGROUND)
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+def parse_platform_limits(raw: str | None) -> dict[str, int]:
+    limits: dict[str, int] = {}
+    for part in (raw or "").split(","):
+        name, _, value = part.partition("=")
+        name = name.strip().lower()
+        try:
+            if name:
+                limits[name] = max(1, int(value.strip()))
+        except ValueError:
+            continue
+    return limits
+
+
+class _Waiter:
+    __slots__ = ("seq", "lane", "user_key", "platform", "future", "on_position", "last_position")
+
+    def __init__(self, seq: int, lane: int, user_key, platform: str, on_position: PositionCallback | None):
+        self.seq = seq
+        self.lane = lane
+        self.user_key = user_key
+        self.platform = platform
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.on_position = on_position
+        self.last_position: int | None = None
+
+
+class DownloadScheduler:
+    def __init__(self, global_limit: int, platform_limits: dict[str, int] | None = None):
+        self.global_limit = max(1, int(global_limit))
+        self.platform_limits = dict(platform_limits or {})
+        # lane -> user_key -> deque[_Waiter]; OrderedDict order is the round-robin order
+        self._lanes: dict[int, OrderedDict] = {lane: OrderedDict() for lane in _LANES}
+        self._running_total = 0
+        self._running: dict[str, int] = {}
+        self._seq = itertools.count()
+        self._notify_tasks: set[asyncio.Task] = set()
+        self.started = 0
+        self.queued = 0
+
+    def _platform_limit(self, platform: str) -> int:
+        return min(self.global_limit, self.platform_limits.get(platform, self.global_limit))
+
+    def _has_room(self, platform: str) -> bool:
+        return (
+            self._running_total < self.global_limit
+            and self._running.get(platform, 0) < self._platform_limit(platform)
+        )
+
+    def _take(self, platform: str) -> None:
+        self._running_total += 1
+        self._running[platform] = self._running.get(platform, 0) + 1
+        self.started += 1
+
+    def _give_back(self, platform: str) -> None:
+        self._running_total = max(0, self._running_total - 1)
+        left = self._running.get(platform, 0) - 1
+        if left > 0:
+            self._running[platform] = left
+        else:
+            self._running.pop(platform, None)
+        self._pump()
+
+    def _pump(self) -> None:
+        """Hand free slots to waiters: lane by lane, users round-robin, skipping users whose platform is full."""
+        for lane in _LANES:
+            users = self._lanes[lane]
+            progressed = True
+            while progressed and users and self._running_total < self.global_limit:
+                progressed = False
+                for user_key in list(users.keys()):
+                    queue = users[user_key]
+                    waiter = next((w for w in queue if self._has_room(w.platform)), None)
+                    if waiter is None:
+                        continue
+                    queue.remove(waiter)
+                    # Served: this user goes to the back of the rotation.
+                    users.pop(user_key)
+                    if queue:
+                        users[user_key] = queue
+                    self._take(waiter.platform)
+                    waiter.future.set_result(True)
+                    if waiter.on_position is not None and waiter.last_position:
+                        # Started: let the callback drop the "#N" it was showing
+                        waiter.last_position = 0
+                        self._schedule_notify(waiter.on_position, 0)
+                    progressed = True
+                    break
+        self._notify_positions()
+
+    def _positions(self) -> dict[_Waiter, int]:
+        """Estimated 1-based place of every waiter (higher lanes first, round-robin inside a lane)."""
+        positions: dict[_Waiter, int] = {}
+        ahead = 0
+        for lane in _LANES:
+            queues = list(self._lanes[lane].values())
+            for queue in queues:
+                for k, waiter in enumerate(queue):
+                    # k earlier own jobs + up to k+1 jobs of every other user before this one
+                    others = sum(min(len(q), k + 1) for q in queues if q is not queue)
+                    positions[waiter] = ahead + k + others + 1
+            ahead += sum(len(q) for q in queues)
+        return positions
+
+    def _notify_positions(self) -> None:
+        if not any(self._lanes[lane] for lane in _LANES):
+            return
+        for waiter, position in self._positions().items():
+            if waiter.on_position is None or waiter.last_position == position:
+                continue
+            waiter.last_position = position
+            self._schedule_notify(waiter.on_position, position)
+
+    def _schedule_notify(self, callback: PositionCallback, position: int) -> None:
+        task = asyncio.create_task(self._safe_notify(callback, position))
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    @staticmethod
+    async def _safe_notify(callback: PositionCallback, position: int) -> None:
+        try:
+            await callback(position)
+        except Exception as e:
+            logger.debug(f"queue position callback failed: {e}")
+
+    def _remove(self, waiter: _Waiter) -> None:
+        users = self._lanes[waiter.lane]
+        queue = users.get(waiter.user_key)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            users.pop(waiter.user_key, None)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        platform: str,
+        user_id=None,
+        lane: int = LANE_CHAT,
+        on_position: PositionCallback | None = None,
+    ):
+        platform = (platform or "other").lower()
+        lane = lane if lane in self._lanes else LANE_CHAT
+        if self._has_room(platform) and not any(self._lanes[lane_] for lane_ in _LANES if lane_ <= lane):
+            self._take(platform)
+        else:
+            user_key = user_id if user_id is not None else object()
+            waiter = _Waiter(next(self._seq), lane, user_key, platform, on_position)
+            self._lanes[lane].setdefault(user_key, deque()).append(waiter)
+            self.queued += 1
+            self._pump()
+            try:
+                await waiter.future
+            except BaseException:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Slot was granted while we were being cancelled.
+                    self._give_back(platform)
+                else:
+                    self._remove(waiter)
+                    self._notify_positions()
+                raise
+        try:
+            yield
+        finally:
+            self._give_back(platform)
+
+    async def run(self, platform: str, user_id, coro_func, lane: int = LANE_CHAT, on_position: PositionCallback | None = None):
+        async with self.slot(platform, user_id, lane=lane, on_position=on_position):
+            return await coro_func()
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running_total,
+            "limit": self.global_limit,
+            "waiting": sum(len(q) for lane in _LANES for q in self._lanes[lane].values()),
+            "by_platform": dict(self._running),
+            "started": self.started,
+            "queued": self.queued,
+        }
+
+
+def status_position_callback(status_msg) -> PositionCallback | None:
+    """on_position for a "⏳" status message: shows "⏳ #N" while queued, puts the old text back on start."""
+    if status_msg is None:
+        return None
+    original = getattr(status_msg, "text", None) or "⏳"
+    # Edits run as separate tasks; keep them in order so "#N" can't land after the restore
+    lock = asyncio.Lock()
+
+    async def _edit(position: int) -> None:
+        async with lock:
+            await status_msg.edit_text(original if position <= 0 else f"⏳ #{position}")
+
+    return _edit
+
+
+download_scheduler = DownloadScheduler(
+    global_limit=settings.DOWNLOAD_GLOBAL_LIMIT,
+    platform_limits=parse_platform_limits(settings.DOWNLOAD_PLATFORM_LIMITS),
+)
@@ -34,6 +34,38 @@ dp = Dispatcher()
 async def on_startup(bot: Bot):
     logger.info("Bot started successfully and ready to work!")
 
+    try:
+        from services.database.write_behind import activity_buffer, history_writer
+        activity_buffer.start()
+        history_writer.start()
+    except Exception as e:
+        logger.warning(f"Failed to start write-behind buffers: {e}")
+
+    try:
+        from core.loop_monitor import loop_monitor
+        loop_monitor.start()
+    except Exception as e:
+        logger.warning(f"Failed to start loop lag monitor: {e}")
+
+    try:
+        import settings
+        from services.platforms.ytdlp_pool import ytdlp_pool
+        ytdlp_pool.start(warm=settings.YTDLP_POOL_WARM)
+    except Exception as e:
+        logger.warning(f"Failed to start yt-dlp worker pool: {e}")
+
+    try:
+        from services.http_client import http_clients
+        http_clients.start()
+    except Exception as e:
+        logger.warning(f"Failed to open HTTP client sessions: {e}")
+
+    try:
+        from services.database.repo import load_system_settings
+        await load_system_settings()
+    except Exception as e:
+        logger.warning(f"Failed to preload system settings: {e}")
+
     try:
         is_test = bool(getattr(config, "IS_TEST", False))
     except Exception:
@@ -58,4 +90,29 @@ async def on_startup(bot: Bot):
         logger.info(f"Mini App URL for admins: {url}")
 
 async def on_shutdown(bot: Bot):
-    logger.info("Bot is shutting down...")
\ No newline at end of file
+    logger.info("Bot is shutting down...")
+
+    try:
+        from core.loop_monitor import loop_monitor
+        await loop_monitor.stop()
+    except Exception:
+        pass
+
+    try:
+        from services.platforms.ytdlp_pool import ytdlp_pool
+        await ytdlp_pool.close()
+    except Exception as e:
+        logger.warning(f"Failed to stop yt-dlp workers: {e}")
+
+    try:
+        from services.http_client import http_clients
+        await http_clients.close()
+    except Exception as e:
+        logger.warning(f"Failed to close HTTP client sessions: {e}")
+
+    try:
+        from services.database.write_behind import activity_buffer, history_writer
+        await activity_buffer.close()
+        await history_writer.close()
+    except Exception as e:
+        logger.warning(f"Failed to flush write-behind buffers: {e}")
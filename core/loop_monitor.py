@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Event-loop lag sampler for /status.
+
+A background task sleeps `interval` seconds and records how late it woke up.
+Anything blocking the loop (sync DB/file I/O, CPU work in a handler) shows up
+as lag here, separately from DB or Telegram latency.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.5, window: int = 240):
+        self.interval = interval
+        self._samples: deque[float] = deque(maxlen=max(1, int(window)))
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self._samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def snapshot(self) -> dict:
+        """Lag in ms over the sample window (~2 min by default)."""
+        samples = list(self._samples)
+        if not samples:
+            return {"last_ms": None, "avg_ms": None, "max_ms": None}
+        return {
+            "last_ms": samples[-1] * 1000,
+            "avg_ms": sum(samples) / len(samples) * 1000,
+            "max_ms": max(samples) * 1000,
+        }
+
+
+loop_monitor = LoopLagMonitor()
@@ -1,33 +1,116 @@
 import asyncio
-from collections import defaultdict
+import logging
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """У юзера уже USER_QUEUE_MAX_PENDING задач в очереди."""
+
+
+class _UserQueue:
+    __slots__ = ("lock", "pending", "flights")
 
-class QueueManager:
     def __init__(self):
-        # Словарь локов: для каждого user_id свой замок
-        self._locks = defaultdict(asyncio.Lock)
+        self.lock = asyncio.Lock()
+        # Задачи юзера: выполняется + ждут лока
+        self.pending = 0
+        # dedup_key -> future общей задачи (одинаковые ссылки схлопываются)
+        self.flights: dict[str, asyncio.Future] = {}
+
+
+class QueueManager:
+    """Per-user serial queues.
+
+    - не больше max_pending задач на юзера (лишние -> QueueFullError);
+    - запись юзера удаляется, как только очередь опустела, так что словарь не растет;
+    - задача с тем же dedup_key (например, URL), пока первая еще в очереди, не ставится
+      второй раз, а получает результат первой.
+    """
 
-    async def run_serial(self, user_id, coro_func):
+    def __init__(self, max_pending: int = 5):
+        self.max_pending = max(1, int(max_pending))
+        self._queues: dict[object, _UserQueue] = {}
+        self.collapsed = 0
+        self.rejected = 0
+
+    def _enter(self, user_id) -> _UserQueue:
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = _UserQueue()
+        if queue.pending >= self.max_pending:
+            self.rejected += 1
+            raise QueueFullError(f"user {user_id}: {queue.pending} tasks already queued")
+        queue.pending += 1
+        return queue
+
+    def _leave(self, user_id, queue: _UserQueue) -> None:
+        queue.pending -= 1
+        if queue.pending <= 0 and self._queues.get(user_id) is queue:
+            del self._queues[user_id]
+
+    async def _run_locked(self, user_id, queue: _UserQueue, coro_func):
+        try:
+            async with queue.lock:
+                return await coro_func()
+        finally:
+            self._leave(user_id, queue)
+
+    async def run_serial(self, user_id, coro_func, dedup_key: str | None = None):
         """Run a coroutine sequentially per-user, without swallowing exceptions."""
-        lock = self._locks[user_id]
-        async with lock:
-            return await coro_func()
+        if dedup_key is not None:
+            queue = self._queues.get(user_id)
+            flight = queue.flights.get(dedup_key) if queue else None
+            if flight is not None:
+                self.collapsed += 1
+                # shield: отмена одного из ожидающих не отменяет общую задачу
+                return await asyncio.shield(flight)
+
+        queue = self._enter(user_id)
+        if dedup_key is None:
+            return await self._run_locked(user_id, queue, coro_func)
+
+        flight = asyncio.ensure_future(self._run_locked(user_id, queue, coro_func))
+        queue.flights[dedup_key] = flight
 
-    async def process_task(self, user_id, task_func):
+        def _done(fut: asyncio.Future) -> None:
+            if queue.flights.get(dedup_key) is fut:
+                del queue.flights[dedup_key]
+            if not fut.cancelled():
+                fut.exception()  # помечаем как полученное, если все ожидающие ушли
+
+        flight.add_done_callback(_done)
+        return await asyncio.shield(flight)
+
+    async def process_task(self, user_id, task_func, dedup_key: str | None = None):
         """
         Гарантирует, что для одного юзера задачи выполняются по очереди.
         Если юзер отправил 5 ссылок, они обработаются одна за другой.
         """
-        lock = self._locks[user_id]
-        
-        # Если лок занят, бот будет ждать здесь
-        async with lock:
-            try:
-                # Выполняем задачу (скачивание)
-                return await task_func()
-            except Exception as e:
-                print(f"[QUEUE] Error processing task for {user_id}: {e}")
-                # Возвращаем пустые значения, чтобы бот мог отправить сообщение об ошибке
-                return None, None, str(e), None
+        try:
+            return await self.run_serial(user_id, task_func, dedup_key=dedup_key)
+        except Exception as e:
+            logger.warning(f"[QUEUE] Error processing task for {user_id}: {e}")
+            # Возвращаем пустые значения, чтобы бот мог отправить сообщение об ошибке
+            return None, None, str(e), None
+
+    def depth(self, user_id) -> int:
+        queue = self._queues.get(user_id)
+        return queue.pending if queue else 0
+
+    def stats(self) -> dict:
+        depths = [q.pending for q in self._queues.values()]
+        return {
+            "users": len(depths),
+            "pending": sum(depths),
+            "max_depth": max(depths, default=0),
+            "limit": self.max_pending,
+            "collapsed": self.collapsed,
+            "rejected": self.rejected,
+        }
+
 
 # Глобальный экземпляр
-queue_manager = QueueManager()
\ No newline at end of file
+queue_manager = QueueManager(max_pending=settings.USER_QUEUE_MAX_PENDING)
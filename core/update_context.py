@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Per-update snapshot of the acting user/chat DB rows.
+
+RegistrationMiddleware resolves both rows once at the top of the dp.update chain
+and publishes them here (and in handler data as ``db_user`` / ``db_chat``).
+Later middlewares, handlers and repo readers (get_user_language, is_user_banned,
+...) use the snapshot instead of selecting the same row again.
+"""
+from __future__ import annotations
+
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class UpdateContext:
+    user: Any = None
+    chat: Any = None
+    user_is_new: bool = False
+
+
+_current: ContextVar[UpdateContext | None] = ContextVar("update_context", default=None)
+
+
+def begin_update_context(ctx: UpdateContext) -> Token:
+    return _current.set(ctx)
+
+
+def end_update_context(token: Token) -> None:
+    try:
+        _current.reset(token)
+    except Exception:
+        _current.set(None)
+
+
+def current_update_context() -> UpdateContext | None:
+    return _current.get()
+
+
+def get_user_snapshot(entity_id: int):
+    """Return the row resolved for this update if it belongs to entity_id, else None."""
+    ctx = _current.get()
+    if ctx is None:
+        return None
+    for row in (ctx.user, ctx.chat):
+        if row is not None and getattr(row, "id", None) == entity_id:
+            return row
+    return None
+
+
+def patch_user_snapshot(entity_id: int, **fields) -> None:
+    """Keep the snapshot in sync after a write to the same row within this update."""
+    row = get_user_snapshot(entity_id)
+    if row is None:
+        return
+    for key, value in fields.items():
+        try:
+            setattr(row, key, value)
+        except Exception:
+            pass
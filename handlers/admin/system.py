@@ -16,12 +16,14 @@ from aiogram import Router, types, F
 from aiogram.filters import Command, CommandObject
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
 from handlers.admin.filters import AdminFilter
-from services.database.repo import get_all_users
+from services.database.repo import get_all_users, get_basic_user_stats, ping_db
 from services.database.repo import ensure_user_exists, set_system_value
 from services.database.backup import send_db_backup
 from services.database.backup import get_sqlite_db_path
 from services.database.backup import _resolve_db_path
+from services.database.backup import dump_postgres, get_postgres_db_url
 from services.database.core import init_db
+from core.loop_monitor import loop_monitor
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -282,50 +284,123 @@ def _repo_root() -> str:
 BOT_START_TIME = time.time()
 BOT_COMMAND_COUNT = 0
 
+def _count_tempfiles() -> int:
+    if not os.path.exists("tempfiles"):
+        return 0
+    return len([f for f in os.listdir("tempfiles") if os.path.isfile(os.path.join("tempfiles", f))])
+
+
 @router.message(Command("status"))
 async def cmd_status(message: types.Message):
     """Bot status and health check command"""
     try:
         global BOT_COMMAND_COUNT
         
-        users = await get_all_users()
-        count = len(users)
-        active = sum(1 for u in users if u.is_active)
-        banned = sum(1 for u in users if u.is_banned)
-        
+        stats = await get_basic_user_stats()
+
         # Calculate uptime
         uptime_seconds = time.time() - BOT_START_TIME
         uptime_hours = uptime_seconds / 3600
         uptime_days = uptime_hours / 24
-        
-        # Ping calculation
-        start_ping = time.time()
-        # Simulate a small operation
-        await get_all_users()
-        ping = (time.time() - start_ping) * 1000  # in milliseconds
-        
-        # Count temp files (cache)
-        cache_count = 0
-        if os.path.exists("tempfiles"):
-            cache_count = len([f for f in os.listdir("tempfiles") if os.path.isfile(os.path.join("tempfiles", f))])
-        
+
+        # Latency probes: DB round-trip, Telegram API round-trip, event-loop lag
+        async def _timed_get_me() -> float:
+            started = time.perf_counter()
+            await message.bot.get_me()
+            return (time.perf_counter() - started) * 1000
+
+        db_ms, tg_ms = await asyncio.gather(
+            asyncio.wait_for(ping_db(), timeout=5),
+            asyncio.wait_for(_timed_get_me(), timeout=5),
+            return_exceptions=True,
+        )
+        lag = loop_monitor.snapshot()
+
+        def _ms(v) -> str:
+            return "n/a" if v is None or isinstance(v, BaseException) else f"{v:.1f}ms"
+
+        # Count temp files (cache) off the event loop
+        cache_count = await asyncio.to_thread(_count_tempfiles)
+
         # Format uptime
         if uptime_days >= 1:
             uptime_str = f"{int(uptime_days)}d {int(uptime_hours % 24)}h"
         else:
             uptime_str = f"{int(uptime_hours)}h {int((uptime_seconds % 3600) / 60)}m"
 
+        try:
+            from services.database.write_behind import history_writer
+            history_str = (
+                f"🗂 History: flushed {history_writer.flushed}, "
+                f"queued {history_writer.pending_count()}, dropped {history_writer.dropped}\n"
+            )
+        except Exception:
+            history_str = ""
+
+        try:
+            from services.platforms.single_flight import download_flights
+            dl = download_flights.stats()
+            downloads_str = f"📥 Downloads: started {dl['started']}, coalesced {dl['coalesced']}, in flight {dl['in_flight']}\n"
+            from core.download_scheduler import download_scheduler
+            sch = download_scheduler.stats()
+            downloads_str += f"🚦 Scheduler: running {sch['running']}/{sch['limit']}, waiting {sch['waiting']}\n"
+            from services.platforms.http_download import http_stats
+            hs = http_stats.as_dict()
+            downloads_str += (
+                f"🌐 HTTP files: {hs['files']}, {hs['bytes'] / (1024 * 1024):.1f} MB, "
+                f"retries {hs['retries']}, resumed {hs['resumed']}, too big {hs['too_large']}\n"
+            )
+            from core.queue_manager import queue_manager
+            uq = queue_manager.stats()
+            downloads_str += (
+                f"👤 User queues: {uq['users']} users, pending {uq['pending']} (max {uq['max_depth']}/{uq['limit']}), "
+                f"collapsed {uq['collapsed']}, rejected {uq['rejected']}\n"
+            )
+        except Exception:
+            downloads_str = ""
+
+        try:
+            from services.platforms.ytdlp_pool import ytdlp_pool
+            yp = ytdlp_pool.stats()
+            ytdlp_str = f"⚙️ yt-dlp workers: {yp['workers']}/{yp['size']} (idle {yp['idle']}), jobs {yp['completed']}, killed {yp['killed']}\n"
+        except Exception:
+            ytdlp_str = ""
+
+        try:
+            from services.http_client import http_clients
+            hc = http_clients.stats(top=3)
+            http_str = f"🔌 Outbound HTTP: {hc['requests']} req, {hc['errors']} errors\n"
+            for host, h in hc["hosts"].items():
+                http_str += f"   {host}: {h['requests']} req, {h['errors']} err, avg {h['avg_ms']:.0f}ms, max {h['max_ms']:.0f}ms\n"
+        except Exception:
+            http_str = ""
+
+        try:
+            from services.odesli_service import odesli_stats as od
+            http_str += (
+                f"🔗 Odesli: mem {od['memory_hits']}, db {od['db_hits']}, fetched {od['fetched']}, "
+                f"failed {od['failed']}, coalesced {od['coalesced']}, throttled {od['throttled']}\n"
+            )
+        except Exception:
+            pass
+
         text = (
             "🤖 Bot Status\n"
             + ("═" * 25)
             + "\n\n"
-            + f"⏱ Ping: {ping:.2f}ms\n"
+            + f"⏱ DB: {_ms(db_ms)} | Telegram API: {_ms(tg_ms)}\n"
+            + f"🌀 Loop lag: avg {_ms(lag['avg_ms'])}, max {_ms(lag['max_ms'])}\n"
             + f"⏰ Uptime: {uptime_str}\n"
             + f"📊 Commands processed: {BOT_COMMAND_COUNT}\n\n"
-            + f"👥 Users: {count}\n"
-            + f"✅ Active: {active}\n"
-            + f"🚫 Banned: {banned}\n\n"
+            + f"👥 Users: {stats['total']}\n"
+            + f"✅ Active: {stats['active']}\n"
+            + f"🚫 Banned: {stats['banned']}\n"
+            + f"📨 Requests: {stats['request_count']}\n\n"
             + f"💾 Cache files: {cache_count}\n"
+            + history_str
+            + downloads_str
+            + ytdlp_str
+            + http_str
             + f"🐍 Python: {sys.version.split()[0]}"
         )
         await message.reply(text, disable_notification=True)
@@ -494,10 +569,91 @@ def _sqlite_merge_missing_rows(dst_db_path: str, src_db_path: str) -> dict[str,
         con.close()
 
 
+def _importdb_report(inserted: dict[str, int], backup_path: str) -> str:
+    total = sum(inserted.values())
+    if inserted:
+        top = sorted(inserted.items(), key=lambda x: x[1], reverse=True)[:8]
+        details = "\n".join([f"- {k}: +{v}" for k, v in top])
+    else:
+        details = "(no new rows)"
+    return (
+        "✅ DB import finished\n"
+        f"Inserted rows: {total}\n"
+        f"Backup: {backup_path}\n\n"
+        f"{details}"
+    )
+
+
+def _sqlite_read_chunk(src_engine, columns: list, offset: int, limit: int) -> list[dict]:
+    from sqlalchemy import select, text
+
+    with src_engine.connect() as conn:
+        res = conn.execute(select(*columns).order_by(text("rowid")).limit(limit).offset(offset))
+        return [dict(r._mapping) for r in res]
+
+
+async def _postgres_merge_missing_rows(src_db_path: str, batch: int = 500) -> dict[str, int]:
+    """Merge rows from an uploaded sqlite DB into the PostgreSQL DB, inserting only missing ones.
+
+    Same semantics as _sqlite_merge_missing_rows (INSERT ... ON CONFLICT DO NOTHING on
+    common tables/columns). Values are read through the models, so sqlite text dates and
+    0/1 flags arrive as proper datetime/bool. Serial sequences are moved past imported ids.
+    """
+    from sqlalchemy import create_engine, inspect as sa_inspect, text
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from services.database.core import engine
+    from services.database.models import Base
+
+    inserted: dict[str, int] = {}
+    src_engine = create_engine(f"sqlite:///{src_db_path}")
+    try:
+        def _src_columns() -> dict[str, set[str]]:
+            insp = sa_inspect(src_engine)
+            return {t: {c["name"] for c in insp.get_columns(t)} for t in insp.get_table_names()}
+
+        src_columns = await asyncio.to_thread(_src_columns)
+
+        # sorted_tables = FK order (media_cache before user_requests)
+        for table in Base.metadata.sorted_tables:
+            cols = [c for c in table.columns if c.name in src_columns.get(table.name, set())]
+            if not cols:
+                continue
+
+            pk_cols = list(table.primary_key.columns)
+            stmt = pg_insert(table).on_conflict_do_nothing().returning(*pk_cols)
+            offset = 0
+            while True:
+                rows = await asyncio.to_thread(_sqlite_read_chunk, src_engine, cols, offset, batch)
+                if not rows:
+                    break
+                offset += len(rows)
+                async with engine.begin() as conn:
+                    res = await conn.execute(stmt, rows)
+                    delta = len(res.all())
+                if delta:
+                    inserted[table.name] = inserted.get(table.name, 0) + delta
+
+            if table.name in inserted and "id" in table.c:
+                async with engine.begin() as conn:
+                    # NULL sequence (e.g. users.id = Telegram id) makes setval a no-op.
+                    await conn.execute(
+                        text(
+                            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                            f"GREATEST((SELECT COALESCE(MAX(id), 0) FROM \"{table.name}\"), 1))"
+                        )
+                    )
+        return inserted
+    finally:
+        src_engine.dispose()
+
+
 @router.message(Command("importdb"))
 async def cmd_importdb(message: types.Message, command: CommandObject):
     """Admin: merge an uploaded sqlite DB into current DB (adds missing rows only).
 
+    Works for both backends: on PostgreSQL the uploaded sqlite file is merged into the
+    server DB (also the way to move an existing bot.db to Postgres).
+
     Usage:
     - Reply to a .db file with /importdb
     - Or send /importdb with a .db document attached
@@ -529,6 +685,18 @@ async def cmd_importdb(message: types.Message, command: CommandObject):
 
         await init_db()
 
+        pg_url = get_postgres_db_url()
+        if pg_url:
+            ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            backup_dir = os.getenv("DB_BACKUP_DIR") or os.path.join(_repo_root(), "backups")
+            backup_path = os.path.join(backup_dir, f"pg_backup_before_import_{ts}.dump")
+            await dump_postgres(backup_path, pg_url)
+            inserted = await _postgres_merge_missing_rows(tmp_path)
+            # Rows from older files come without derived columns (url_hash); backfill them.
+            await init_db()
+            await message.reply(_importdb_report(inserted, backup_path), disable_notification=True)
+            return
+
         db_path = get_sqlite_db_path()
         if not db_path:
             await message.reply("Cannot determine current DB path.", disable_notification=True)
@@ -544,21 +712,10 @@ async def cmd_importdb(message: types.Message, command: CommandObject):
         await asyncio.to_thread(_sqlite_backup_file, dst_path, backup_path)
 
         inserted = await asyncio.to_thread(_sqlite_merge_missing_rows, dst_path, tmp_path)
+        # Rows from older files come without derived columns (url_hash); backfill them.
+        await init_db()
 
-        total = sum(inserted.values())
-        if inserted:
-            top = sorted(inserted.items(), key=lambda x: x[1], reverse=True)[:8]
-            details = "\n".join([f"- {k}: +{v}" for k, v in top])
-        else:
-            details = "(no new rows)"
-
-        await message.reply(
-            "✅ DB import finished\n"
-            f"Inserted rows: {total}\n"
-            f"Backup: {backup_path}\n\n"
-            f"{details}",
-            disable_notification=True,
-        )
+        await message.reply(_importdb_report(inserted, backup_path), disable_notification=True)
     except Exception as e:
         logger.error(f"Error in /importdb: {e}")
         await message.reply("Error importing DB", disable_notification=True)
@@ -590,7 +747,7 @@ def parse_time_to_seconds(time_str: str) -> int:
 
 
 _TEMPFILES_DIR = "tempfiles"
-_TEMPFILES_PRESERVE_TOP = {"_inline_placeholders"}
+_TEMPFILES_PRESERVE_TOP = {"_inline_placeholders", "_cookies"}
 
 
 def _is_in_preserved_tempfiles_dir(path: str) -> bool:
@@ -712,9 +869,9 @@ async def cmd_clearcache(message: types.Message, command: CommandObject):
         
         if time_arg == "all":
             from services.database.repo import bypass_media_cache_all
-            targeted = await bypass_media_cache_all()
-            await message.answer(f"✅ DB кеш сброшен (помечено записей: {targeted})", disable_notification=True)
-            logger.info(f"Admin {message.from_user.id} bypassed all DB media cache (targeted {targeted})")
+            await bypass_media_cache_all()
+            await message.answer("✅ DB кеш сброшен", disable_notification=True)
+            logger.info(f"Admin {message.from_user.id} bypassed all DB media cache")
         else:
             seconds = parse_time_to_seconds(time_arg)
             if not seconds:
@@ -722,9 +879,9 @@ async def cmd_clearcache(message: types.Message, command: CommandObject):
                 return
 
             from services.database.repo import bypass_media_cache_recent
-            targeted = await bypass_media_cache_recent(int(seconds))
-            await message.answer(f"✅ DB кеш сброшен (помечено записей: {targeted})", disable_notification=True)
-            logger.info(f"Admin {message.from_user.id} bypassed DB media cache recent window={time_arg} (targeted {targeted})")
+            await bypass_media_cache_recent(int(seconds))
+            await message.answer(f"✅ DB кеш сброшен (за {time_arg})", disable_notification=True)
+            logger.info(f"Admin {message.from_user.id} bypassed DB media cache recent window={time_arg}")
     except Exception as e:
         logger.error(f"Error in /clearcache: {e}")
         await message.answer("❌ Ошибка при удалении кеша", disable_notification=True)
@@ -737,16 +894,16 @@ async def handle_cache_button(query: types.CallbackQuery):
         
         if action == "all":
             from services.database.repo import bypass_media_cache_all
-            targeted = await bypass_media_cache_all()
-            await query.answer(f"✅ DB кеш сброшен (записей: {targeted})", show_alert=True)
-            logger.info(f"Admin {query.from_user.id} bypassed all DB media cache via button (targeted {targeted})")
+            await bypass_media_cache_all()
+            await query.answer("✅ DB кеш сброшен", show_alert=True)
+            logger.info(f"Admin {query.from_user.id} bypassed all DB media cache via button")
         else:
             seconds = parse_time_to_seconds(action)
             if seconds:
                 from services.database.repo import bypass_media_cache_recent
-                targeted = await bypass_media_cache_recent(int(seconds))
-                await query.answer(f"✅ DB кеш сброшен (записей: {targeted})", show_alert=True)
-                logger.info(f"Admin {query.from_user.id} bypassed DB media cache via button window={action} (targeted {targeted})")
+                await bypass_media_cache_recent(int(seconds))
+                await query.answer(f"✅ DB кеш сброшен (за {action})", show_alert=True)
+                logger.info(f"Admin {query.from_user.id} bypassed DB media cache via button window={action}")
         
         await query.message.delete()
     except Exception as e:
@@ -5,6 +5,7 @@ import asyncio
 import time
 from handlers.admin.filters import AdminFilter
 from services.platforms.platform_manager import download_content
+from core.download_scheduler import LANE_BACKGROUND
 import logging
 
 logger = logging.getLogger(__name__)
@@ -41,7 +42,7 @@ async def cmd_check(message: types.Message):
             try:
                 await status_msg.edit_text(f"⏳ Checking <b>{platform_name}</b>...", parse_mode="HTML")
                 
-                files, path, error, meta = await download_content(url)
+                files, path, error, meta = await download_content(url, lane=LANE_BACKGROUND)
 
                 if files and not error:
                     report.append(f"✅ <b>{platform_name}</b>: OK")
@@ -7,7 +7,7 @@ from aiogram.filters import Command, CommandObject
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from handlers.admin.filters import AdminFilter
 from services.database.repo import (
-    get_all_users, ban_user, unban_user, 
+    get_users_page, get_basic_user_stats, ban_user, unban_user, 
     get_lastfm_username, increment_request_count
 )
 
@@ -16,6 +16,8 @@ router.message.filter(AdminFilter())
 router.callback_query.filter(AdminFilter())
 logger = logging.getLogger(__name__)
 
+USERS_PAGE_SIZE = 20
+
 
 def _cap(s: str | None, n: int) -> str:
     if not s:
@@ -26,57 +28,49 @@ def _cap(s: str | None, n: int) -> str:
     return s[: max(0, n - 1)] + "…"
 
 
-def _users_kb(page: int, max_page: int) -> InlineKeyboardMarkup:
+def _users_kb(page: int, max_page: int, prev_cursor: str | None, next_cursor: str | None) -> InlineKeyboardMarkup:
+    # Cursor pages: ⬅️/➡️ carry the keyset cursor (see user_pages), the target page is only for the counter.
     page = max(0, min(page, max_page))
-    prev_page = max(0, page - 1)
-    next_page = min(max_page, page + 1)
+    if prev_cursor and page > 0:
+        prev_cb = f"users:p:{page - 1}:{prev_cursor}"
+    else:
+        prev_cb = "users:page:0"
+    next_cb = f"users:n:{page + 1}:{next_cursor}" if next_cursor else "users:noop"
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="⬅️", callback_data=f"users:page:{prev_page}"),
-                InlineKeyboardButton(text=f"{page + 1}/{max_page + 1}", callback_data=f"users:page:{page}"),
-                InlineKeyboardButton(text="➡️", callback_data=f"users:page:{next_page}"),
+                InlineKeyboardButton(text="⬅️", callback_data=prev_cb),
+                InlineKeyboardButton(text=f"{page + 1}/{max_page + 1}", callback_data="users:noop"),
+                InlineKeyboardButton(text="➡️", callback_data=next_cb),
             ]
         ]
     )
 
 
-def _render_users_page(all_users: list, page: int, page_size: int = 20) -> tuple[str, InlineKeyboardMarkup]:
-    # Exclude Telegram system account
-    filtered = [u for u in (all_users or []) if getattr(u, "id", 0) != 777000]
-
-    groups_count = sum(1 for u in filtered if getattr(u, "id", 0) < 0)
-    users_count = sum(1 for u in filtered if getattr(u, "id", 0) > 0)
-    total = len(filtered)
-
-    def _fs(u) -> float:
-        dt = getattr(u, "first_seen", None)
-        try:
-            return float(dt.timestamp()) if dt else 0.0
-        except Exception:
-            return 0.0
+def _render_users_page(page_data: dict, stats: dict, page: int, page_size: int = 20) -> tuple[str, InlineKeyboardMarkup]:
+    items = list(page_data.get("items") or [])
 
-    items: list[object] = sorted(filtered, key=_fs, reverse=True)
-    total_items = len(items)
-    max_page = max(0, (total_items - 1) // page_size) if total_items else 0
+    total = int(stats.get("total") or 0)
+    groups_count = int(stats.get("groups") or 0)
+    users_count = total - groups_count
+    max_page = max(0, (total - 1) // page_size) if total else 0
     page = max(0, min(page, max_page))
     start = page * page_size
-    end = start + page_size
 
     lines = []
     lines.append("📊 <b>Database Report</b>")
     lines.append(f"Всего: {total} (👥 {groups_count} | 👤 {users_count})")
-    lines.append(f"Показано: {start + 1 if total_items else 0}-{min(end, total_items)} из {total_items}")
+    lines.append(f"Показано: {start + 1 if items else 0}-{start + len(items)} из {total}")
     lines.append("")
 
     if not items:
         lines.append("No users found.")
-        return "\n".join(lines), _users_kb(0, 0)
+        return "\n".join(lines), _users_kb(0, 0, None, None)
 
     # Keyboard: navigation row only (no per-user buttons)
-    kb_rows = _users_kb(page, max_page).inline_keyboard
+    kb_rows = _users_kb(page, max_page, page_data.get("prev"), page_data.get("next")).inline_keyboard
 
-    for obj in items[start:end]:
+    for obj in items:
         eid = int(getattr(obj, "id", 0) or 0)
         is_banned = bool(getattr(obj, "is_banned", False))
         status = "❌" if is_banned else "✅"
@@ -109,14 +103,15 @@ def _render_users_page(all_users: list, page: int, page_size: int = 20) -> tuple
 async def cmd_users(message: types.Message):
     """Список всех пользователей"""
     try:
-        users = await get_all_users()
+        page_data = await get_users_page(limit=USERS_PAGE_SIZE)
         await increment_request_count(message.from_user.id)
         
-        if not users:
+        if not page_data["items"]:
             await message.reply("No users found.", disable_notification=True)
             return
 
-        text, kb = _render_users_page(users, page=0, page_size=20)
+        stats = await get_basic_user_stats()
+        text, kb = _render_users_page(page_data, stats, page=0, page_size=USERS_PAGE_SIZE)
         await message.reply(text, reply_markup=kb, disable_notification=True, disable_web_page_preview=True, parse_mode="HTML")
         
         logger.info(f"ADMIN: User {message.from_user.id} used /users command")
@@ -125,16 +120,35 @@ async def cmd_users(message: types.Message):
         await message.reply("Error retrieving users.", disable_notification=True)
 
 
-@router.callback_query(F.data.startswith("users:page:"))
+@router.callback_query(F.data == "users:noop")
+async def cb_users_noop(call: types.CallbackQuery):
+    await call.answer()
+
+
+@router.callback_query(F.data.startswith(("users:page:", "users:n:", "users:p:")))
 async def cb_users_page(call: types.CallbackQuery):
+    # users:page:<n> (first page; older messages used offset pages),
+    # users:n:<page>:<cursor> (next), users:p:<page>:<cursor> (previous)
+    parts = (call.data or "").split(":", 3)
     try:
-        page = int((call.data or "").split(":", 2)[2])
+        kind = parts[1]
+        if kind == "page":
+            page, after, before = 0, None, None
+        elif kind in ("n", "p") and len(parts) == 4:
+            page = int(parts[2])
+            after = parts[3] if kind == "n" else None
+            before = parts[3] if kind == "p" else None
+        else:
+            raise ValueError(kind)
+        page_data = await get_users_page(limit=USERS_PAGE_SIZE, after=after, before=before)
     except Exception:
         await call.answer("Bad page", show_alert=True)
         return
 
-    users = await get_all_users()
-    text, kb = _render_users_page(users, page=page, page_size=20)
+    if before and not page_data["prev"]:
+        page = 0
+    stats = await get_basic_user_stats()
+    text, kb = _render_users_page(page_data, stats, page=page, page_size=USERS_PAGE_SIZE)
     try:
         await call.answer()
         await call.message.edit_text(text, reply_markup=kb, disable_web_page_preview=True, parse_mode="HTML")
@@ -21,12 +21,13 @@ from aiogram.types import (
 # --- V3.0 IMPORTS ---
 from core.loader import bot
 from core.config import config
-from services.platforms.platform_manager import download_content, is_valid_url 
+from services.platforms.platform_manager import download_content, is_valid_url, options_profile
+from core.download_scheduler import LANE_INLINE
 from services.placeholder_service import get_placeholder 
 from services.database.repo import (
-    get_user,
+    get_user_cached,
     get_module_status,
-    get_cached_media,
+    lookup_cached_media,
     upsert_cached_media,
     log_user_request,
     get_user_pref_bool,
@@ -129,7 +130,7 @@ async def inline_query_handler(query: types.InlineQuery):
 
     user_db = None
     try:
-        user_db = await get_user(user_id)
+        user_db = await get_user_cached(user_id)
     except Exception:
         user_db = None
     user_lang = (getattr(user_db, "language", None) or query.from_user.language_code or "en").lower()
@@ -441,9 +442,37 @@ async def chosen_handler(chosen_result: types.ChosenInlineResult):
 
     desired_cache_type = "audio" if (is_music_mode or is_link_audio) else "video"
 
-    # Cache hit: edit inline message without re-downloading.
+    # === НАСТРОЙКИ ЗАГРУЗЧИКА ===
+    is_local = config.USE_LOCAL_SERVER
+    current_limit = LIMIT_LOCAL if is_local else LIMIT_PUBLIC
+
+    custom_opts = {}
+    
+    if is_music_mode or is_link_audio:
+        custom_opts = {
+            'format': 'bestaudio[ext=m4a]/bestaudio/best',
+            'postprocessors': [],
+            'writethumbnail': True,
+            'keepvideo': False
+        }
+    else:
+        # Логика качества для видео
+        if is_local:
+            format_str = 'bestvideo+bestaudio/best' 
+        else:
+            # Пытаемся уложиться в лимит телеграма
+            format_str = 'best[filesize<50M]/bestvideo[filesize<40M]+bestaudio/best[height<=480]/worst'
+        
+        custom_opts = {
+            'format': format_str,
+            'merge_output_format': 'mp4'
+        }
+
+    profile = options_profile(custom_opts)
+
+    # Cache hit (own or shared): edit inline message without re-downloading.
     try:
-        cached = await get_cached_media(user.id, url, desired_cache_type)
+        cached = await lookup_cached_media(user.id, url, desired_cache_type, profile)
     except Exception:
         cached = None
 
@@ -480,34 +509,9 @@ async def chosen_handler(chosen_result: types.ChosenInlineResult):
             # Fall through to download
             pass
 
-    # === НАСТРОЙКИ ЗАГРУЗЧИКА ===
-    is_local = config.USE_LOCAL_SERVER
-    current_limit = LIMIT_LOCAL if is_local else LIMIT_PUBLIC
-
-    custom_opts = {}
-    
-    if is_music_mode or is_link_audio:
-        custom_opts = {
-            'format': 'bestaudio[ext=m4a]/bestaudio/best',
-            'postprocessors': [],
-            'writethumbnail': True,
-            'keepvideo': False
-        }
-    else:
-        # Логика качества для видео
-        if is_local:
-            format_str = 'bestvideo+bestaudio/best' 
-        else:
-            # Пытаемся уложиться в лимит телеграма
-            format_str = 'best[filesize<50M]/bestvideo[filesize<40M]+bestaudio/best[height<=480]/worst'
-        
-        custom_opts = {
-            'format': format_str,
-            'merge_output_format': 'mp4'
-        }
-
     # === ЗАГРУЗКА ===
-    files, folder_path, error, meta = await download_content(url, custom_opts, user_id=user.id)
+    # Inline placeholders jump ahead of chat links in the download queue.
+    files, folder_path, error, meta = await download_content(url, custom_opts, user_id=user.id, lane=LANE_INLINE)
 
     if error:
         try: await bot.edit_message_caption(inline_message_id=inline_msg_id, caption=f"❌ {error}")
@@ -632,7 +636,7 @@ async def chosen_handler(chosen_result: types.ChosenInlineResult):
             # Cache + history
             try:
                 cache_title = meta_title
-                cache = await upsert_cached_media(user.id, url, telegram_file_id, media_type if media_type in ("audio", "video") else desired_cache_type, title=str(cache_title) if cache_title else None)
+                cache = await upsert_cached_media(user.id, url, telegram_file_id, media_type if media_type in ("audio", "video") else desired_cache_type, title=str(cache_title) if cache_title else None, profile=profile)
                 await log_user_request(
                     user.id,
                     kind="inline",
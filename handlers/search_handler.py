@@ -9,17 +9,20 @@ import logging
 import asyncio
 import subprocess
 from aiogram import Router, F, types
-from aiogram.types import FSInputFile, InputMediaPhoto
+from aiogram.types import BufferedInputFile, FSInputFile, InputMediaPhoto
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.enums import ChatAction
 from services.database.repo import (
     add_or_update_user,
     increment_request_count,
     get_cached_media,
+    lookup_cached_media,
     upsert_cached_media,
     log_user_request,
 )
-from services.platforms.platform_manager import download_content, is_valid_url
+from services.platforms.platform_manager import download_content, is_valid_url, options_profile
+from core.download_scheduler import status_position_callback
+from core.update_context import get_user_snapshot
 import settings
 from services.url_cleaner import clean_url
 from services.odesli_service import get_links_by_url
@@ -28,6 +31,15 @@ from core.caption_utils import wrap_tail_in_blockquote
 logger = logging.getLogger(__name__)
 router = Router()
 
+
+def _read_files(paths: list[str]) -> list[bytes]:
+    out = []
+    for p in paths:
+        with open(p, "rb") as f:
+            out.append(f.read())
+    return out
+
+
 CAPTION_MAX_LEN = 1024
 
 # aiogram versions differ: not all ChatAction enums exist (e.g., UPLOAD_AUDIO)
@@ -323,9 +335,24 @@ async def handle_music_selection(cb: types.CallbackQuery, user_lang: str = "en")
     video_id = cb.data.split(":", 2)[2]
     src_url = f"https://youtu.be/{video_id}"
 
-    # Per-user cache (audio)
+    custom_opts = {
+        "format": "bestaudio/best",
+        "noplaylist": True,
+        "writethumbnail": True,
+        "postprocessors": [
+            {
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": "mp3",
+                "preferredquality": "192",
+            }
+        ],
+    }
+
+    profile = options_profile(custom_opts)
+
+    # Per-user cache (audio), then the shared layer
     try:
-        cached = await get_cached_media(cb.from_user.id, src_url, "audio")
+        cached = await lookup_cached_media(cb.from_user.id, src_url, "audio", profile)
     except Exception:
         cached = None
     if cached:
@@ -366,20 +393,9 @@ async def handle_music_selection(cb: types.CallbackQuery, user_lang: str = "en")
     except Exception:
         pulsar = None
 
-    custom_opts = {
-        "format": "bestaudio/best",
-        "noplaylist": True,
-        "writethumbnail": True,
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }
-        ],
-    }
-
-    files, folder, error, meta = await download_content(src_url, custom_opts, user_id=cb.from_user.id)
+    files, folder, error, meta = await download_content(
+        src_url, custom_opts, user_id=cb.from_user.id, on_queue_position=status_position_callback(status)
+    )
     if error:
         if pulsar:
             await pulsar.stop()
@@ -436,7 +452,7 @@ async def handle_music_selection(cb: types.CallbackQuery, user_lang: str = "en")
         try:
             if sent and sent.audio:
                 cache_title = (meta or {}).get("track") or (meta or {}).get("title") or title
-                cache = await upsert_cached_media(cb.from_user.id, src_url, sent.audio.file_id, "audio", title=str(cache_title) if cache_title else None)
+                cache = await upsert_cached_media(cb.from_user.id, src_url, sent.audio.file_id, "audio", title=str(cache_title) if cache_title else None, profile=profile)
                 await log_user_request(
                     cb.from_user.id,
                     kind="callback",
@@ -523,7 +539,9 @@ async def cb_download_ytm_clip(cb: types.CallbackQuery, user_lang: str = "en"):
         'writethumbnail': False,
     }
 
-    files, folder, error, meta = await download_content(src_url, custom_opts, user_id=cb.from_user.id)
+    files, folder, error, meta = await download_content(
+        src_url, custom_opts, user_id=cb.from_user.id, on_queue_position=status_position_callback(status)
+    )
     if error:
         try:
             if status:
@@ -642,8 +660,9 @@ async def message_handler(message: types.Message, user_lang: str = "en"):
         except Exception:
             pulsar = None
         
-        # Обновляем юзера (на всякий случай)
-        await add_or_update_user(message.from_user.id, message.from_user.username, message.from_user.full_name, "")
+        # Обновляем юзера (на всякий случай), если RegistrationMiddleware этого ещё не сделал
+        if get_user_snapshot(message.from_user.id) is None:
+            await add_or_update_user(message.from_user.id, message.from_user.username, message.from_user.full_name, "")
 
         display_url = clean_url(text)
         src_url = display_url
@@ -659,21 +678,55 @@ async def message_handler(message: types.Message, user_lang: str = "en"):
         wants_audio = is_ytm or is_soundcloud or is_spotify
         cache_type = "tiktok_slides" if is_tiktok_photo else ("audio" if wants_audio else "video")
 
+        # YouTube Music / SoundCloud / Spotify should be audio-only
+        if is_ytm:
+            custom_opts = {
+                'format': 'bestaudio/best',
+                'noplaylist': True,
+                'writethumbnail': True,
+                'postprocessors': [
+                    {
+                        'key': 'FFmpegExtractAudio',
+                        'preferredcodec': 'mp3',
+                        'preferredquality': '192',
+                    }
+                ],
+            }
+        elif is_soundcloud or is_spotify:
+            custom_opts = {
+                'format': 'bestaudio/best',
+                'noplaylist': True,
+                'writethumbnail': True,
+                'postprocessors': [
+                    {
+                        'key': 'FFmpegExtractAudio',
+                        'preferredcodec': 'mp3',
+                        'preferredquality': '192',
+                    }
+                ],
+            }
+        else:
+            custom_opts = {
+                'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+                'merge_output_format': 'mp4',
+                'noplaylist': True,
+            }
+        profile = options_profile(custom_opts)
+
         # Cache hit: send without hitting platforms
+        # TikTok short links may not contain /photo/, but we can still cache them as slides.
+        cache_types = [cache_type]
+        if is_tiktok and cache_type != "tiktok_slides":
+            cache_types.append("tiktok_slides")
+
         cached = None
         try:
-            cached = await get_cached_media(message.from_user.id, display_url, cache_type)
+            cached = await lookup_cached_media(message.from_user.id, display_url, cache_types, profile)
+            if cached:
+                cache_type = cached.media_type
         except Exception:
             cached = None
 
-        # TikTok short links may not contain /photo/, but we can still cache them as slides.
-        if not cached and is_tiktok and cache_type != "tiktok_slides":
-            try:
-                cached = await get_cached_media(message.from_user.id, display_url, "tiktok_slides")
-                cache_type = "tiktok_slides" if cached else cache_type
-            except Exception:
-                pass
-
         if cached:
             try:
                 caption = make_caption({"title": cached.title or "Media"}, display_url, links_page=None)
@@ -738,42 +791,57 @@ async def message_handler(message: types.Message, user_lang: str = "en"):
         except Exception:
             pass
 
-        # YouTube Music / SoundCloud / Spotify should be audio-only
-        if is_ytm:
-            custom_opts = {
-                'format': 'bestaudio/best',
-                'noplaylist': True,
-                'writethumbnail': True,
-                'postprocessors': [
-                    {
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }
-                ],
-            }
-        elif is_soundcloud or is_spotify:
-            custom_opts = {
-                'format': 'bestaudio/best',
-                'noplaylist': True,
-                'writethumbnail': True,
-                'postprocessors': [
-                    {
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }
-                ],
-            }
-        else:
-            custom_opts = {
-                'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-                'merge_output_format': 'mp4',
-                'noplaylist': True,
-            }
-        
+        # TikTok carousels: albums go out as soon as their slides are downloaded
+        collected_photo_ids: list[str] = []
+        sent_slides: set[str] = set()
+        slide_uploads: list[asyncio.Task] = []
+
+        async def _send_slide_album(paths: list[str], slide_meta: dict | None, blobs: list[bytes] | None = None) -> None:
+            media = []
+            for i, img in enumerate(paths):
+                cap = make_caption(slide_meta or {}, display_url, links_page=links_page) if not sent_slides and not media else None
+                src = BufferedInputFile(blobs[i], filename=os.path.basename(img)) if blobs else FSInputFile(img)
+                media.append(InputMediaPhoto(media=src, caption=cap, parse_mode="HTML"))
+            if len(media) == 1:
+                # A media group needs at least 2 items
+                msgs = [await message.answer_photo(media[0].media, caption=media[0].caption, parse_mode="HTML")]
+            else:
+                msgs = await message.answer_media_group(media=media)
+            # Basenames: the final result lives in a per-caller copy of the folder (single_flight)
+            sent_slides.update(os.path.basename(p) for p in paths)
+            for m in (msgs or []):
+                try:
+                    if m.photo:
+                        collected_photo_ids.append(m.photo[-1].file_id)
+                except Exception:
+                    pass
+
+        async def _upload_after(prev: asyncio.Task | None, paths: list[str], blobs: list[bytes], slide_meta: dict) -> None:
+            if prev:
+                await asyncio.gather(prev, return_exceptions=True)  # albums keep their order
+            try:
+                await _send_slide_album(paths, slide_meta, blobs)
+            except Exception as e:
+                # Not in sent_slides -> resent below with the rest
+                logger.warning(f"TikTok slide album upload failed: {e}")
+
+        async def _queue_slide_album(paths: list[str], slide_meta: dict | None) -> None:
+            # Called inside the download slot / single-flight leader: only read the slides
+            # (the folder may go to another caller) and leave the upload to a task.
+            blobs = await asyncio.to_thread(_read_files, paths)
+            prev = slide_uploads[-1] if slide_uploads else None
+            slide_uploads.append(asyncio.create_task(_upload_after(prev, paths, blobs, dict(slide_meta or {}))))
+
         # Передаем user_id для кук!
-        files, folder, error, meta = await download_content(src_url, custom_opts, user_id=message.from_user.id)
+        files, folder, error, meta = await download_content(
+            src_url,
+            custom_opts,
+            user_id=message.from_user.id,
+            on_queue_position=status_position_callback(status),
+            on_slide_chunk=_queue_slide_album if is_tiktok else None,
+        )
+        if slide_uploads:
+            await asyncio.gather(*slide_uploads, return_exceptions=True)
         
         if error:
             try:
@@ -807,23 +875,10 @@ async def message_handler(message: types.Message, user_lang: str = "en"):
                 if not images:
                     raise Exception("No images found")
 
-                caption = make_caption(meta or {}, display_url, links_page=links_page)
-
-                collected_photo_ids: list[str] = []
-                for chunk_start in range(0, len(images), 10):
-                    chunk = images[chunk_start:chunk_start + 10]
-                    media = []
-                    for i, img in enumerate(chunk):
-                        cap = caption if (chunk_start == 0 and i == 0) else None
-                        media.append(InputMediaPhoto(media=FSInputFile(img), caption=cap, parse_mode="HTML"))
-
-                    msgs = await message.answer_media_group(media=media)
-                    for m in (msgs or []):
-                        try:
-                            if m.photo:
-                                collected_photo_ids.append(m.photo[-1].file_id)
-                        except Exception:
-                            pass
+                # Whatever on_slide_chunk hasn't sent yet (all of it for a coalesced download)
+                pending = [img for img in images if os.path.basename(img) not in sent_slides]
+                for chunk_start in range(0, len(pending), 10):
+                    await _send_slide_album(pending[chunk_start:chunk_start + 10], meta)
 
                 audio_file_id = None
                 if audio_file:
@@ -839,7 +894,7 @@ async def message_handler(message: types.Message, user_lang: str = "en"):
                 try:
                     payload = json.dumps({"photos": collected_photo_ids, "audio": audio_file_id}, ensure_ascii=False)
                     cache_title = (meta or {}).get("title")
-                    cache = await upsert_cached_media(message.from_user.id, display_url, payload, "tiktok_slides", title=str(cache_title) if cache_title else None)
+                    cache = await upsert_cached_media(message.from_user.id, display_url, payload, "tiktok_slides", title=str(cache_title) if cache_title else None, profile=profile)
                     await log_user_request(
                         message.from_user.id,
                         kind="message_url",
@@ -913,7 +968,7 @@ async def message_handler(message: types.Message, user_lang: str = "en"):
                 try:
                     if sent and sent.video:
                         cache_title = (meta or {}).get("title")
-                        cache = await upsert_cached_media(message.from_user.id, display_url, sent.video.file_id, "video", title=str(cache_title) if cache_title else None)
+                        cache = await upsert_cached_media(message.from_user.id, display_url, sent.video.file_id, "video", title=str(cache_title) if cache_title else None, profile=profile)
                         await log_user_request(
                             message.from_user.id,
                             kind="message_url",
@@ -967,7 +1022,7 @@ async def message_handler(message: types.Message, user_lang: str = "en"):
                 try:
                     if sent and sent.audio:
                         cache_title = (meta or {}).get("track") or (meta or {}).get("title") or title
-                        cache = await upsert_cached_media(message.from_user.id, display_url, sent.audio.file_id, "audio", title=str(cache_title) if cache_title else None)
+                        cache = await upsert_cached_media(message.from_user.id, display_url, sent.audio.file_id, "audio", title=str(cache_title) if cache_title else None, profile=profile)
                         await log_user_request(
                             message.from_user.id,
                             kind="message_url",
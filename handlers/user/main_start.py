@@ -4,6 +4,7 @@ from aiogram import Router, F, types
 from aiogram.filters import CommandStart
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from services.database.repo import add_or_update_user, set_user_language, get_user, get_module_status
+from core.update_context import current_update_context
 from services.localization import LocalizationService
 from settings import MODULES_LIST, BOT_COMMANDS_LIST, ADMIN_IDS
 
@@ -80,19 +81,24 @@ async def cmd_start(message: types.Message):
         
         user = message.from_user
         
-        # Проверяем, есть ли юзер в базе
-        db_user = await get_user(user.id)
+        # Проверяем, есть ли юзер в базе (RegistrationMiddleware уже загрузил/создал строку)
+        ctx = current_update_context()
+        if ctx is not None and ctx.user is not None:
+            db_user = None if ctx.user_is_new else ctx.user
+        else:
+            db_user = await get_user(user.id)
 
         # Если юзера нет - предлагаем выбор языка
         if not db_user:
             # Регистрируем с дефолтным языком (en)
-            await add_or_update_user(
-                user.id, 
-                user.username, 
-                user.full_name or "User",
-                "",
-                language="en"
-            )
+            if ctx is None or ctx.user is None:
+                await add_or_update_user(
+                    user.id, 
+                    user.username, 
+                    user.full_name or "User",
+                    "",
+                    language="en"
+                )
             
             # Предлагаем выбор языка
             kb = InlineKeyboardBuilder()
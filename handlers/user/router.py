@@ -2,6 +2,7 @@
 import logging
 from aiogram import Router, types
 from services.database.repo import add_or_update_user, is_user_banned
+from core.update_context import get_user_snapshot
 from core.config import config
 
 logger = logging.getLogger(__name__)
@@ -23,14 +24,16 @@ async def check_access_and_update(user: types.User, message: types.Message | Non
         
         tag = f"@{username}" if username else ""
 
-        # Update user in database
-        db_user = await add_or_update_user(
-            user_id=user_id,
-            username=username,
-            full_name=full_name,
-            tag=tag,
-            language=language_code
-        )
+        # Row already refreshed by RegistrationMiddleware for this update
+        db_user = get_user_snapshot(user_id)
+        if db_user is None:
+            db_user = await add_or_update_user(
+                user_id=user_id,
+                username=username,
+                full_name=full_name,
+                tag=tag,
+                language=language_code
+            )
 
         # Check if banned
         if db_user.is_banned:
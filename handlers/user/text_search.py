@@ -11,6 +11,7 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFil
 
 from services.search_service import search_youtube
 from services.platforms.platform_manager import download_content
+from core.download_scheduler import status_position_callback
 from services.odesli_service import get_links_by_url
 from handlers.search_handler import make_caption
 from services.database.repo import get_cached_media, upsert_cached_media, log_user_request
@@ -165,7 +166,9 @@ async def yt_pick_download(cb: types.CallbackQuery):
         ],
     }
 
-    files, folder, error, meta = await download_content(src_url, custom_opts, user_id=cb.from_user.id)
+    files, folder, error, meta = await download_content(
+        src_url, custom_opts, user_id=cb.from_user.id, on_queue_position=status_position_callback(status)
+    )
     if error:
         if pulsar:
             await pulsar.stop()
@@ -20,7 +20,7 @@ from aiohttp.client_exceptions import ClientResponseError
 from core.config import config
 from services.database.repo import is_user_banned, increment_request_count, upsert_cached_media, log_user_request
 from services.platforms.TelegramDownloader.workflow import fix_local_path
-from core.queue_manager import queue_manager
+from core.queue_manager import queue_manager, QueueFullError
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -35,6 +35,12 @@ def _t(user_lang: str, key: str) -> str:
             if lang == "ru"
             else "❌ Video is too large. Telegram doesn't allow bots to download such files (limit is ~20MB).\nSend a video smaller than ~20MB."
         )
+    if key == "queue_full":
+        return (
+            "⏳ Слишком много видео в очереди, дождись обработки предыдущих."
+            if lang == "ru"
+            else "⏳ Too many videos in the queue, wait for the previous ones to finish."
+        )
     if key == "generic_error":
         return "❌ Ошибка обработки видео" if lang == "ru" else "❌ Error processing video"
     return ""
@@ -424,7 +430,10 @@ async def process_video(message: types.Message, user_lang: str = "en"):
                 except Exception:
                     pass
 
-    await queue_manager.run_serial(user.id, _run)
+    try:
+        await queue_manager.run_serial(user.id, _run, dedup_key=f"video_note:{file_unique_id or file_id}")
+    except QueueFullError:
+        await safe_reply(message, _t(user_lang, "queue_full"), disable_notification=True)
 
 
 @router.message(VideoNoteState.recording, F.document)
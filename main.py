@@ -16,6 +16,7 @@ from services.database.core import init_db
 from services.placeholder_service import ensure_placeholders
 from services.oauth_server import OAuthServer
 from services.database.backup import run_periodic_db_backup
+from services.database.maintenance import run_periodic_db_maintenance
 from core.error_reporter import ErrorReporter
 from services.tavern_renamer import schedule_tavern_renamer
 
@@ -120,15 +121,17 @@ async def main():
     oauth_server = OAuthServer(bot)
 
     _db_backup_task: asyncio.Task | None = None
+    _db_maintenance_task: asyncio.Task | None = None
     _tavern_renamer_task: asyncio.Task | None = None
 
     async def _oauth_startup(*args, **kwargs):
         await oauth_server.start()
 
     async def _backup_startup(*args, **kwargs):
-        nonlocal _db_backup_task, _tavern_renamer_task
+        nonlocal _db_backup_task, _db_maintenance_task, _tavern_renamer_task
         try:
             _db_backup_task = asyncio.create_task(run_periodic_db_backup(bot))
+            _db_maintenance_task = asyncio.create_task(run_periodic_db_maintenance(bot))
             _tavern_renamer_task = asyncio.create_task(schedule_tavern_renamer(bot))
 
             def _report_task_exception(t: asyncio.Task):
@@ -145,6 +148,7 @@ async def main():
                         pass
 
             _db_backup_task.add_done_callback(_report_task_exception)
+            _db_maintenance_task.add_done_callback(_report_task_exception)
         except Exception as e:
             logger.error(f"Failed to start DB backup task: {e}")
             try:
@@ -156,7 +160,7 @@ async def main():
         await oauth_server.stop()
 
     async def _backup_shutdown(*args, **kwargs):
-        nonlocal _db_backup_task, _tavern_renamer_task
+        nonlocal _db_backup_task, _db_maintenance_task, _tavern_renamer_task
         if _db_backup_task:
             _db_backup_task.cancel()
             try:
@@ -164,6 +168,13 @@ async def main():
             except Exception:
                 pass
             _db_backup_task = None
+        if _db_maintenance_task:
+            _db_maintenance_task.cancel()
+            try:
+                await _db_maintenance_task
+            except Exception:
+                pass
+            _db_maintenance_task = None
         if _tavern_renamer_task:
             _tavern_renamer_task.cancel()
             try:
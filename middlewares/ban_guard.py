@@ -6,7 +6,7 @@ from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware, types
 from aiogram.types import TelegramObject
 
-from services.database.repo import get_user
+from services.database.repo import get_user_cached
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +61,7 @@ class BanGuardMiddleware(BaseMiddleware):
             if chat is not None and isinstance(getattr(chat, "id", None), int):
                 chat_id = int(chat.id)
                 if chat_id < 0:
-                    db_chat = await get_user(chat_id)
+                    db_chat = await get_user_cached(chat_id)
                     if db_chat and db_chat.is_banned:
                         text = _ban_text(db_chat.ban_reason, is_group=True, lang=getattr(user, "language_code", None) if user else None)
 
@@ -89,7 +89,7 @@ class BanGuardMiddleware(BaseMiddleware):
 
             # 2) Block banned users
             if user is not None:
-                db_user = await get_user(int(user.id))
+                db_user = await get_user_cached(int(user.id))
                 if db_user and db_user.is_banned:
                     text = _ban_text(db_user.ban_reason, is_group=False, lang=getattr(user, "language_code", None))
 
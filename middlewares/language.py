@@ -1,7 +1,7 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, User
-from services.database.repo import get_user
+from services.database.repo import get_user_cached
 from services.localization import i18n
 
 class LanguageMiddleware(BaseMiddleware):
@@ -16,7 +16,7 @@ class LanguageMiddleware(BaseMiddleware):
         lang_code = "en"
         
         if user:
-            db_user = await get_user(user.id)
+            db_user = await get_user_cached(user.id)
             if db_user:
                 lang_code = db_user.language
         
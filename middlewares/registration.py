@@ -5,7 +5,8 @@ from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 
-from services.database.repo import ensure_user_exists, get_user
+from core.update_context import UpdateContext, begin_update_context, end_update_context
+from services.database.repo import ensure_users_exist
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +19,11 @@ def _safe_str(v) -> str | None:
 
 
 class RegistrationMiddleware(BaseMiddleware):
-    """Ensures user/group is present in DB for any update type."""
+    """Ensures user/group is present in DB for any update type.
+
+    Both rows are resolved in one DB round-trip and published as the per-update
+    context (core.update_context) plus ``db_user`` / ``db_chat`` handler data.
+    """
 
     async def __call__(
         self,
@@ -42,33 +47,59 @@ class RegistrationMiddleware(BaseMiddleware):
             except Exception:
                 chat = None
 
+        ctx = UpdateContext()
+        token = begin_update_context(ctx)
         try:
-            if user:
+            try:
+                entries = []
+                user_id = getattr(user, "id", None) if user else None
                 # Telegram system account (often appears as author for channel-posts in linked groups)
-                if getattr(user, "id", None) == 777000:
-                    return await handler(event, data)
+                if user and user_id != 777000:
+                    entries.append(
+                        {
+                            "user_id": user_id,
+                            "username": _safe_str(getattr(user, "username", None)),
+                            "full_name": _safe_str(getattr(user, "full_name", None)) or "Unknown",
+                            "tag": None,
+                            # Used only for new rows; existing language (/language) is never overwritten.
+                            "language": _safe_str(getattr(user, "language_code", None)) or "en",
+                        }
+                    )
 
-                full_name = _safe_str(getattr(user, "full_name", None)) or "Unknown"
-                username = _safe_str(getattr(user, "username", None))
-                # Don't overwrite DB language on every update; respect /language and manual choice.
-                existing = await get_user(user.id)
-                language = None
-                if not existing:
-                    language = _safe_str(getattr(user, "language_code", None)) or "en"
-                await ensure_user_exists(user.id, username, full_name, tag=None, language=language)
+                # Register groups/supergroups/channels by chat.id (< 0)
+                chat_id = None
+                if user_id != 777000 and chat is not None:
+                    chat_id = getattr(chat, "id", None)
+                    chat_type = _safe_str(getattr(chat, "type", None))
+                    if isinstance(chat_id, int) and chat_id < 0 and chat_type in ("group", "supergroup", "channel"):
+                        lang = "en"
+                        if user:
+                            lang = _safe_str(getattr(user, "language_code", None)) or "en"
+                        entries.append(
+                            {
+                                "user_id": chat_id,
+                                "username": _safe_str(getattr(chat, "username", None)),
+                                "full_name": _safe_str(getattr(chat, "title", None)) or f"{chat_type} {chat_id}",
+                                "tag": chat_type,
+                                "language": lang,
+                            }
+                        )
+                    else:
+                        chat_id = None
 
-            # Register groups/supergroups/channels by chat.id (< 0)
-            if chat is not None:
-                chat_id = getattr(chat, "id", None)
-                chat_type = _safe_str(getattr(chat, "type", None))
-                if isinstance(chat_id, int) and chat_id < 0 and chat_type in ("group", "supergroup", "channel"):
-                    title = _safe_str(getattr(chat, "title", None)) or f"{chat_type} {chat_id}"
-                    chat_username = _safe_str(getattr(chat, "username", None))
-                    lang = "en"
-                    if user:
-                        lang = _safe_str(getattr(user, "language_code", None)) or "en"
-                    await ensure_user_exists(chat_id, chat_username, title, tag=chat_type, language=lang)
-        except Exception:
-            logger.exception("Registration middleware failed")
+                if entries:
+                    rows, created = await ensure_users_exist(entries)
+                    if user and user_id != 777000:
+                        ctx.user = rows.get(user_id)
+                        ctx.user_is_new = user_id in created
+                    if chat_id is not None:
+                        ctx.chat = rows.get(chat_id)
+            except Exception:
+                logger.exception("Registration middleware failed")
 
-        return await handler(event, data)
+            data["update_context"] = ctx
+            data["db_user"] = ctx.user
+            data["db_chat"] = ctx.chat
+            return await handler(event, data)
+        finally:
+            end_update_context(token)
@@ -1,13 +1,29 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
+import time
 
+from cachetools import TTLCache
 from fastapi import Depends, FastAPI, Header, HTTPException, Query
 from fastapi.responses import HTMLResponse
-
-from .config import ADMIN_IDS, BOT_TOKEN, PUBLIC_URL
-from .db import session
-from .initdata import InitDataError, user_id_from_init_data, validate_init_data
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import ADMIN_IDS, BOT_TOKEN, INITDATA_CACHE_SIZE, INITDATA_MAX_AGE, PUBLIC_URL
+from .db import dispose_engine, get_session
+from .initdata import (
+    InitDataError,
+    auth_date_from_init_data,
+    secret_for_token,
+    user_id_from_init_data,
+    validate_init_data,
+    validate_init_data_secrets,
+)
 from .models import User, UserRequest
+from services.database.user_pages import SYSTEM_USER_ID, build_page, users_page_stmt
+
+USERS_TOTAL_TTL = 60.0
+_users_total_cache: tuple[float, int] | None = None
 
 
 def _require_token() -> None:
@@ -31,50 +47,82 @@ def _candidate_tokens() -> list[str]:
     return tokens
 
 
-def _validate_any(init_data: str) -> dict:
-    if not init_data:
-        raise InitDataError("missing")
-    last_err: Exception | None = None
-    for tok in _candidate_tokens():
-        try:
-            return validate_init_data(init_data, tok)
-        except Exception as e:
-            last_err = e
-            continue
-    if isinstance(last_err, InitDataError):
-        raise last_err
-    raise InitDataError("bad_hash")
+# Derived HMAC keys for every candidate token and the admin set are built once, not per call.
+_ADMIN_SET = frozenset(int(x) for x in (ADMIN_IDS or []))
+_secrets: list[bytes] | None = None
 
+# raw initData (its hash included, so any edit misses) -> (payload, user_id, is_admin, expires_at)
+_verified: TTLCache = TTLCache(maxsize=max(1, INITDATA_CACHE_SIZE), ttl=INITDATA_MAX_AGE if INITDATA_MAX_AGE > 0 else 3600)
 
-def _read_init_data(
+
+def _candidate_secrets() -> list[bytes]:
+    global _secrets
+    if _secrets is None:
+        _secrets = [secret_for_token(tok) for tok in _candidate_tokens()]
+    return _secrets
+
+
+def _verify(init_data: str) -> tuple[dict, int | None, bool]:
+    """Validated payload, user id and admin flag; repeated calls with the same initData hit the cache."""
+    if not init_data:
+        raise InitDataError("missing")
+    now = time.time()
+    hit = _verified.get(init_data)
+    if hit is not None and hit[3] > now:
+        return hit[0], hit[1], hit[2]
+
+    payload = validate_init_data_secrets(init_data, _candidate_secrets())
+    if INITDATA_MAX_AGE > 0:
+        auth_date = auth_date_from_init_data(payload)
+        if auth_date is None or auth_date + INITDATA_MAX_AGE <= now:
+            raise InitDataError("expired")
+        expires_at = float(auth_date + INITDATA_MAX_AGE)
+    else:
+        expires_at = now + 3600
+    uid = user_id_from_init_data(payload)
+    is_admin = uid is not None and int(uid) in _ADMIN_SET
+    _verified[init_data] = (payload, uid, is_admin, expires_at)
+    return payload, uid, is_admin
+
+
+async def _read_init_data(
     x_telegram_init_data: str | None = Header(default=None, alias="X-Telegram-Init-Data"),
     init_data: str | None = Query(default=None, alias="initData"),
 ) -> str:
     return (x_telegram_init_data or init_data or "").strip()
 
 
-def require_admin(init_data: str = Depends(_read_init_data)) -> dict:
+# async on purpose: sync dependencies go through the threadpool, and _verified is not thread-safe.
+async def require_admin(init_data: str = Depends(_read_init_data)) -> dict:
     _require_token()
     try:
-        payload = _validate_any(init_data)
-        uid = user_id_from_init_data(payload)
-        if uid is None or int(uid) not in set(int(x) for x in (ADMIN_IDS or [])):
-            raise HTTPException(status_code=403, detail="forbidden")
-        return payload
-    except HTTPException:
-        raise
+        payload, _uid, is_admin = _verify(init_data)
     except InitDataError:
         raise HTTPException(status_code=401, detail="bad_init_data")
+    if not is_admin:
+        raise HTTPException(status_code=403, detail="forbidden")
+    return payload
 
 
-def require_user(init_data: str = Depends(_read_init_data)) -> dict:
+async def require_user(init_data: str = Depends(_read_init_data)) -> dict:
     _require_token()
     try:
-        return _validate_any(init_data)
+        return _verify(init_data)[0]
     except InitDataError:
         raise HTTPException(status_code=401, detail="bad_init_data")
 
 
+async def _users_total(db: AsyncSession) -> int:
+    """count(*) of listed users, recomputed at most every USERS_TOTAL_TTL seconds."""
+    global _users_total_cache
+    now = time.monotonic()
+    if _users_total_cache is not None and now - _users_total_cache[0] < USERS_TOTAL_TTL:
+        return _users_total_cache[1]
+    total = int((await db.scalar(select(func.count()).select_from(User).where(User.id != SYSTEM_USER_ID))) or 0)
+    _users_total_cache = (now, total)
+    return total
+
+
 def _iso(dt: datetime | None) -> str | None:
     if not dt:
         return None
@@ -85,7 +133,12 @@ def _iso(dt: datetime | None) -> str | None:
 
 
 def create_app() -> FastAPI:
-    app = FastAPI()
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        yield
+        await dispose_engine()
+
+    app = FastAPI(lifespan=lifespan)
 
     fallback_url = (os.getenv("MINIAPP_FALLBACK_URL") or "https://ch4rov.pl/").strip() or "https://ch4rov.pl/"
 
@@ -229,10 +282,10 @@ def create_app() -> FastAPI:
     @app.get("/api/me")
     async def me(payload: dict = Depends(require_user)):
         uid = user_id_from_init_data(payload)
-        return {"user_id": uid, "is_admin": bool(uid in set(ADMIN_IDS))}
+        return {"user_id": uid, "is_admin": bool(uid in _ADMIN_SET)}
 
     @app.get("/api/profile")
-    async def profile(payload: dict = Depends(require_user)):
+    async def profile(payload: dict = Depends(require_user), db: AsyncSession = Depends(get_session)):
         uid = user_id_from_init_data(payload)
         if uid is None:
             raise HTTPException(status_code=400, detail="no_user")
@@ -247,11 +300,7 @@ def create_app() -> FastAPI:
             except Exception:
                 tg_user = None
 
-        db = session()
-        try:
-            user = db.get(User, int(uid))
-        finally:
-            db.close()
+        user = await db.get(User, int(uid))
 
         return {
             "user_id": int(uid),
@@ -274,17 +323,13 @@ def create_app() -> FastAPI:
         return {"user_id": uid, "is_admin": True}
 
     @app.get("/api/admin/profile")
-    async def admin_profile(payload: dict = Depends(require_admin)):
+    async def admin_profile(payload: dict = Depends(require_admin), db: AsyncSession = Depends(get_session)):
         uid = user_id_from_init_data(payload)
         if uid is None:
             raise HTTPException(status_code=400, detail="no_user")
 
-        db = session()
-        try:
-            user = db.get(User, uid)
-            req_count = db.query(UserRequest).filter(UserRequest.user_id == uid).count()
-        finally:
-            db.close()
+        user = await db.get(User, uid)
+        req_count = await db.scalar(select(func.count()).select_from(UserRequest).where(UserRequest.user_id == uid))
 
         user_json = None
         raw_user = payload.get("user")
@@ -308,27 +353,24 @@ def create_app() -> FastAPI:
     @app.get("/api/admin/users")
     async def admin_users(
         limit: int = Query(default=50, ge=1, le=200),
-        offset: int = Query(default=0, ge=0),
+        cursor: str | None = Query(default=None),
+        before: str | None = Query(default=None),
         payload: dict = Depends(require_admin),
+        db: AsyncSession = Depends(get_session),
     ):
-        db = session()
+        # Keyset pages: pass next_cursor back as ?cursor=, prev_cursor as ?before=.
         try:
-            rows = (
-                db.query(User)
-                .filter(User.id != 777000)
-                .order_by(User.first_seen.desc())
-                .limit(int(limit))
-                .offset(int(offset))
-                .all()
-            )
-            total = db.query(User).filter(User.id != 777000).count()
-        finally:
-            db.close()
+            stmt = users_page_stmt(db.bind.dialect.name, int(limit), after=cursor, before=before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bad_cursor")
+        page = build_page((await db.execute(stmt)).all(), int(limit), after=cursor, before=before)
+        total = await _users_total(db)
 
         return {
             "total": int(total or 0),
             "limit": int(limit),
-            "offset": int(offset),
+            "next_cursor": page["next"],
+            "prev_cursor": page["prev"],
             "items": [
                 {
                     "id": int(u.id),
@@ -339,37 +381,27 @@ def create_app() -> FastAPI:
                     "last_seen": _iso(u.last_seen),
                     "request_count": int(u.request_count or 0),
                 }
-                for u in rows
+                for u in page["items"]
             ],
         }
 
     @app.post("/api/admin/users/{user_id}/ban")
-    async def ban_user(user_id: int, payload: dict = Depends(require_admin)):
-        db = session()
-        try:
-            user = db.get(User, int(user_id))
-            if not user:
-                raise HTTPException(status_code=404, detail="not_found")
-            user.is_banned = True
-            db.add(user)
-            db.commit()
-        finally:
-            db.close()
+    async def ban_user(user_id: int, payload: dict = Depends(require_admin), db: AsyncSession = Depends(get_session)):
+        user = await db.get(User, int(user_id))
+        if not user:
+            raise HTTPException(status_code=404, detail="not_found")
+        user.is_banned = True
+        await db.commit()
         return {"ok": True}
 
     @app.post("/api/admin/users/{user_id}/unban")
-    async def unban_user(user_id: int, payload: dict = Depends(require_admin)):
-        db = session()
-        try:
-            user = db.get(User, int(user_id))
-            if not user:
-                raise HTTPException(status_code=404, detail="not_found")
-            user.is_banned = False
-            user.ban_reason = None
-            db.add(user)
-            db.commit()
-        finally:
-            db.close()
+    async def unban_user(user_id: int, payload: dict = Depends(require_admin), db: AsyncSession = Depends(get_session)):
+        user = await db.get(User, int(user_id))
+        if not user:
+            raise HTTPException(status_code=404, detail="not_found")
+        user.is_banned = False
+        user.ban_reason = None
+        await db.commit()
         return {"ok": True}
 
     @app.get("/api/debug/validate")
@@ -380,7 +412,7 @@ def create_app() -> FastAPI:
         try:
             data = validate_init_data(init_data, BOT_TOKEN)
             uid = user_id_from_init_data(data)
-            return {"ok": True, "user_id": uid, "is_admin": bool(uid in set(ADMIN_IDS))}
+            return {"ok": True, "user_id": uid, "is_admin": bool(uid in _ADMIN_SET)}
         except InitDataError:
             raise HTTPException(status_code=401, detail="bad_init_data")
 
@@ -12,6 +12,21 @@ def _csv_ints(raw: str) -> list[int]:
 
 BOT_TOKEN = (os.getenv("BOT_TOKEN") or os.getenv("TEST_BOT_TOKEN") or "").strip().strip('"').strip("'").strip()
 DB_PATH = (os.getenv("DB_PATH") or "/data/bot.db").strip()
+
+
+def _db_url() -> str:
+    # Same database as the bot (core.config), async drivers.
+    if (os.getenv("DB_TYPE") or "sqlite").strip().lower() == "postgres":
+        return (
+            f"postgresql+asyncpg://{os.getenv('DB_USER', '')}:{os.getenv('DB_PASSWORD', '')}"
+            f"@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME', 'telegram_bot')}"
+        )
+    if DB_PATH.startswith("sqlite"):
+        return DB_PATH if "+aiosqlite" in DB_PATH else DB_PATH.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    return f"sqlite+aiosqlite:///{DB_PATH}"
+
+
+DB_URL = _db_url()
 ADMIN_IDS = _csv_ints(os.getenv("ADMIN_IDS") or os.getenv("ADMIN_ID") or "")
 IS_TEST_ENV = (os.getenv("IS_TEST_ENV") or "").strip().lower() in ("true", "1", "yes")
 
@@ -32,4 +47,14 @@ else:
         or ""
     ).strip().rstrip("/")
 
+# initData older than this (auth_date) is rejected; 0 = no age limit.
+try:
+    INITDATA_MAX_AGE = int((os.getenv("MINIAPP_INITDATA_MAX_AGE") or "86400").strip())
+except Exception:
+    INITDATA_MAX_AGE = 86400
+try:
+    INITDATA_CACHE_SIZE = int((os.getenv("MINIAPP_INITDATA_CACHE_SIZE") or "4096").strip())
+except Exception:
+    INITDATA_CACHE_SIZE = 4096
+
 LOG_PATH = (os.getenv("BOT_LOG_PATH") or "bot_actions.log").strip()
@@ -1,19 +1,22 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from collections.abc import AsyncIterator
 
-from .config import DB_PATH
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+from services.database.sqlite_profile import apply_sqlite_profile, engine_kwargs
 
-def engine_url() -> str:
-    if DB_PATH.startswith("sqlite:"):
-        return DB_PATH
-    if DB_PATH.startswith("/"):
-        return f"sqlite:///{DB_PATH}"
-    return f"sqlite:///{DB_PATH}"
+from .config import DB_URL
 
+# One pooled async engine per process (aiosqlite / asyncpg): queries never block uvicorn's loop.
+engine = create_async_engine(DB_URL, **engine_kwargs(DB_URL, is_async=True))
+apply_sqlite_profile(engine.sync_engine)
+session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
-_engine = create_engine(engine_url(), future=True)
 
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: one session per request, closed when the response is done."""
+    async with session_maker() as db:
+        yield db
 
-def session() -> Session:
-    return Session(_engine)
+
+async def dispose_engine() -> None:
+    await engine.dispose()
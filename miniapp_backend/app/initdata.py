@@ -12,9 +12,21 @@ def _check_string(bot_token: str) -> bytes:
     return hashlib.sha256(bot_token.encode("utf-8")).digest()
 
 
+def secret_for_token(bot_token: str) -> bytes:
+    """HMAC key for a bot token; compute once and pass to validate_init_data_secrets."""
+    return _check_string(bot_token)
+
+
 def validate_init_data(init_data: str, bot_token: str) -> dict:
     if not init_data or not bot_token:
         raise InitDataError("missing")
+    return validate_init_data_secrets(init_data, [_check_string(bot_token)])
+
+
+def validate_init_data_secrets(init_data: str, secrets: list[bytes]) -> dict:
+    """Parse once, check the hash against every candidate secret."""
+    if not init_data or not secrets:
+        raise InitDataError("missing")
 
     pairs = parse_qsl(init_data, keep_blank_values=True, strict_parsing=False)
     data = {k: v for k, v in pairs}
@@ -29,13 +41,18 @@ def validate_init_data(init_data: str, bot_token: str) -> dict:
     sorted_items = sorted(data.items(), key=lambda kv: kv[0])
     payload = "\n".join([f"{k}={v}" for k, v in sorted_items])
 
-    secret = _check_string(bot_token)
-    calc = hmac.new(secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+    for secret in secrets:
+        calc = hmac.new(secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+        if hmac.compare_digest(calc, recv_hash):
+            return data
+    raise InitDataError("bad_hash")
 
-    if not hmac.compare_digest(calc, recv_hash):
-        raise InitDataError("bad_hash")
 
-    return data
+def auth_date_from_init_data(data: dict) -> int | None:
+    try:
+        return int(data.get("auth_date") or 0) or None
+    except Exception:
+        return None
 
 
 def user_id_from_init_data(data: dict) -> int | None:
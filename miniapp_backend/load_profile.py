@@ -0,0 +1,94 @@
+"""Load check for the miniapp backend: many concurrent /api/profile calls.
+
+Signs fake initData with BOT_TOKEN (the same check validate_init_data does), so no
+Telegram client is needed. Run against a live backend:
+
+    python -m miniapp_backend.load_profile --url http://127.0.0.1:8090 -n 2000 -c 100
+
+With blocking DB calls the p95 grows with -c; on the async engine it should stay flat.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+from urllib.parse import urlencode
+
+import aiohttp
+
+
+def sign_init_data(bot_token: str, user_id: int) -> str:
+    data = {
+        "auth_date": str(int(time.time())),
+        "query_id": f"load-{user_id}",
+        "user": json.dumps({"id": user_id, "first_name": f"load{user_id}"}, separators=(",", ":")),
+    }
+    payload = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
+    secret = hashlib.sha256(bot_token.encode("utf-8")).digest()
+    data["hash"] = hmac.new(secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+    return urlencode(data)
+
+
+def _pct(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def run(url: str, total: int, concurrency: int, bot_token: str, users: int) -> None:
+    init_data = [sign_init_data(bot_token, 100000 + i) for i in range(max(1, users))]
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as http:
+
+        async def one(i: int) -> None:
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    async with http.get(
+                        f"{url.rstrip('/')}/api/profile",
+                        headers={"X-Telegram-Init-Data": init_data[i % len(init_data)]},
+                    ) as resp:
+                        await resp.read()
+                        if resp.status != 200:
+                            errors[str(resp.status)] = errors.get(str(resp.status), 0) + 1
+                            return
+                except Exception as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    return
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        took = time.perf_counter() - started
+
+    print(f"requests: {total}, concurrency: {concurrency}, ok: {len(latencies)}, errors: {errors or 0}")
+    print(f"throughput: {total / took:.1f} req/s in {took:.2f}s")
+    print(
+        "latency ms: "
+        f"p50 {_pct(latencies, 0.50):.1f}, p95 {_pct(latencies, 0.95):.1f}, "
+        f"p99 {_pct(latencies, 0.99):.1f}, max {max(latencies or [0]):.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=os.getenv("MINIAPP_BACKEND_URL") or "http://127.0.0.1:8090")
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=50, help="distinct fake user ids")
+    args = parser.parse_args()
+
+    token = (os.getenv("BOT_TOKEN") or os.getenv("TEST_BOT_TOKEN") or "").strip().strip('"').strip("'")
+    if not token:
+        raise SystemExit("BOT_TOKEN (or TEST_BOT_TOKEN) is required to sign initData")
+    asyncio.run(run(args.url, args.requests, args.concurrency, token, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import re
 import html
-import aiohttp
+
+from services.http_client import http_clients
 
 
 async def get_apple_music_metadata(url: str) -> dict | None:
@@ -17,11 +18,11 @@ async def get_apple_music_metadata(url: str) -> dict | None:
     }
 
     try:
-        async with aiohttp.ClientSession(headers=headers, connector=aiohttp.TCPConnector(ssl=False)) as session:
-            async with session.get(url, allow_redirects=True) as resp:
-                if resp.status != 200:
-                    return None
-                text = await resp.text()
+        session = http_clients.session(verify_ssl=False)
+        async with session.get(url, headers=headers, allow_redirects=True) as resp:
+            if resp.status != 200:
+                return None
+            text = await resp.text()
     except Exception:
         return None
 
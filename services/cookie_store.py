@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Cookie files for yt-dlp without a DB query or a file write per download.
+
+- every distinct cookie text is written once to tempfiles/_cookies/<sha1>.txt (0600);
+  files no user_cookies/global_cookies row hashes to are removed by the nightly
+  DB maintenance (prune());
+- (user_id, platform) -> (file, "user"|"global") is memoized for COOKIE_CACHE_TTL
+  seconds and dropped by save_user_cookie / save_global_cookie;
+- yt-dlp writes the jar back to `cookiefile` on close(), so with_private_cookiefile()
+  gives every YoutubeDL instance an in-memory copy and the shared file never changes.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import threading
+import time
+
+from cachetools import TTLCache
+
+import settings
+
+COOKIE_DIR = os.path.join(settings.TEMP_DIR, "_cookies")
+
+
+class CookieStore:
+    def __init__(self, base_dir: str, ttl: int = 600, maxsize: int = 4096):
+        self.base_dir = base_dir
+        self._base_abs = os.path.abspath(base_dir)
+        # (user_id, platform) -> (path | None, scope | None)
+        self._resolved: TTLCache = TTLCache(maxsize=maxsize, ttl=max(1, int(ttl)))
+        # user_id -> bool (any personal cookies at all)
+        self._personal: TTLCache = TTLCache(maxsize=maxsize, ttl=max(1, int(ttl)))
+        # path -> cookie text; read by worker threads
+        self._texts: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(content: str) -> str:
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def materialize(self, content: str) -> str:
+        """Path of the content-addressed file holding `content` (written only the first time)."""
+        path = os.path.join(self.base_dir, f"{self.digest(content)}.txt")
+        if os.path.exists(path):
+            # mtime = last use; prune() keeps recently used files (inline cookies have no DB row)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            os.makedirs(self.base_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        with self._lock:
+            self._texts[path] = content
+        return path
+
+    async def resolve(self, user_id: int | None, platform: str) -> tuple[str | None, str | None]:
+        """Cookie file for a download: user cookies first, then global ones."""
+        platform = (platform or "").lower().strip()
+        key = (user_id, platform)
+        hit = self._resolved.get(key)
+        if hit is not None and (hit[0] is None or os.path.exists(hit[0])):
+            self.hits += 1
+            return hit
+
+        self.misses += 1
+        from services.database.repo import get_global_cookie, get_user_cookie
+
+        generation = self._generation
+        content, scope = None, None
+        if user_id:
+            content = await get_user_cookie(user_id, platform)
+            scope = "user" if content else None
+        if not content:
+            content = await get_global_cookie(platform)
+            scope = "global" if content else None
+
+        result = (self.materialize(content), scope) if content else (None, None)
+        # Skip memoizing if cookies were saved while we were reading them.
+        if generation == self._generation:
+            self._resolved[key] = result
+        return result
+
+    async def has_personal_cookies(self, user_id: int) -> bool:
+        cached = self._personal.get(user_id)
+        if cached is not None:
+            return cached
+        from services.database.repo import user_has_personal_cookies
+
+        generation = self._generation
+        value = bool(await user_has_personal_cookies(user_id))
+        if generation == self._generation:
+            self._personal[user_id] = value
+        return value
+
+    def invalidate_user(self, user_id: int) -> None:
+        self._generation += 1
+        self._personal.pop(user_id, None)
+        for key in [k for k in list(self._resolved.keys()) if k[0] == user_id]:
+            self._resolved.pop(key, None)
+
+    def invalidate_global(self, platform: str | None = None) -> None:
+        """Global cookies are every user's fallback: drop all resolutions for the platform."""
+        self._generation += 1
+        platform = (platform or "").lower().strip()
+        if not platform:
+            self._resolved.clear()
+            return
+        for key in [k for k in list(self._resolved.keys()) if k[1] == platform]:
+            self._resolved.pop(key, None)
+
+    def prune(self, keep: set[str], min_age: float = 86400) -> int:
+        """Delete cookie files whose digest is not in `keep` and that were not used for min_age seconds."""
+        try:
+            names = os.listdir(self.base_dir)
+        except OSError:
+            return 0
+        cutoff = time.time() - max(0.0, float(min_age))
+        removed = 0
+        for name in names:
+            if not (name.endswith(".txt") or name.endswith(".tmp")):
+                continue
+            if name.endswith(".txt") and name[:-4] in keep:
+                continue
+            path = os.path.join(self.base_dir, name)
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            with self._lock:
+                self._texts.pop(path, None)
+        if removed:
+            self._generation += 1
+            for key, hit in list(self._resolved.items()):
+                if hit[0] and not os.path.exists(hit[0]):
+                    self._resolved.pop(key, None)
+        return removed
+
+    def _read(self, path: str) -> str | None:
+        with self._lock:
+            text = self._texts.get(path)
+        if text is not None:
+            return text
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._texts[path] = text
+        return text
+
+    def with_private_cookiefile(self, opts: dict) -> dict:
+        """yt-dlp opts for ONE YoutubeDL instance: a store-managed cookiefile becomes a StringIO copy."""
+        path = opts.get("cookiefile")
+        if not isinstance(path, str) or os.path.dirname(os.path.abspath(path)) != self._base_abs:
+            return opts
+        text = self._read(path)
+        if text is None:
+            return {k: v for k, v in opts.items() if k != "cookiefile"}
+        return {**opts, "cookiefile": io.StringIO(text)}
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "files": len(self._texts)}
+
+
+cookie_store = CookieStore(COOKIE_DIR, ttl=settings.COOKIE_CACHE_TTL)
@@ -51,6 +51,56 @@ def get_sqlite_db_path() -> str | None:
     return None
 
 
+def get_postgres_db_url() -> str | None:
+    """config.DB_URL when the bot runs on PostgreSQL (DB_TYPE=postgres), else None."""
+    try:
+        from core.config import config
+
+        db_url = getattr(config, "DB_URL", "") or ""
+        if db_url.startswith("postgresql"):
+            return db_url
+    except Exception:
+        pass
+    return None
+
+
+def _pg_tool_args(db_url: str, tool: str) -> tuple[list[str], dict]:
+    """argv prefix + env for a PostgreSQL client tool; the password goes via PGPASSWORD, not argv."""
+    from sqlalchemy.engine import make_url
+
+    u = make_url(db_url)
+    env = dict(os.environ)
+    if u.password:
+        env["PGPASSWORD"] = str(u.password)
+    args = [tool]
+    if u.host:
+        args += ["-h", u.host]
+    if u.port:
+        args += ["-p", str(u.port)]
+    if u.username:
+        args += ["-U", u.username]
+    return args, env
+
+
+async def dump_postgres(dst_path: str, db_url: str | None = None) -> None:
+    """pg_dump in custom format (already compressed). Needs postgresql-client in PATH."""
+    db_url = db_url or get_postgres_db_url()
+    if not db_url:
+        raise RuntimeError("Not a PostgreSQL database")
+    from sqlalchemy.engine import make_url
+
+    args, env = _pg_tool_args(db_url, "pg_dump")
+    args += ["--format=custom", "--no-owner", "--no-privileges", "-f", dst_path, make_url(db_url).database or ""]
+
+    os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
+    proc = await asyncio.create_subprocess_exec(
+        *args, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    _, err = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"pg_dump failed ({proc.returncode}): {(err or b'').decode(errors='ignore')[-500:]}")
+
+
 def _resolve_db_path(db_path: str) -> str:
     if os.path.isabs(db_path):
         return db_path
@@ -94,12 +144,34 @@ def _zip_one_file(src_path: str, zip_path: str, arcname: str) -> None:
         zf.write(src_path, arcname=arcname)
 
 
+async def _send_postgres_backup(bot, tech_chat_id: int, db_url: str, caption: str | None) -> bool:
+    ts = _dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+    with tempfile.TemporaryDirectory(prefix="tgbot_db_backup_") as tmp:
+        dump_path = os.path.join(tmp, f"db_backup_{ts}.dump")
+        try:
+            await dump_postgres(dump_path, db_url)
+            await bot.send_document(
+                tech_chat_id,
+                FSInputFile(dump_path),
+                caption=caption or "💾 DB backup (pg_dump)",
+                disable_notification=True,
+            )
+            return True
+        except Exception:
+            logger.exception("Failed to send PostgreSQL backup")
+            return False
+
+
 async def send_db_backup(bot, caption: str | None = None) -> bool:
-    """Create an archived sqlite backup and send to TECH_CHAT_ID."""
+    """Create an archived sqlite backup (or a pg_dump on PostgreSQL) and send to TECH_CHAT_ID."""
     tech_chat_id = get_tech_chat_id()
     if not tech_chat_id:
         return False
 
+    pg_url = get_postgres_db_url()
+    if pg_url:
+        return await _send_postgres_backup(bot, tech_chat_id, pg_url, caption)
+
     db_path = get_sqlite_db_path()
     if not db_path:
         return False
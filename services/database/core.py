@@ -1,10 +1,22 @@
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from core.config import config
 from services.database.models import Base
+from services.database.migrations import run_migrations
+from services.database.sqlite_profile import apply_sqlite_profile, engine_kwargs
 
-engine = create_async_engine(url=config.DB_URL, echo=False)
+engine = create_async_engine(url=config.DB_URL, echo=False, **engine_kwargs(config.DB_URL, is_async=True))
+apply_sqlite_profile(engine.sync_engine)
 session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
 
+# "sqlite" | "postgresql"
+DB_DIALECT = engine.dialect.name
+IS_POSTGRES = DB_DIALECT == "postgresql"
+
+# INSERT with on_conflict_do_update/do_nothing for the active backend (both also support RETURNING).
+dialect_insert = postgresql.insert if IS_POSTGRES else sqlite.insert
+
 async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""End-to-end check of the repository layer against the configured database.
+
+Runs the real repo/migration code paths on whatever DB_TYPE points at, so the same
+script covers SQLite and the compose `postgres` stand-in:
+
+    docker compose --profile postgres up -d postgres
+    docker compose --profile postgres run --rm -e DB_TYPE=postgres telegrambot \\
+        python -m services.database.db_check
+
+Checked: init_db + migrations (twice, they must be idempotent), user upsert
+(ensure_users_exist incl. a concurrent insert of the same id, write-behind
+activity flush), media cache upserts (on_conflict_do_update, shared layer,
+bypass markers), keyset pages of the admin user list and the url_hash backfill.
+
+Only rows with ids/urls in the check's own range are written, and they are deleted
+at the end. Exit code 1 if any step fails.
+"""
+from __future__ import annotations
+
+import asyncio
+import sys
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+
+from services.database import repo
+from services.database.core import DB_DIALECT, engine, init_db, session_maker
+from services.database.migrations import run_migrations
+from services.database.models import MediaCache, MediaCacheBypass, SharedMediaCache, User, url_digest
+from services.database.write_behind import activity_buffer
+
+_BASE_ID = 990_000_000_000  # far above real Telegram ids
+_USERS = 7
+_URL = "https://check.invalid/db_check/{}"
+
+
+def _uid(i: int) -> int:
+    return _BASE_ID + i
+
+
+class CheckFailed(AssertionError):
+    pass
+
+
+def _expect(cond, message: str) -> None:
+    if not cond:
+        raise CheckFailed(message)
+
+
+async def check_init_db() -> str:
+    await init_db()
+    await init_db()
+    return f"dialect {DB_DIALECT}"
+
+
+async def check_user_upsert() -> str:
+    entries = [
+        {"user_id": _uid(i), "username": f"check{i}", "full_name": f"Check {i}", "tag": None, "language": "en"}
+        for i in range(_USERS)
+    ]
+    rows, created = await repo.ensure_users_exist(entries)
+    _expect(created == {_uid(i) for i in range(_USERS)}, f"created {sorted(created)}")
+    _expect(all(rows[_uid(i)].first_seen is not None for i in range(_USERS)), "first_seen not loaded by RETURNING")
+
+    entries[0]["full_name"] = "Check renamed"
+    rows, created = await repo.ensure_users_exist(entries[:1])
+    _expect(not created, "existing user created again")
+    _expect((await repo.get_user(_uid(0))).full_name == "Check renamed", "profile update lost")
+
+    # Two updates registering the same new id at once: ON CONFLICT DO NOTHING, one creator.
+    new = {"user_id": _uid(_USERS), "username": None, "full_name": "Race", "tag": None, "language": "en"}
+    (r1, c1), (r2, c2) = await asyncio.gather(repo.ensure_users_exist([dict(new)]), repo.ensure_users_exist([dict(new)]))
+    _expect(len(c1) + len(c2) == 1, f"concurrent insert created {len(c1) + len(c2)} rows")
+    _expect(r1[_uid(_USERS)].id == r2[_uid(_USERS)].id, "concurrent insert returned different rows")
+
+    before = (await repo.get_user(_uid(1))).request_count or 0
+    activity_buffer.touch(_uid(1), requests=3)
+    await activity_buffer.flush()
+    after = (await repo.get_user(_uid(1))).request_count or 0
+    _expect(after == before + 3, f"request_count {before} -> {after}")
+    return f"{_USERS + 1} users"
+
+
+async def check_media_cache() -> str:
+    user_id, url = _uid(0), _URL.format("media")
+    first = await repo.upsert_cached_media(user_id, url, "file-1", "video", title="t1")
+    second = await repo.upsert_cached_media(user_id, url, "file-2", "video", title="t2")
+    _expect(first.id == second.id, "upsert inserted a second row")
+    _expect(second.file_id == "file-2", "upsert did not update file_id (RETURNING)")
+
+    repo.invalidate_media_hot_cache(user_id, url)
+    found = await repo.get_cached_media_multi(user_id, url, ["audio", "video"])
+    _expect(found is not None and found.file_id == "file-2", "lookup missed the upserted row")
+
+    await repo.upsert_shared_media(url, "video", "check", "shared-1")
+    await repo.upsert_shared_media(url, "video", "check", "shared-2")
+    async with session_maker() as session:
+        shared = (await session.scalars(select(SharedMediaCache).where(SharedMediaCache.url == url))).all()
+    _expect(len(shared) == 1 and shared[0].file_id == "shared-2", f"shared rows {[(s.id, s.file_id) for s in shared]}")
+
+    await asyncio.sleep(0.01)
+    await repo.bypass_cached_media(user_id, url, "video")
+    await repo.bypass_cached_media(user_id, url, "video")
+    _expect(await repo.get_cached_media(user_id, url, "video") is None, "bypass marker did not hide the row")
+    await repo.upsert_cached_media(user_id, url, "file-3", "video")
+    repo.invalidate_media_hot_cache(user_id, url)
+    found = await repo.get_cached_media(user_id, url, "video")
+    _expect(found is not None and found.file_id == "file-3", "re-upload did not lift the bypass")
+    return "upsert/shared/bypass"
+
+
+async def check_keyset_pages() -> str:
+    # Distinct and equal first_seen values (ties are broken by id).
+    base = datetime.now().replace(microsecond=0) + timedelta(days=3650)
+    async with session_maker() as session:
+        async with session.begin():
+            for i in range(_USERS + 1):
+                await session.execute(
+                    update(User).where(User.id == _uid(i)).values(first_seen=base - timedelta(seconds=i // 2))
+                )
+    expected = [_uid(i) for i in sorted(range(_USERS + 1), key=lambda i: (i // 2, -i))]
+
+    seen: list[int] = []
+    pages = []
+    cursor = None
+    while True:
+        page = await repo.get_users_page(limit=3, after=cursor)
+        pages.append(page)
+        seen.extend(u.id for u in page["items"] if u.id >= _BASE_ID)
+        # Our rows are the newest; stop once past them.
+        if not page["next"] or len(seen) >= len(expected):
+            break
+        cursor = page["next"]
+    _expect(seen == expected, f"next pages {seen} != {expected}")
+
+    # And back again with the "prev" cursors, starting from the last page.
+    page = pages[-1]
+    back = [u.id for u in page["items"] if u.id >= _BASE_ID]
+    while page["prev"] and len(back) < len(expected):
+        page = await repo.get_users_page(limit=3, before=page["prev"])
+        back = [u.id for u in page["items"] if u.id >= _BASE_ID] + back
+    _expect(back == expected, f"prev pages {back} != {expected}")
+    return f"{len(pages)} pages"
+
+
+async def check_url_hash_backfill() -> str:
+    urls = [_URL.format(f"backfill{i}") for i in range(5)]
+    now = datetime.now()
+    async with engine.begin() as conn:
+        await conn.execute(
+            insert(MediaCache),
+            [
+                {"user_id": _uid(1), "url": u, "url_hash": None, "file_id": f"f{i}", "media_type": "video",
+                 "created_at": now, "last_used_at": now}
+                for i, u in enumerate(urls)
+            ],
+        )
+    await run_migrations(engine)
+    async with session_maker() as session:
+        rows = (await session.execute(select(MediaCache.url, MediaCache.url_hash).where(MediaCache.url.in_(urls)))).all()
+    _expect(len(rows) == len(urls), f"{len(rows)} backfill rows")
+    _expect(all(h == url_digest(u) for u, h in rows), "url_hash not backfilled")
+    return f"{len(rows)} rows"
+
+
+async def cleanup() -> None:
+    ids = [_uid(i) for i in range(_USERS + 1)]
+    async with session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(MediaCacheBypass).where(MediaCacheBypass.user_id.in_(ids)))
+            await session.execute(delete(MediaCache).where(MediaCache.user_id.in_(ids)))
+            await session.execute(delete(SharedMediaCache).where(SharedMediaCache.url.like(_URL.format("%"))))
+    for user_id in ids:
+        await repo.delete_user(user_id)
+        repo.invalidate_media_hot_cache(user_id, _URL.format("media"))
+
+
+async def main() -> int:
+    checks = (
+        ("init_db/migrations", check_init_db),
+        ("user upsert", check_user_upsert),
+        ("media cache upserts", check_media_cache),
+        ("keyset pages", check_keyset_pages),
+        ("url_hash backfill", check_url_hash_backfill),
+    )
+    failed = 0
+    try:
+        for name, check in checks:
+            try:
+                detail = await check()
+                print(f"OK    {name}: {detail}")
+            except Exception as e:
+                failed += 1
+                print(f"FAIL  {name}: {e}")
+                if not isinstance(e, CheckFailed):
+                    traceback.print_exc()
+    finally:
+        try:
+            await cleanup()
+        except Exception:
+            traceback.print_exc()
+        await activity_buffer.close()
+        await engine.dispose()
+    print("all checks passed" if not failed else f"{failed} check(s) failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""Nightly DB maintenance, scheduled next to run_periodic_db_backup.
+
+- user_requests older than USER_REQUESTS_RETENTION_DAYS are deleted;
+- media_cache_bypass markers that no longer hide anything are dropped
+  (the cache row is newer than the marker, or there is no cache row at all);
+- expired oauth_states and odesli_cache rows are purged;
+- cookie files in tempfiles/_cookies that no stored cookie text hashes to are deleted;
+- then incremental VACUUM (SQLite) / VACUUM (PostgreSQL) + ANALYZE, and a short report to TECH_CHAT_ID.
+
+Deletes go in DB_MAINTENANCE_BATCH-sized transactions so the bot's own writes
+are never blocked for long.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as _dt
+import logging
+import os
+import time
+
+from sqlalchemy import and_, delete, exists, select, text
+
+import settings
+from services.database.core import engine, session_maker
+from services.database.models import (
+    GlobalCookies,
+    MediaCache,
+    MediaCacheBypass,
+    OAuthState,
+    OdesliCache,
+    User,
+    UserCookies,
+    UserRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+_KEY_LAST_DAY = "db_maintenance_last_day"  # YYYY-MM-DD
+
+
+async def _delete_in_batches(model, *where, batch: int | None = None) -> int:
+    batch = max(1, int(batch or settings.DB_MAINTENANCE_BATCH))
+    total = 0
+    while True:
+        ids = select(model.id).where(*where).limit(batch)
+        async with session_maker() as session:
+            async with session.begin():
+                res = await session.execute(
+                    delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+                )
+        n = int(res.rowcount or 0)
+        total += n
+        if n < batch:
+            return total
+        # Give queued bot writes a chance between batches.
+        await asyncio.sleep(0.05)
+
+
+async def purge_user_requests(days: int | None = None) -> int:
+    days = settings.USER_REQUESTS_RETENTION_DAYS if days is None else int(days)
+    if days <= 0:
+        return 0
+    cutoff = _dt.datetime.now() - _dt.timedelta(days=days)
+    return await _delete_in_batches(UserRequest, UserRequest.created_at < cutoff)
+
+
+async def purge_stale_bypass_markers() -> int:
+    # A marker hides a cache row only while row.last_used_at <= marker.created_at.
+    still_hiding = exists().where(
+        and_(
+            MediaCache.user_id == MediaCacheBypass.user_id,
+            MediaCache.url_hash == MediaCacheBypass.url_hash,
+            MediaCache.media_type == MediaCacheBypass.media_type,
+            MediaCache.last_used_at <= MediaCacheBypass.created_at,
+        )
+    )
+    return await _delete_in_batches(MediaCacheBypass, ~still_hiding)
+
+
+async def purge_expired_oauth_states() -> int:
+    return await _delete_in_batches(OAuthState, OAuthState.expires_at < _dt.datetime.now())
+
+
+async def purge_expired_odesli_cache() -> int:
+    return await _delete_in_batches(OdesliCache, OdesliCache.expires_at < _dt.datetime.now())
+
+
+async def purge_orphan_cookie_files() -> int:
+    from services.cookie_store import cookie_store
+
+    keep: set[str] = set()
+    async with session_maker() as session:
+        # legacy users.cookies_* columns are still read by get_user_cookie
+        for column in (
+            UserCookies.cookies_data,
+            GlobalCookies.cookies_data,
+            User.cookies_youtube,
+            User.cookies_tiktok,
+            User.cookies_vk,
+        ):
+            result = await session.stream_scalars(select(column).where(column.is_not(None)))
+            async for content in result:
+                if content:
+                    keep.add(cookie_store.digest(content))
+    return cookie_store.prune(keep)
+
+
+async def _db_size() -> int | None:
+    """SQLite: main file + WAL on disk; PostgreSQL: pg_database_size()."""
+    if engine.dialect.name == "postgresql":
+        try:
+            async with engine.connect() as conn:
+                return int((await conn.execute(text("SELECT pg_database_size(current_database())"))).scalar() or 0)
+        except Exception:
+            return None
+    try:
+        from services.database.backup import _resolve_db_path, get_sqlite_db_path
+
+        db_path = get_sqlite_db_path()
+        if not db_path:
+            return None
+        path = _resolve_db_path(db_path)
+        size = 0
+        for p in (path, path + "-wal"):
+            if os.path.exists(p):
+                size += os.path.getsize(p)
+        return size
+    except Exception:
+        return None
+
+
+async def _pragma_int(conn, name: str) -> int:
+    return int((await conn.execute(text(f"PRAGMA {name}"))).scalar() or 0)
+
+
+async def compact_database() -> str:
+    """Incremental VACUUM + ANALYZE. Returns a short description of what was done."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if conn.dialect.name == "postgresql":
+            # Plain VACUUM marks dead tuples reusable without the exclusive lock of VACUUM FULL.
+            await conn.execute(text("VACUUM (ANALYZE)"))
+            return "vacuum analyze"
+        if conn.dialect.name != "sqlite":
+            await conn.execute(text("ANALYZE"))
+            return "analyze"
+
+        page_size = await _pragma_int(conn, "page_size")
+        free_pages = await _pragma_int(conn, "freelist_count")
+        auto_vacuum = await _pragma_int(conn, "auto_vacuum")  # 0 none, 1 full, 2 incremental
+        free_bytes = page_size * free_pages
+
+        if auto_vacuum == 2:
+            # sqlite3's execute() steps the pragma once (= one page); executescript runs it to the end.
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript("PRAGMA incremental_vacuum;")
+            mode = "incremental_vacuum"
+        elif free_bytes >= max(0, settings.DB_VACUUM_MIN_FREE_MB) * 1024 * 1024:
+            # One-time full VACUUM that also switches the file to incremental mode.
+            await conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+            await conn.execute(text("VACUUM"))
+            mode = "vacuum (auto_vacuum -> incremental)"
+        else:
+            mode = "no vacuum needed"
+
+        await conn.execute(text("ANALYZE"))
+        try:
+            await conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        except Exception:
+            pass
+        return f"{mode}, freelist was {free_bytes / 1024 / 1024:.1f} MB"
+
+
+def _fmt_mb(size: int | None) -> str:
+    return "?" if size is None else f"{size / 1024 / 1024:.1f} MB"
+
+
+async def run_db_maintenance() -> dict:
+    started = time.monotonic()
+    size_before = await _db_size()
+    report: dict = {}
+
+    for name, job in (
+        ("user_requests", purge_user_requests),
+        ("bypass_markers", purge_stale_bypass_markers),
+        ("oauth_states", purge_expired_oauth_states),
+        ("odesli_cache", purge_expired_odesli_cache),
+        ("cookie_files", purge_orphan_cookie_files),
+    ):
+        try:
+            report[name] = await job()
+        except Exception:
+            logger.exception(f"DB maintenance: {name} cleanup failed")
+            report[name] = None
+
+    try:
+        report["compact"] = await compact_database()
+    except Exception as e:
+        logger.exception("DB maintenance: compaction failed")
+        report["compact"] = f"failed: {e}"
+
+    report["size_before"] = size_before
+    report["size_after"] = await _db_size()
+    report["took"] = time.monotonic() - started
+    return report
+
+
+def format_maintenance_report(report: dict) -> str:
+    def _n(v):
+        return "error" if v is None else str(v)
+
+    before, after = report.get("size_before"), report.get("size_after")
+    reclaimed = ""
+    if before is not None and after is not None:
+        reclaimed = f" (reclaimed {_fmt_mb(max(0, before - after))})"
+    return (
+        "🧹 DB maintenance\n"
+        f"user_requests deleted: {_n(report.get('user_requests'))}\n"
+        f"bypass markers dropped: {_n(report.get('bypass_markers'))}\n"
+        f"oauth_states purged: {_n(report.get('oauth_states'))}\n"
+        f"odesli_cache purged: {_n(report.get('odesli_cache'))}\n"
+        f"cookie files removed: {_n(report.get('cookie_files'))}\n"
+        f"compaction: {report.get('compact')}\n"
+        f"size: {_fmt_mb(before)} → {_fmt_mb(after)}{reclaimed}\n"
+        f"took: {report.get('took', 0):.1f}s"
+    )
+
+
+def _parse_hhmm(raw: str, default: tuple[int, int] = (4, 30)) -> tuple[int, int]:
+    try:
+        h, m = (int(x) for x in (raw or "").strip().split(":"))
+        if 0 <= h <= 23 and 0 <= m <= 59:
+            return h, m
+    except Exception:
+        pass
+    return default
+
+
+async def run_periodic_db_maintenance(bot) -> None:
+    """Run maintenance once per day at DB_MAINTENANCE_DAILY_AT (default 04:30, after the backup)."""
+    from services.database.backup import get_tech_chat_id
+    from services.database.repo import get_system_value, set_system_value
+
+    hour, minute = _parse_hhmm(settings.DB_MAINTENANCE_DAILY_AT)
+
+    async def _run_if_due(now: _dt.datetime) -> None:
+        today = now.strftime("%Y-%m-%d")
+        if now < now.replace(hour=hour, minute=minute, second=0, microsecond=0):
+            return
+        try:
+            if (await get_system_value(_KEY_LAST_DAY)) == today:
+                return
+        except Exception:
+            pass
+
+        report = await run_db_maintenance()
+        text_report = format_maintenance_report(report)
+        logger.info(text_report.replace("\n", "; "))
+        try:
+            await set_system_value(_KEY_LAST_DAY, today)
+        except Exception:
+            pass
+
+        tech_chat_id = get_tech_chat_id()
+        if tech_chat_id:
+            try:
+                await bot.send_message(tech_chat_id, text_report, parse_mode=None, disable_notification=True)
+            except Exception:
+                logger.exception("Failed to send DB maintenance report")
+
+    try:
+        await _run_if_due(_dt.datetime.now())
+    except Exception:
+        logger.exception("DB maintenance (startup) failed")
+
+    while True:
+        now = _dt.datetime.now()
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += _dt.timedelta(days=1)
+        await asyncio.sleep(max(30.0, (next_run - now).total_seconds()))
+        try:
+            await _run_if_due(_dt.datetime.now())
+        except Exception:
+            logger.exception("DB maintenance failed")
+            await asyncio.sleep(3600)
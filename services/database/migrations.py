@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Lightweight in-place schema migrations (the project has no Alembic).
+
+Called from init_db() right after create_all(); every step is idempotent, so it
+is safe to run on every start against both fresh and old databases.
+"""
+import logging
+
+from sqlalchemy import bindparam, inspect, select, text, update
+
+from services.database.models import MediaCache, MediaCacheBypass, SharedMediaCache, User, url_digest
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 1000
+
+# Tables that got the url_hash digest column after their first release.
+_URL_HASH_MODELS = (MediaCache, MediaCacheBypass, SharedMediaCache)
+
+
+async def _column_names(conn, table_name: str) -> set[str]:
+    def _names(sync_conn):
+        return {c["name"] for c in inspect(sync_conn).get_columns(table_name)}
+
+    return await conn.run_sync(_names)
+
+
+async def _ensure_column(engine, table, column_name: str) -> bool:
+    """ALTER TABLE ADD COLUMN if missing. Returns True when the column was added."""
+    async with engine.begin() as conn:
+        if column_name in await _column_names(conn, table.name):
+            return False
+        column = table.c[column_name]
+        col_type = column.type.compile(dialect=conn.dialect)
+        await conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_name} {col_type}'))
+        logger.info(f"DB migration: added {table.name}.{column_name}")
+        return True
+
+
+async def _backfill_url_hash(engine, table) -> int:
+    """Fill url_hash for rows written before the column existed, in small transactions."""
+    total = 0
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("_id"))
+        .values(url_hash=bindparam("_hash"))
+        .execution_options(synchronize_session=False)
+    )
+    while True:
+        async with engine.begin() as conn:
+            rows = (
+                await conn.execute(
+                    select(table.c.id, table.c.url).where(table.c.url_hash.is_(None)).limit(BACKFILL_BATCH)
+                )
+            ).all()
+            if not rows:
+                break
+            await conn.execute(stmt, [{"_id": row_id, "_hash": url_digest(url)} for row_id, url in rows])
+        total += len(rows)
+    if total:
+        logger.info(f"DB migration: backfilled url_hash for {total} rows in {table.name}")
+    return total
+
+
+async def _ensure_indexes(engine, table) -> None:
+    async with engine.begin() as conn:
+        for index in table.indexes:
+            await conn.run_sync(lambda sync_conn, idx=index: idx.create(sync_conn, checkfirst=True))
+
+
+async def run_migrations(engine) -> None:
+    for model in _URL_HASH_MODELS:
+        table = model.__table__
+        try:
+            await _ensure_column(engine, table, "url_hash")
+            await _backfill_url_hash(engine, table)
+            await _ensure_indexes(engine, table)
+        except Exception:
+            logger.exception(f"DB migration failed for {table.name}")
+
+    try:
+        # ix_users_first_seen_id (keyset pages in /users and the miniapp)
+        await _ensure_indexes(engine, User.__table__)
+    except Exception:
+        logger.exception("DB migration failed for users")
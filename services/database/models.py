@@ -1,6 +1,12 @@
 from sqlalchemy import BigInteger, String, Boolean, DateTime, Integer, Text, func, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from datetime import datetime
+import hashlib
+
+
+def url_digest(url: str | None) -> str:
+    """Fixed-width key for URL equality lookups (media_cache*.url_hash)."""
+    return hashlib.sha1((url or "").encode("utf-8")).hexdigest()
 
 class Base(DeclarativeBase):
     pass
@@ -9,7 +15,7 @@ class User(Base):
     __tablename__ = "users"
 
     # Основные данные
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)  # Telegram id
     username: Mapped[str | None] = mapped_column(String(255), nullable=True)
     full_name: Mapped[str] = mapped_column(String(255), default="Unknown")
     user_tag: Mapped[str | None] = mapped_column(String(255), nullable=True)
@@ -38,6 +44,11 @@ class User(Base):
     cookies_tiktok: Mapped[str | None] = mapped_column(Text, nullable=True)
     cookies_vk: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    __table_args__ = (
+        # /users and the miniapp list page with keyset pagination over (first_seen, id)
+        Index("ix_users_first_seen_id", "first_seen", "id"),
+    )
+
 
 class SystemSettings(Base):
     __tablename__ = "system_settings"
@@ -79,6 +90,7 @@ class MediaCache(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
     url: Mapped[str] = mapped_column(Text)  # normalized/cleaned URL
+    url_hash: Mapped[str | None] = mapped_column(String(40), nullable=True)  # url_digest(url)
 
     media_type: Mapped[str] = mapped_column(String(16))  # video|audio|photo|document
     file_id: Mapped[str] = mapped_column(String(512))
@@ -88,11 +100,40 @@ class MediaCache(Base):
     last_used_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
 
     __table_args__ = (
-        UniqueConstraint("user_id", "url", "media_type", name="uq_media_cache_user_url_type"),
+        # Older DBs also keep uq_media_cache_user_url_type (user_id, url, media_type).
+        Index("uq_media_cache_user_urlhash_type", "user_id", "url_hash", "media_type", unique=True),
         Index("ix_media_cache_user_type", "user_id", "media_type"),
     )
 
 
+class SharedMediaCache(Base):
+    """Opt-in cross-user content cache: (url, media_type, profile) -> Telegram file_id.
+
+    profile identifies the download options (see platform_manager.options_profile),
+    so audio/video/format variants of the same URL never mix. Per-user media_cache
+    rows are still written on every delivery for history and /edituser.
+    """
+
+    __tablename__ = "media_cache_shared"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    url: Mapped[str] = mapped_column(Text)  # normalized/cleaned URL
+    url_hash: Mapped[str | None] = mapped_column(String(40), nullable=True)  # url_digest(url)
+    media_type: Mapped[str] = mapped_column(String(16))
+    profile: Mapped[str] = mapped_column(String(32), default="")
+    file_id: Mapped[str] = mapped_column(Text)
+    title: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), index=True)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("uq_media_cache_shared_urlhash_type_profile", "url_hash", "media_type", "profile", unique=True),
+    )
+
+
 class MediaCacheBypass(Base):
     """Marks a (user_id, url, media_type) cache binding as bypassed.
 
@@ -106,15 +147,34 @@ class MediaCacheBypass(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
     url: Mapped[str] = mapped_column(Text)
+    url_hash: Mapped[str | None] = mapped_column(String(40), nullable=True)  # url_digest(url)
     media_type: Mapped[str] = mapped_column(String(16))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), index=True)
 
     __table_args__ = (
-        UniqueConstraint("user_id", "url", "media_type", name="uq_media_cache_bypass_user_url_type"),
+        # Older DBs also keep uq_media_cache_bypass_user_url_type (user_id, url, media_type).
+        Index("uq_media_cache_bypass_user_urlhash_type", "user_id", "url_hash", "media_type", unique=True),
         Index("ix_media_cache_bypass_user_type", "user_id", "media_type"),
     )
 
 
+class OdesliCache(Base):
+    """song.link answers by cleaned URL (services/odesli_service.py).
+
+    payload is the {"page", "links"} JSON; NULL marks a negative entry (failed lookup),
+    kept only until its shorter expires_at.
+    """
+
+    __tablename__ = "odesli_cache"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    url: Mapped[str] = mapped_column(Text)
+    url_hash: Mapped[str] = mapped_column(String(40), unique=True)  # url_digest(url)
+    payload: Mapped[str | None] = mapped_column(Text, nullable=True)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
 class UserRequest(Base):
     __tablename__ = "user_requests"
 
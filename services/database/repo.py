@@ -1,9 +1,17 @@
-from sqlalchemy import select, update, func
+from sqlalchemy import select, update, func, and_, or_, case, text
 from sqlalchemy import delete
-from sqlalchemy.dialects.sqlite import insert
 from datetime import datetime, timedelta
-from services.database.core import session_maker 
-from services.database.models import User, SystemSettings, GlobalCookies, UserCookies, MediaCache, MediaCacheBypass, UserRequest, UserOAuthToken, OAuthState, UserPreference
+import asyncio
+import json
+import time
+import settings
+from cachetools import TTLCache
+from services.database.core import session_maker, dialect_insert as insert, DB_DIALECT
+from services.database.user_pages import build_page, users_page_stmt
+from services.database.write_behind import activity_buffer, history_writer
+from core.update_context import get_user_snapshot, patch_user_snapshot
+from services.cookie_store import cookie_store
+from services.database.models import User, SystemSettings, GlobalCookies, UserCookies, MediaCache, MediaCacheBypass, SharedMediaCache, OdesliCache, UserRequest, UserOAuthToken, OAuthState, UserPreference, url_digest
 
 # === РАБОТА С ПОЛЬЗОВАТЕЛЯМИ ===
 
@@ -65,6 +73,124 @@ async def get_user(user_id: int) -> User | None:
         return result.scalar_one_or_none()
 
 
+async def get_user_cached(user_id: int) -> User | None:
+    """Row resolved for the current update (see core.update_context), or a fresh SELECT."""
+    snap = get_user_snapshot(user_id)
+    if snap is not None:
+        return snap
+    return await get_user(user_id)
+
+
+def _profile_update_data(user: User, user_id: int, username: str | None, full_name: str, tag: str | None, now: datetime) -> dict:
+    hours_passed = 9999.0
+    try:
+        if user.username_updated_at:
+            hours_passed = (now - user.username_updated_at).total_seconds() / 3600
+    except Exception:
+        hours_passed = 9999.0
+
+    allow_profile_refresh = hours_passed >= 24
+    bump_profile_ts = False
+
+    # last_seen/is_active go through the write-behind buffer (see ensure_users_exist)
+    update_data = {}
+
+    # Tag may change (e.g., group->supergroup)
+    if tag and tag != user.user_tag:
+        update_data["user_tag"] = tag
+
+    # Users: keep full_name reasonably fresh
+    if user_id > 0:
+        if full_name and full_name != user.full_name:
+            update_data["full_name"] = full_name
+
+    # Groups/chats: update title not more than once per 24h
+    if user_id < 0:
+        desired_title = full_name
+        if desired_title:
+            if not user.full_name:
+                update_data["full_name"] = desired_title
+            elif allow_profile_refresh and desired_title != user.full_name:
+                update_data["full_name"] = desired_title
+                bump_profile_ts = True
+
+    # Username: update not more than once per 24h (or if empty)
+    if username:
+        if not user.username:
+            update_data["username"] = username
+        elif allow_profile_refresh and username != user.username:
+            update_data["username"] = username
+            bump_profile_ts = True
+
+    if bump_profile_ts and allow_profile_refresh:
+        update_data["username_updated_at"] = now
+
+    return update_data
+
+
+async def ensure_users_exist(entries: list[dict]) -> tuple[dict[int, User], set[int]]:
+    """Batch variant of ensure_user_exists: one SELECT for every id, one transaction.
+
+    entries: dicts with keys user_id, username, full_name, tag, language.
+    Returns ({id: User}, {ids created by this call}).
+    """
+    entries = [e for e in entries if isinstance(e.get("user_id"), int)]
+    if not entries:
+        return {}, set()
+
+    ids = [e["user_id"] for e in entries]
+    created: set[int] = set()
+    async with session_maker() as session:
+        async with session.begin():
+            res = await session.execute(select(User).where(User.id.in_(ids)))
+            rows = {u.id: u for u in res.scalars().all()}
+            now = datetime.now()
+
+            new_rows: dict[int, dict] = {}
+            for e in entries:
+                user_id = e["user_id"]
+                user = rows.get(user_id)
+                if user:
+                    # Attribute writes are flushed as a single UPDATE on commit and keep
+                    # the returned object current without re-selecting it.
+                    update_data = _profile_update_data(user, user_id, e.get("username"), e.get("full_name"), e.get("tag"), now)
+                    for key, value in update_data.items():
+                        setattr(user, key, value)
+                    activity_buffer.touch(user_id, seen_at=now)
+                elif user_id not in new_rows:
+                    new_rows[user_id] = {
+                        "id": user_id,
+                        "username": e.get("username"),
+                        "full_name": e.get("full_name"),
+                        "user_tag": e.get("tag") or "",
+                        "language": e.get("language") or "en",
+                        "is_active": True,
+                    }
+
+            if new_rows:
+                # RETURNING loads server defaults (first_seen, ...); DO NOTHING covers a
+                # concurrent update that registered the same id first.
+                stmt = insert(User).values(list(new_rows.values())).on_conflict_do_nothing(index_elements=[User.id])
+                res = await session.scalars(stmt.returning(User), execution_options={"populate_existing": True})
+                inserted = {u.id: u for u in res.all()}
+                rows.update(inserted)
+                created.update(inserted)
+                counted = [uid for uid in inserted if uid != 777000]
+                _user_stats_add(total=len(counted), active=len(counted), groups=sum(1 for uid in counted if uid < 0))
+                lost = [uid for uid in new_rows if uid not in inserted]
+                if lost:
+                    res = await session.execute(select(User).where(User.id.in_(lost)))
+                    rows.update({u.id: u for u in res.scalars().all()})
+
+    # Reflect the buffered activity on the returned (detached) rows.
+    for user_id, user in rows.items():
+        if user_id not in created:
+            user.last_seen = now
+            user.is_active = True
+
+    return rows, created
+
+
 async def ensure_user_exists(
     user_id: int,
     username: str | None,
@@ -73,74 +199,10 @@ async def ensure_user_exists(
     language: str = "en",
 ) -> User:
     """Create user/group record if missing. Does NOT increment request_count for existing users."""
-    async with session_maker() as session:
-        async with session.begin():
-            existing = await session.execute(select(User).where(User.id == user_id))
-            user = existing.scalar_one_or_none()
-            if user:
-                now = datetime.now()
-                hours_passed = 9999.0
-                try:
-                    if user.username_updated_at:
-                        hours_passed = (now - user.username_updated_at).total_seconds() / 3600
-                except Exception:
-                    hours_passed = 9999.0
-
-                allow_profile_refresh = hours_passed >= 24
-                bump_profile_ts = False
-
-                update_data = {
-                    "last_seen": now,
-                    "is_active": True,
-                }
-
-                # Tag may change (e.g., group->supergroup)
-                if tag:
-                    update_data["user_tag"] = tag
-
-                # Users: keep full_name reasonably fresh
-                if user_id > 0:
-                    if full_name and full_name != user.full_name:
-                        update_data["full_name"] = full_name
-
-                # Groups/chats: update title not more than once per 24h
-                if user_id < 0:
-                    desired_title = full_name
-                    if desired_title:
-                        if not user.full_name:
-                            update_data["full_name"] = desired_title
-                        elif allow_profile_refresh and desired_title != user.full_name:
-                            update_data["full_name"] = desired_title
-                            bump_profile_ts = True
-
-                # Username: update not more than once per 24h (or if empty)
-                if username:
-                    if not user.username:
-                        update_data["username"] = username
-                    elif allow_profile_refresh and username != user.username:
-                        update_data["username"] = username
-                        bump_profile_ts = True
-
-                if bump_profile_ts and allow_profile_refresh:
-                    update_data["username_updated_at"] = now
-
-                if update_data:
-                    stmt = update(User).where(User.id == user_id).values(**update_data)
-                    await session.execute(stmt)
-            else:
-                session.add(
-                    User(
-                        id=user_id,
-                        username=username,
-                        full_name=full_name,
-                        user_tag=tag or "",
-                        language=language or "en",
-                        is_active=True,
-                    )
-                )
-
-            result = await session.execute(select(User).where(User.id == user_id))
-            return result.scalar_one()
+    rows, _ = await ensure_users_exist(
+        [{"user_id": user_id, "username": username, "full_name": full_name, "tag": tag, "language": language}]
+    )
+    return rows[user_id]
 
 
 async def delete_user(user_id: int) -> bool:
@@ -178,6 +240,9 @@ async def delete_user(user_id: int) -> bool:
                 pass
 
             res = await session.execute(delete(User).where(User.id == user_id))
+            invalidate_media_hot_cache()
+            _user_stats_invalidate()
+            cookie_store.invalidate_user(user_id)
             try:
                 return res.rowcount > 0
             except Exception:
@@ -191,25 +256,79 @@ async def get_all_users():
         return result.scalars().all()
 
 
-async def get_basic_user_stats() -> dict:
-    """Return basic aggregated user stats.
+# Counters for /status: primed by one aggregate query, then kept current in-process
+# (new users, requests). Ban/unban/delete only mark them stale; a full re-sync also
+# happens every USER_STATS_RESYNC_SECONDS (covers writes from the miniapp).
+_user_stats: dict | None = None
+_user_stats_at: float = 0.0
 
-    Keys: total, active, banned, request_count
-    """
-    async with session_maker() as session:
-        total = await session.scalar(select(func.count()).select_from(User).where(User.id != 777000))
-        active = await session.scalar(select(func.count()).select_from(User).where(User.id != 777000, User.is_active == True))
-        banned = await session.scalar(select(func.count()).select_from(User).where(User.id != 777000, User.is_banned == True))
-        req_sum = await session.scalar(select(func.sum(User.request_count)).where(User.id != 777000))
 
+async def _aggregate_user_stats() -> dict:
+    async with session_maker() as session:
+        res = await session.execute(
+            select(
+                func.count(),
+                func.sum(case((User.is_active == True, 1), else_=0)),
+                func.sum(case((User.is_banned == True, 1), else_=0)),
+                func.sum(case((User.id < 0, 1), else_=0)),
+                func.sum(User.request_count),
+            ).where(User.id != 777000)
+        )
+        total, active, banned, groups, req_sum = res.one()
     return {
         "total": int(total or 0),
         "active": int(active or 0),
         "banned": int(banned or 0),
-        "request_count": int(req_sum or 0),
+        "groups": int(groups or 0),
+        # + increments still sitting in the write-behind buffer
+        "request_count": int(req_sum or 0) + activity_buffer.pending_requests(),
     }
 
 
+def _user_stats_add(**deltas) -> None:
+    if _user_stats is None:
+        return
+    for key, delta in deltas.items():
+        _user_stats[key] = _user_stats.get(key, 0) + delta
+
+
+def _user_stats_invalidate() -> None:
+    global _user_stats
+    _user_stats = None
+
+
+async def get_basic_user_stats(max_age: float | None = None) -> dict:
+    """Return basic aggregated user stats.
+
+    Keys: total, active, banned, groups, request_count
+    """
+    global _user_stats, _user_stats_at
+    max_age = settings.USER_STATS_RESYNC_SECONDS if max_age is None else max_age
+    if _user_stats is None or time.monotonic() - _user_stats_at > max_age:
+        _user_stats = await _aggregate_user_stats()
+        _user_stats_at = time.monotonic()
+    return dict(_user_stats)
+
+
+async def get_users_page(limit: int = 20, after: str | None = None, before: str | None = None) -> dict:
+    """One page of the admin user list, newest first (keyset, see user_pages).
+
+    Returns {"items": [User], "prev": cursor | None, "next": cursor | None}.
+    """
+    stmt = users_page_stmt(DB_DIALECT, limit, after=after, before=before)
+    async with session_maker() as session:
+        res = await session.execute(stmt)
+        return build_page(res.all(), limit, after=after, before=before)
+
+
+async def ping_db() -> float:
+    """DB round-trip (SELECT 1) in ms."""
+    started = time.perf_counter()
+    async with session_maker() as session:
+        await session.execute(text("SELECT 1"))
+    return (time.perf_counter() - started) * 1000
+
+
 # === USER PREFERENCES (per-user key/value) ===
 
 async def get_user_pref(user_id: int, key: str) -> str | None:
@@ -352,11 +471,8 @@ async def upsert_user_oauth_token(
                     "updated_at": now,
                 },
             )
-            await session.execute(stmt)
-            res = await session.execute(
-                select(UserOAuthToken).where(UserOAuthToken.user_id == user_id, UserOAuthToken.service == service)
-            )
-            return res.scalar_one()
+            res = await session.scalars(stmt.returning(UserOAuthToken), execution_options={"populate_existing": True})
+            return res.one()
 
 
 async def delete_user_oauth_token(user_id: int, service: str) -> bool:
@@ -374,40 +490,148 @@ async def delete_user_oauth_token(user_id: int, service: str) -> bool:
 
 # === MEDIA CACHE (per-user) ===
 
-async def get_cached_media(user_id: int, url: str, media_type: str) -> MediaCache | None:
-    """Return cached media for this user+url+type (never cross-user)."""
-    if not url:
+# Cache epochs (system_settings): bindings last used at/before the global epoch, or
+# inside a [start, end] window set by "/clearcache 1h", are ignored at lookup time.
+_EPOCH_ALL_KEY = "media_cache_epoch"
+_EPOCH_WINDOWS_KEY = "media_cache_epoch_windows"
+_MAX_EPOCH_WINDOWS = 32
+_cache_epochs: dict | None = None
+
+
+def _parse_dt(raw) -> datetime | None:
+    try:
+        return datetime.fromisoformat(str(raw)) if raw else None
+    except Exception:
+        return None
+
+
+async def _get_cache_epochs() -> dict:
+    global _cache_epochs
+    if _cache_epochs is None:
+        epoch_all = _parse_dt(await get_system_value(_EPOCH_ALL_KEY))
+        windows = []
+        try:
+            for start, end in json.loads(await get_system_value(_EPOCH_WINDOWS_KEY) or "[]"):
+                start, end = _parse_dt(start), _parse_dt(end)
+                if start and end:
+                    windows.append((start, end))
+        except Exception:
+            windows = []
+        _cache_epochs = {"all": epoch_all, "windows": windows}
+    return _cache_epochs
+
+
+async def _save_cache_epochs(epoch_all: datetime | None, windows: list[tuple[datetime, datetime]]) -> None:
+    global _cache_epochs
+    # Windows fully covered by the global epoch are redundant.
+    if epoch_all is not None:
+        windows = [(s, e) for s, e in windows if e > epoch_all]
+    windows.sort()
+    # Keep the list short: merge the two oldest windows (may over-invalidate, never under).
+    while len(windows) > _MAX_EPOCH_WINDOWS:
+        (s1, e1), (s2, e2) = windows[0], windows[1]
+        windows = [(min(s1, s2), max(e1, e2))] + windows[2:]
+
+    now = datetime.now()
+    values = {
+        _EPOCH_ALL_KEY: epoch_all.isoformat() if epoch_all else "",
+        _EPOCH_WINDOWS_KEY: json.dumps([[s.isoformat(), e.isoformat()] for s, e in windows]),
+    }
+    async with session_maker() as session:
+        async with session.begin():
+            for key, value in values.items():
+                stmt = insert(SystemSettings).values(key=key, value=value, updated_at=now)
+                stmt = stmt.on_conflict_do_update(index_elements=[SystemSettings.key], set_={"value": value, "updated_at": now})
+                await session.execute(stmt)
+    for key, value in values.items():
+        _settings_cache_put(key, value)
+    _cache_epochs = {"all": epoch_all, "windows": windows}
+    invalidate_media_hot_cache()
+
+
+def _hidden_by_epoch(ts: datetime | None, epochs: dict) -> bool:
+    if ts is None:
+        return False
+    epoch_all = epochs.get("all")
+    if epoch_all is not None and ts <= epoch_all:
+        return True
+    return any(start <= ts <= end for start, end in epochs.get("windows") or ())
+
+
+# Hot tier: (user_id, url) -> {media_type: MediaCache | None}. Negative entries are
+# cached too; upsert/bypass/clearcache paths keep it coherent.
+_MEDIA_HOT = TTLCache(maxsize=settings.MEDIA_CACHE_HOT_SIZE, ttl=settings.MEDIA_CACHE_HOT_TTL)
+
+
+def invalidate_media_hot_cache(user_id: int | None = None, url: str | None = None) -> None:
+    if user_id is None:
+        _MEDIA_HOT.clear()
+        return
+    _MEDIA_HOT.pop((user_id, url), None)
+
+
+def _hot_store(user_id: int, url: str, media_type: str, row: MediaCache | None) -> None:
+    key = (user_id, url)
+    entry = _MEDIA_HOT.get(key)
+    if entry is None:
+        entry = {}
+    entry[media_type] = row
+    _MEDIA_HOT[key] = entry
+
+
+async def get_cached_media_multi(user_id: int, url: str, media_types: list[str] | tuple[str, ...]) -> MediaCache | None:
+    """Return the first non-bypassed cache row for user+url among media_types (in priority order).
+
+    One joined query (media_cache LEFT JOIN media_cache_bypass) for all types; results
+    (including misses) are kept in the in-memory hot tier.
+    """
+    if not url or not media_types:
+        return None
+    media_types = list(dict.fromkeys(media_types))
+
+    entry = _MEDIA_HOT.get((user_id, url))
+    if entry is not None and all(mt in entry for mt in media_types):
+        for mt in media_types:
+            if entry.get(mt) is not None:
+                return entry[mt]
         return None
+
     async with session_maker() as session:
         res = await session.execute(
-            select(MediaCache).where(
+            select(MediaCache)
+            .outerjoin(
+                MediaCacheBypass,
+                and_(
+                    MediaCacheBypass.user_id == MediaCache.user_id,
+                    MediaCacheBypass.url_hash == MediaCache.url_hash,
+                    MediaCacheBypass.media_type == MediaCache.media_type,
+                ),
+            )
+            .where(
                 MediaCache.user_id == user_id,
+                MediaCache.url_hash == url_digest(url),
                 MediaCache.url == url,
-                MediaCache.media_type == media_type,
+                MediaCache.media_type.in_(media_types),
+                # A bypass marker newer than the cache row hides it.
+                or_(MediaCacheBypass.created_at.is_(None), MediaCacheBypass.created_at < MediaCache.last_used_at),
             )
         )
-        row = res.scalar_one_or_none()
-        if not row:
-            return None
+        rows = list(res.scalars().all())
 
-        # If there's a bypass marker newer than this cache row, ignore it.
-        try:
-            b = await session.execute(
-                select(MediaCacheBypass).where(
-                    MediaCacheBypass.user_id == user_id,
-                    MediaCacheBypass.url == url,
-                    MediaCacheBypass.media_type == media_type,
-                )
-            )
-            bypass = b.scalar_one_or_none()
-            if bypass and getattr(bypass, "created_at", None) and getattr(row, "last_used_at", None):
-                if bypass.created_at >= row.last_used_at:
-                    return None
-        except Exception:
-            # If bypass lookup fails, don't break normal cache behavior.
-            pass
+    epochs = await _get_cache_epochs()
+    found = {row.media_type: row for row in rows if not _hidden_by_epoch(row.last_used_at, epochs)}
+
+    for mt in media_types:
+        _hot_store(user_id, url, mt, found.get(mt))
+    for mt in media_types:
+        if mt in found:
+            return found[mt]
+    return None
 
-        return row
+
+async def get_cached_media(user_id: int, url: str, media_type: str) -> MediaCache | None:
+    """Return cached media for this user+url+type (never cross-user)."""
+    return await get_cached_media_multi(user_id, url, [media_type])
 
 
 async def bypass_cached_media(user_id: int, url: str, media_type: str) -> None:
@@ -420,73 +644,41 @@ async def bypass_cached_media(user_id: int, url: str, media_type: str) -> None:
             stmt = insert(MediaCacheBypass).values(
                 user_id=user_id,
                 url=url,
+                url_hash=url_digest(url),
                 media_type=media_type,
                 created_at=now,
             )
             stmt = stmt.on_conflict_do_update(
-                index_elements=[MediaCacheBypass.user_id, MediaCacheBypass.url, MediaCacheBypass.media_type],
+                index_elements=[MediaCacheBypass.user_id, MediaCacheBypass.url_hash, MediaCacheBypass.media_type],
                 set_={"created_at": now},
             )
             await session.execute(stmt)
+    invalidate_media_hot_cache(user_id, url)
 
 
-async def bypass_media_cache_recent(seconds: int | None = None) -> int:
+async def bypass_media_cache_recent(seconds: int | None = None) -> None:
     """Bypass cache bindings for rows used within the last `seconds`.
 
-    Returns number of MediaCache rows targeted (best-effort count).
+    Constant-time: records a time-window epoch instead of per-row bypass markers
+    (no count over media_cache either).
     """
     if not seconds or seconds <= 0:
-        return 0
+        return
     now = datetime.now()
     cutoff = now - timedelta(seconds=int(seconds))
 
-    async with session_maker() as session:
-        async with session.begin():
-            rows = await session.execute(
-                select(MediaCache.user_id, MediaCache.url, MediaCache.media_type)
-                .where(MediaCache.last_used_at >= cutoff)
-            )
-            items = list(rows.all())
-            if not items:
-                return 0
-
-            # Upsert bypass markers (SQLite-friendly per-row upsert)
-            for uid, url, mt in items:
-                try:
-                    stmt = insert(MediaCacheBypass).values(user_id=uid, url=url, media_type=mt, created_at=now)
-                    stmt = stmt.on_conflict_do_update(
-                        index_elements=[MediaCacheBypass.user_id, MediaCacheBypass.url, MediaCacheBypass.media_type],
-                        set_={"created_at": now},
-                    )
-                    await session.execute(stmt)
-                except Exception:
-                    continue
-            return len(items)
-
-
-async def bypass_media_cache_all() -> int:
+    epochs = await _get_cache_epochs()
+    windows = list(epochs["windows"]) + [(cutoff, now)]
+    await _save_cache_epochs(epochs["all"], windows)
+
+
+async def bypass_media_cache_all() -> None:
     """Bypass all cache bindings currently present in media_cache.
 
-    Returns number of MediaCache rows targeted (best-effort count).
+    Constant-time: bumps the global cache epoch; rows stay for /edituser.
     """
     now = datetime.now()
-    async with session_maker() as session:
-        async with session.begin():
-            rows = await session.execute(select(MediaCache.user_id, MediaCache.url, MediaCache.media_type))
-            items = list(rows.all())
-            if not items:
-                return 0
-            for uid, url, mt in items:
-                try:
-                    stmt = insert(MediaCacheBypass).values(user_id=uid, url=url, media_type=mt, created_at=now)
-                    stmt = stmt.on_conflict_do_update(
-                        index_elements=[MediaCacheBypass.user_id, MediaCacheBypass.url, MediaCacheBypass.media_type],
-                        set_={"created_at": now},
-                    )
-                    await session.execute(stmt)
-                except Exception:
-                    continue
-            return len(items)
+    await _save_cache_epochs(now, [])
 
 
 async def upsert_cached_media(
@@ -495,14 +687,23 @@ async def upsert_cached_media(
     file_id: str,
     media_type: str,
     title: str | None = None,
+    profile: str | None = None,
 ) -> MediaCache:
-    """Insert/update cache row. Cache is strictly user-scoped."""
+    """Insert/update cache row. The row is user-scoped; with `profile` and
+    SHARED_MEDIA_CACHE on, the file_id is also published to the shared layer."""
+    if profile is not None and settings.SHARED_MEDIA_CACHE:
+        try:
+            if not await cookie_store.has_personal_cookies(user_id):
+                await upsert_shared_media(url, media_type, profile, file_id, title=title)
+        except Exception:
+            pass
     async with session_maker() as session:
         async with session.begin():
             now = datetime.now()
             stmt = insert(MediaCache).values(
                 user_id=user_id,
                 url=url,
+                url_hash=url_digest(url),
                 file_id=file_id,
                 media_type=media_type,
                 title=title,
@@ -510,7 +711,7 @@ async def upsert_cached_media(
                 last_used_at=now,
             )
             stmt = stmt.on_conflict_do_update(
-                index_elements=[MediaCache.user_id, MediaCache.url, MediaCache.media_type],
+                index_elements=[MediaCache.user_id, MediaCache.url_hash, MediaCache.media_type],
                 set_={
                     "file_id": file_id,
                     "media_type": media_type,
@@ -518,16 +719,10 @@ async def upsert_cached_media(
                     "last_used_at": now,
                 },
             )
-            await session.execute(stmt)
-
-            res = await session.execute(
-                select(MediaCache).where(
-                    MediaCache.user_id == user_id,
-                    MediaCache.url == url,
-                    MediaCache.media_type == media_type,
-                )
-            )
-            return res.scalar_one()
+            res = await session.scalars(stmt.returning(MediaCache), execution_options={"populate_existing": True})
+            row = res.one()
+    _hot_store(user_id, url, media_type, row)
+    return row
 
 
 async def get_cached_media_by_id(cache_id: int) -> MediaCache | None:
@@ -536,6 +731,148 @@ async def get_cached_media_by_id(cache_id: int) -> MediaCache | None:
         return res.scalar_one_or_none()
 
 
+# === MEDIA CACHE (shared, opt-in via SHARED_MEDIA_CACHE) ===
+
+async def user_has_personal_cookies(user_id: int) -> bool:
+    """Downloads made with personal cookies may contain private content: never share them."""
+    user = await get_user_cached(user_id)
+    if user and (user.cookies_youtube or user.cookies_tiktok or user.cookies_vk):
+        return True
+    async with session_maker() as session:
+        res = await session.execute(select(UserCookies.id).where(UserCookies.user_id == user_id).limit(1))
+        return res.first() is not None
+
+
+async def upsert_shared_media(url: str, media_type: str, profile: str, file_id: str, title: str | None = None) -> None:
+    if not url or not file_id:
+        return
+    async with session_maker() as session:
+        async with session.begin():
+            now = datetime.now()
+            stmt = insert(SharedMediaCache).values(
+                url=url,
+                url_hash=url_digest(url),
+                media_type=media_type,
+                profile=profile or "",
+                file_id=file_id,
+                title=title,
+                hits=0,
+                created_at=now,
+                updated_at=now,
+                last_used_at=now,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SharedMediaCache.url_hash, SharedMediaCache.media_type, SharedMediaCache.profile],
+                set_={"file_id": file_id, "title": title, "updated_at": now, "last_used_at": now},
+            )
+            await session.execute(stmt)
+
+
+async def get_odesli_cache(url: str) -> tuple[bool, dict | None, datetime | None]:
+    """(found, payload, expires_at) for a live odesli_cache row; payload None = negative entry."""
+    async with session_maker() as session:
+        res = await session.execute(
+            select(OdesliCache.url, OdesliCache.payload, OdesliCache.expires_at).where(
+                OdesliCache.url_hash == url_digest(url),
+                OdesliCache.expires_at > datetime.now(),
+            )
+        )
+        row = res.first()
+    if not row or row.url != url:
+        return False, None, None
+    try:
+        payload = json.loads(row.payload) if row.payload else None
+    except Exception:
+        payload = None
+    return True, payload, row.expires_at
+
+
+async def set_odesli_cache(url: str, payload: dict | None, ttl_seconds: int) -> None:
+    now = datetime.now()
+    data = json.dumps(payload, ensure_ascii=False) if payload is not None else None
+    expires_at = now + timedelta(seconds=max(1, int(ttl_seconds)))
+    async with session_maker() as session:
+        async with session.begin():
+            stmt = insert(OdesliCache).values(
+                url=url,
+                url_hash=url_digest(url),
+                payload=data,
+                fetched_at=now,
+                expires_at=expires_at,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[OdesliCache.url_hash],
+                set_={"url": url, "payload": data, "fetched_at": now, "expires_at": expires_at},
+            )
+            await session.execute(stmt)
+
+
+async def lookup_cached_media(
+    user_id: int,
+    url: str,
+    media_type: str | list[str] | tuple[str, ...],
+    profile: str | None = None,
+) -> MediaCache | None:
+    """Per-user cache first, then (SHARED_MEDIA_CACHE) the cross-user layer.
+
+    media_type may be a list of candidate types in priority order; check
+    row.media_type for the one that hit. A shared hit is copied into the user's
+    media_cache row, so callers always get a MediaCache (history cache_id,
+    /edituser keep working). A per-user bypass marker newer than the shared
+    entry hides it as well.
+    """
+    media_types = [media_type] if isinstance(media_type, str) else list(media_type)
+    cached = await get_cached_media_multi(user_id, url, media_types)
+    if cached or profile is None or not settings.SHARED_MEDIA_CACHE:
+        return cached
+
+    async with session_maker() as session:
+        res = await session.execute(
+            select(SharedMediaCache, MediaCacheBypass.created_at)
+            .outerjoin(
+                MediaCacheBypass,
+                and_(
+                    MediaCacheBypass.user_id == user_id,
+                    MediaCacheBypass.url_hash == SharedMediaCache.url_hash,
+                    MediaCacheBypass.media_type == SharedMediaCache.media_type,
+                ),
+            )
+            .where(
+                SharedMediaCache.url_hash == url_digest(url),
+                SharedMediaCache.url == url,
+                SharedMediaCache.media_type.in_(media_types),
+                SharedMediaCache.profile == profile,
+            )
+        )
+        rows = list(res.all())
+
+    epochs = await _get_cache_epochs()
+    candidates = {}
+    for shared, bypassed_at in rows:
+        if bypassed_at and shared.updated_at and bypassed_at >= shared.updated_at:
+            continue
+        if _hidden_by_epoch(shared.updated_at, epochs):
+            continue
+        candidates[shared.media_type] = shared
+
+    shared = next((candidates[mt] for mt in media_types if mt in candidates), None)
+    if not shared:
+        return None
+
+    try:
+        async with session_maker() as session:
+            async with session.begin():
+                await session.execute(
+                    update(SharedMediaCache)
+                    .where(SharedMediaCache.id == shared.id)
+                    .values(hits=SharedMediaCache.hits + 1, last_used_at=datetime.now())
+                )
+    except Exception:
+        pass
+
+    return await upsert_cached_media(user_id, url, shared.file_id, shared.media_type, title=shared.title)
+
+
 # === USER REQUEST HISTORY ===
 
 async def log_user_request(
@@ -548,20 +885,19 @@ async def log_user_request(
     cache_hit: bool = False,
     cache_id: int | None = None,
 ) -> None:
-    async with session_maker() as session:
-        async with session.begin():
-            session.add(
-                UserRequest(
-                    user_id=user_id,
-                    kind=kind,
-                    input_text=input_text,
-                    url=url,
-                    media_type=media_type,
-                    title=title,
-                    cache_hit=cache_hit,
-                    cache_id=cache_id,
-                )
-            )
+    """Queue a history row; history_writer bulk-inserts it in the background."""
+    history_writer.enqueue(
+        {
+            "user_id": user_id,
+            "kind": kind,
+            "input_text": input_text,
+            "url": url,
+            "media_type": media_type,
+            "title": title,
+            "cache_hit": bool(cache_hit),
+            "cache_id": cache_id,
+        }
+    )
 
 
 async def get_user_requests(user_id: int, limit: int = 10, offset: int = 0) -> list[UserRequest]:
@@ -588,14 +924,10 @@ async def get_user_request_by_id(req_id: int) -> UserRequest | None:
         return res.scalar_one_or_none()
 
 async def increment_request_count(user_id: int):
-    """Увеличивает счетчик запросов пользователя."""
-    async with session_maker() as session:
-        async with session.begin():
-            user = await session.execute(select(User).where(User.id == user_id))
-            u = user.scalar_one_or_none()
-            if u:
-                u.request_count += 1
-                u.last_seen = datetime.now()
+    """Увеличивает счетчик запросов пользователя (write-behind, см. write_behind.activity_buffer)."""
+    activity_buffer.touch(user_id, requests=1)
+    if user_id != 777000:
+        _user_stats_add(request_count=1)
 
 # === УПРАВЛЕНИЕ БАНАМИ ===
 
@@ -609,7 +941,9 @@ async def ban_user(user_id: int, reason: str = "Admin ban") -> bool:
                 is_active=False
             )
             result = await session.execute(stmt)
-            return result.rowcount > 0
+    patch_user_snapshot(user_id, is_banned=True, ban_reason=reason, is_active=False)
+    _user_stats_invalidate()
+    return result.rowcount > 0
 
 async def unban_user(user_id: int) -> bool:
     """Разбанивает пользователя."""
@@ -621,11 +955,13 @@ async def unban_user(user_id: int) -> bool:
                 is_active=True
             )
             result = await session.execute(stmt)
-            return result.rowcount > 0
+    patch_user_snapshot(user_id, is_banned=False, ban_reason=None, is_active=True)
+    _user_stats_invalidate()
+    return result.rowcount > 0
 
 async def is_user_banned(user_id: int) -> bool:
     """Проверяет, заблокирован ли пользователь."""
-    user = await get_user(user_id)
+    user = await get_user_cached(user_id)
     return user and user.is_banned
 
 # === УПРАВЛЕНИЕ ЯЗЫКОМ ===
@@ -636,10 +972,11 @@ async def set_user_language(user_id: int, language_code: str):
         async with session.begin():
             stmt = update(User).where(User.id == user_id).values(language=language_code)
             await session.execute(stmt)
+    patch_user_snapshot(user_id, language=language_code)
 
 async def get_user_language(user_id: int) -> str:
     """Получает язык пользователя."""
-    user = await get_user(user_id)
+    user = await get_user_cached(user_id)
     return user.language if user else "en"
 
 # === УПРАВЛЕНИЕ КУКИ (Персональные) ===
@@ -672,13 +1009,17 @@ async def save_user_cookie(user_id: int, platform: str, cookie_data: str):
             else:
                 session.add(UserCookies(user_id=user_id, platform=plat, cookies_data=cookie_data))
 
+    if plat in ("youtube", "tiktok", "vk"):
+        patch_user_snapshot(user_id, **{f"cookies_{plat}": cookie_data})
+    cookie_store.invalidate_user(user_id)
+
 async def get_user_cookie(user_id: int, platform: str) -> str | None:
     """Получает куки пользователя для конкретной платформы."""
     plat = (platform or "").lower().strip()
 
     # Prefer existing columns for legacy platforms if present.
     if plat in ("youtube", "tiktok", "vk"):
-        user = await get_user(user_id)
+        user = await get_user_cached(user_id)
         if user:
             if plat == "youtube" and user.cookies_youtube:
                 return user.cookies_youtube
@@ -716,6 +1057,7 @@ async def save_global_cookie(platform: str, cookie_data: str):
                     cookies_data=cookie_data
                 )
                 session.add(new_cookies)
+    cookie_store.invalidate_global(platform)
 
 async def get_global_cookie(platform: str) -> str | None:
     """Получает глобальные куки для платформы."""
@@ -728,30 +1070,70 @@ async def get_global_cookie(platform: str) -> str | None:
 
 # === СИСТЕМНЫЕ ПЕРЕМЕННЫЕ ===
 
-async def get_system_value(key: str) -> str | None:
-    """Получает системную переменную."""
+# Whole system_settings table in memory (it is tiny): loaded at startup, patched by
+# set_system_value, reloaded after SYSTEM_SETTINGS_CACHE_TTL seconds so writes from
+# another process become visible. TTL <= 0 = never reload.
+_settings_cache: dict[str, str] | None = None
+_settings_loaded_at: float = 0.0
+_settings_generation = 0
+_settings_load_lock = asyncio.Lock()
+
+
+async def load_system_settings() -> dict[str, str]:
+    """(Re)load system_settings into the process cache."""
+    global _settings_cache, _settings_loaded_at
+    generation = _settings_generation
     async with session_maker() as session:
-        result = await session.execute(
-            select(SystemSettings).where(SystemSettings.key == key)
-        )
-        setting = result.scalar_one_or_none()
-        return setting.value if setting else None
+        res = await session.execute(select(SystemSettings.key, SystemSettings.value))
+        data = {k: v for k, v in res.all()}
+    # A local write during the SELECT wins over the (possibly older) snapshot.
+    if generation == _settings_generation:
+        _settings_cache = data
+        _settings_loaded_at = time.monotonic()
+    return data if _settings_cache is None else _settings_cache
+
+
+def invalidate_system_settings_cache() -> None:
+    global _settings_cache, _settings_generation
+    _settings_cache = None
+    _settings_generation += 1
+
+
+def _settings_cache_put(key: str, value: str) -> None:
+    global _settings_generation
+    _settings_generation += 1
+    if _settings_cache is not None:
+        _settings_cache[key] = value
+
+
+def _settings_fresh() -> bool:
+    ttl = settings.SYSTEM_SETTINGS_CACHE_TTL
+    return _settings_cache is not None and (ttl <= 0 or time.monotonic() - _settings_loaded_at < ttl)
+
+
+async def _system_settings() -> dict[str, str]:
+    if _settings_fresh():
+        return _settings_cache
+    async with _settings_load_lock:
+        # Concurrent readers wait for one reload instead of each running a SELECT.
+        if _settings_fresh():
+            return _settings_cache
+        return await load_system_settings()
+
+
+async def get_system_value(key: str) -> str | None:
+    """Получает системную переменную (из кэша)."""
+    return (await _system_settings()).get(key)
 
 async def set_system_value(key: str, value: str):
     """Устанавливает системную переменную."""
     async with session_maker() as session:
         async with session.begin():
-            existing = await session.execute(
-                select(SystemSettings).where(SystemSettings.key == key)
-            )
-            setting = existing.scalar_one_or_none()
-            
-            if setting:
-                setting.value = value
-                setting.updated_at = datetime.now()
-            else:
-                new_setting = SystemSettings(key=key, value=value)
-                session.add(new_setting)
+            now = datetime.now()
+            stmt = insert(SystemSettings).values(key=key, value=value, updated_at=now)
+            stmt = stmt.on_conflict_do_update(index_elements=[SystemSettings.key], set_={"value": value, "updated_at": now})
+            await session.execute(stmt)
+    _settings_cache_put(key, value)
 
 # ===LASTFM ===
 
@@ -761,10 +1143,11 @@ async def set_lastfm_username(user_id: int, lastfm_username: str):
         async with session.begin():
             stmt = update(User).where(User.id == user_id).values(lastfm_username=lastfm_username)
             await session.execute(stmt)
+    patch_user_snapshot(user_id, lastfm_username=lastfm_username)
 
 async def get_lastfm_username(user_id: int) -> str | None:
     """Получает привязанный Last.FM аккаунт."""
-    user = await get_user(user_id)
+    user = await get_user_cached(user_id)
     return user.lastfm_username if user else None
 
 # === MODULE STATUS ===
@@ -0,0 +1,156 @@
+"""Concurrent read/write benchmark for the SQLite profile (sqlite_profile.py).
+
+Runs the same workload twice, in child processes, with SQLITE_PROFILE=off (plain
+driver defaults) and then on: async writers upsert rows the way media_cache does
+while readers on a second engine (like the miniapp) run count(*) and keyed reads
+on the same database file. No bot settings or .env are needed:
+
+    python -m services.database.sqlite_bench -n 1200 --writers 8 --readers 2
+
+The profile should give more writes/s and reads/s and fewer "database is locked" errors.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, UniqueConstraint, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from services.database.sqlite_profile import apply_sqlite_profile, engine_kwargs
+
+_metadata = MetaData()
+_rows = Table(
+    "bench_cache",
+    _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, nullable=False),
+    Column("url_hash", String(64), nullable=False),
+    Column("file_id", String(255), nullable=False),
+    Column("last_used_at", DateTime, nullable=False, server_default=func.now()),
+    # same shape as media_cache's (user_id, url_hash) upsert target
+    UniqueConstraint("user_id", "url_hash", name="uq_bench_user_hash"),
+)
+
+
+def _engine(url: str):
+    engine = create_async_engine(url, **engine_kwargs(url, is_async=True))
+    apply_sqlite_profile(engine.sync_engine)
+    return engine
+
+
+async def _workload(path: str, total: int, writers: int, readers: int) -> dict:
+    url = f"sqlite+aiosqlite:///{path}"
+    bot_engine = _engine(url)
+    app_engine = _engine(url)
+    async with bot_engine.begin() as conn:
+        await conn.run_sync(_metadata.create_all)
+
+    errors: dict[str, int] = {}
+    written = 0
+    reads = 0
+    done = asyncio.Event()
+
+    def _error(e: Exception) -> None:
+        name = "locked" if "locked" in str(e).lower() else type(e).__name__
+        errors[name] = errors.get(name, 0) + 1
+
+    async def writer(w: int) -> None:
+        nonlocal written
+        for i in range(w, total, writers):
+            stmt = insert(_rows).values(user_id=i % 50, url_hash=f"{i % 400:064x}", file_id=f"file-{i}")
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[_rows.c.user_id, _rows.c.url_hash],
+                set_={"file_id": stmt.excluded.file_id, "last_used_at": func.now()},
+            )
+            try:
+                async with bot_engine.begin() as conn:
+                    await conn.execute(stmt)
+                written += 1
+            except Exception as e:
+                _error(e)
+
+    async def reader(r: int) -> None:
+        nonlocal reads
+        i = r
+        while not done.is_set():
+            try:
+                async with app_engine.connect() as conn:
+                    await conn.scalar(select(func.count()).select_from(_rows))
+                    await conn.execute(select(_rows.c.file_id).where(_rows.c.user_id == i % 50).limit(20))
+                reads += 1
+            except Exception as e:
+                _error(e)
+            i += 1
+            await asyncio.sleep(0)
+
+    reader_tasks = [asyncio.create_task(reader(r)) for r in range(readers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(writers)))
+    took = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*reader_tasks)
+
+    await bot_engine.dispose()
+    await app_engine.dispose()
+    return {
+        "took": took,
+        "writes_per_s": written / took if took else 0.0,
+        "reads_per_s": reads / took if took else 0.0,
+        "written": written,
+        "errors": errors,
+    }
+
+
+def _child(args) -> None:
+    fd, path = tempfile.mkstemp(prefix="sqlite_bench_", suffix=".db")
+    os.close(fd)
+    try:
+        result = asyncio.run(_workload(path, args.requests, args.writers, args.readers))
+    finally:
+        for p in (path, path + "-wal", path + "-shm"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+    print(json.dumps(result))
+
+
+def _run_mode(mode: str, args) -> dict:
+    env = dict(os.environ, SQLITE_PROFILE=mode)
+    cmd = [
+        sys.executable, "-m", "services.database.sqlite_bench", "--child",
+        "-n", str(args.requests), "--writers", str(args.writers), "--readers", str(args.readers),
+    ]
+    completed = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, check=True)
+    return json.loads(completed.stdout.decode("utf-8").strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--requests", type=int, default=1200, help="upserts in total")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        return
+
+    print(f"upserts: {args.requests}, writers: {args.writers}, readers: {args.readers}")
+    for label, mode in (("before (SQLITE_PROFILE=off)", "off"), ("after  (profile on)", "on")):
+        r = _run_mode(mode, args)
+        print(
+            f"{label}: {r['writes_per_s']:.1f} writes/s, {r['reads_per_s']:.1f} reads/s, "
+            f"{r['written']}/{args.requests} written in {r['took']:.2f}s, errors: {r['errors'] or 0}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""SQLite engine profile shared by the bot (async) and miniapp (sync) engines.
+
+Applied on every new DB-API connection: WAL journal, synchronous=NORMAL,
+busy_timeout, mmap, page cache and temp_store. All knobs are env-configurable
+(SQLITE_* / DB_POOL_*) and the module has no dependency on core.config, so the
+miniapp backend can import it too.
+
+engine_kwargs() also returns the pool settings for PostgreSQL (DB_TYPE=postgres).
+Before/after numbers: python -m services.database.sqlite_bench
+"""
+import os
+
+from sqlalchemy import event
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = (os.getenv(name) or "").strip()
+    try:
+        return int(raw) if raw else default
+    except Exception:
+        return default
+
+
+def _env_str(name: str, default: str) -> str:
+    return ((os.getenv(name) or "").strip() or default).upper()
+
+
+# SQLITE_PROFILE=off restores plain driver defaults (for comparisons/troubleshooting)
+ENABLED = (os.getenv("SQLITE_PROFILE") or "on").strip().lower() not in ("0", "off", "false", "no")
+
+JOURNAL_MODE = _env_str("SQLITE_JOURNAL_MODE", "WAL")
+SYNCHRONOUS = _env_str("SQLITE_SYNCHRONOUS", "NORMAL")
+BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+CACHE_SIZE_KB = _env_int("SQLITE_CACHE_SIZE_KB", 64 * 1024)
+TEMP_STORE = _env_str("SQLITE_TEMP_STORE", "MEMORY")
+
+POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+# PostgreSQL only: recycle server connections, per-statement timeout (asyncpg)
+PG_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+PG_COMMAND_TIMEOUT = _env_int("DB_COMMAND_TIMEOUT", 60)
+# aiosqlite: rows fetched per round-trip to its worker thread
+AIOSQLITE_CHUNK_SIZE = _env_int("AIOSQLITE_ITER_CHUNK_SIZE", 256)
+
+
+def is_sqlite_url(url: str) -> bool:
+    return str(url or "").startswith("sqlite")
+
+
+def is_postgres_url(url: str) -> bool:
+    return str(url or "").startswith("postgresql")
+
+
+def _postgres_engine_kwargs(is_async: bool) -> dict:
+    kwargs = {
+        "pool_size": max(1, POOL_SIZE),
+        "max_overflow": max(0, MAX_OVERFLOW),
+        "pool_timeout": max(1, POOL_TIMEOUT),
+        # Dropped server connections (restarts, idle timeouts) are replaced transparently.
+        "pool_pre_ping": True,
+        "pool_recycle": PG_POOL_RECYCLE if PG_POOL_RECYCLE > 0 else -1,
+    }
+    if is_async:
+        kwargs["connect_args"] = {
+            "command_timeout": max(1, PG_COMMAND_TIMEOUT),
+            "server_settings": {"application_name": os.getenv("DB_APPLICATION_NAME") or "telegrambot"},
+        }
+    return kwargs
+
+
+def engine_kwargs(url: str, is_async: bool = False) -> dict:
+    """Pool/connect arguments for create_engine/create_async_engine."""
+    if is_postgres_url(url):
+        return _postgres_engine_kwargs(is_async)
+    if not ENABLED or not is_sqlite_url(url):
+        return {}
+    if ":memory:" in str(url):
+        return {}
+    connect_args = {
+        # Python-level lock wait; busy_timeout below covers the C level.
+        "timeout": max(1, BUSY_TIMEOUT_MS // 1000),
+        "check_same_thread": False,
+    }
+    if is_async:
+        connect_args["iter_chunk_size"] = max(1, AIOSQLITE_CHUNK_SIZE)
+    return {
+        "pool_size": max(1, POOL_SIZE),
+        "max_overflow": max(0, MAX_OVERFLOW),
+        "pool_timeout": max(1, POOL_TIMEOUT),
+        "pool_pre_ping": False,
+        "connect_args": connect_args,
+    }
+
+
+def pragma_statements() -> list[str]:
+    stmts = []
+    if JOURNAL_MODE:
+        stmts.append(f"PRAGMA journal_mode={JOURNAL_MODE}")
+    if SYNCHRONOUS:
+        stmts.append(f"PRAGMA synchronous={SYNCHRONOUS}")
+    stmts.append(f"PRAGMA busy_timeout={max(0, BUSY_TIMEOUT_MS)}")
+    if MMAP_SIZE >= 0:
+        stmts.append(f"PRAGMA mmap_size={MMAP_SIZE}")
+    if CACHE_SIZE_KB > 0:
+        # Negative value = size in KiB instead of pages
+        stmts.append(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    if TEMP_STORE:
+        stmts.append(f"PRAGMA temp_store={TEMP_STORE}")
+    return stmts
+
+
+def apply_sqlite_profile(sync_engine) -> None:
+    """Register the connect hook on a (sync) Engine; for AsyncEngine pass engine.sync_engine."""
+    if not ENABLED or sync_engine.dialect.name != "sqlite":
+        return
+
+    statements = pragma_statements()
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for stmt in statements:
+                try:
+                    cursor.execute(stmt)
+                except Exception:
+                    # e.g. WAL is not available on some network filesystems
+                    pass
+        finally:
+            cursor.close()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Keyset pagination for admin user lists (/users in the bot, /api/admin/users in the miniapp).
+
+Order: newest first, (first_seen DESC, id DESC), served by ix_users_first_seen_id.
+A cursor is "<first_seen digits>_<id>" and is short enough for callback_data (64 bytes).
+
+SQLite keeps DateTime as text, and rows written by CURRENT_TIMESTAMP have no
+microseconds while rows written from Python do. So on SQLite the comparison is done
+on the stored text itself (the same thing ORDER BY sorts on); PostgreSQL compares
+real timestamps.
+"""
+from __future__ import annotations
+
+import re
+from datetime import datetime
+
+from sqlalchemy import String, and_, or_, select, type_coerce
+
+from services.database.models import User
+
+SYSTEM_USER_ID = 777000  # Telegram service account, hidden from lists
+
+
+def _first_seen_col(dialect: str):
+    if dialect == "sqlite":
+        return type_coerce(User.first_seen, String)
+    return User.first_seen
+
+
+def encode_cursor(first_seen_key, user_id: int) -> str:
+    if isinstance(first_seen_key, datetime):
+        digits = first_seen_key.strftime("%Y%m%d%H%M%S%f")
+    else:
+        digits = re.sub(r"\D", "", str(first_seen_key or ""))
+    return f"{digits}_{int(user_id)}"
+
+
+def decode_cursor(cursor: str, dialect: str) -> tuple[object, int]:
+    """Inverse of encode_cursor. Raises ValueError on garbage."""
+    digits, _, raw_id = (cursor or "").partition("_")
+    if not digits.isdigit() or len(digits) not in (14, 20):
+        raise ValueError("bad cursor")
+    user_id = int(raw_id)
+    if dialect == "sqlite":
+        value = f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]} {digits[8:10]}:{digits[10:12]}:{digits[12:14]}"
+        if len(digits) == 20:
+            value += f".{digits[14:]}"
+        return value, user_id
+    return datetime.strptime(digits.ljust(20, "0"), "%Y%m%d%H%M%S%f"), user_id
+
+
+def users_page_stmt(dialect: str, limit: int, after: str | None = None, before: str | None = None):
+    """SELECT for one page (+1 row to detect more).
+
+    after  -> rows older than the cursor (next page), newest first;
+    before -> rows newer than the cursor (previous page), oldest first: reverse the result.
+    """
+    fs = _first_seen_col(dialect)
+    stmt = select(User, fs.label("fs_key")).where(User.id != SYSTEM_USER_ID)
+    if before:
+        value, user_id = decode_cursor(before, dialect)
+        stmt = stmt.where(or_(fs > value, and_(fs == value, User.id > user_id)))
+        return stmt.order_by(User.first_seen.asc(), User.id.asc()).limit(limit + 1)
+    if after:
+        value, user_id = decode_cursor(after, dialect)
+        stmt = stmt.where(or_(fs < value, and_(fs == value, User.id < user_id)))
+    return stmt.order_by(User.first_seen.desc(), User.id.desc()).limit(limit + 1)
+
+
+def build_page(rows, limit: int, after: str | None = None, before: str | None = None) -> dict:
+    """rows: (User, fs_key) pairs from users_page_stmt."""
+    rows = list(rows)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+    cursors = [encode_cursor(fs_key, user.id) for user, fs_key in rows]
+    has_prev = more if before else bool(after)
+    has_next = True if before else more
+    return {
+        "items": [user for user, _ in rows],
+        "prev": cursors[0] if rows and has_prev else None,
+        "next": cursors[-1] if rows and has_next else None,
+    }
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Write-behind buffers for hot, non-critical writes.
+
+- activity_buffer: LoggingMiddleware/increment_request_count and the registration
+  path only record deltas here; they are flushed as set-based UPDATEs (one per
+  chunk of users) every ACTIVITY_FLUSH_INTERVAL_MS or once
+  ACTIVITY_FLUSH_MAX_ENTRIES users are pending.
+- history_writer: log_user_request rows go to a bounded queue and are inserted in
+  executemany batches, so replies never wait on the history commit.
+
+Both flush once more on shutdown. Data in the DB is eventually consistent.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, update
+
+import settings
+from services.database.core import session_maker
+from services.database.models import User, UserRequest
+
+logger = logging.getLogger(__name__)
+
+_MAX_CHUNK_USERS = 150
+
+
+class _PeriodicFlusher(ABC):
+    """Background task calling flush() every `interval` seconds or when woken."""
+
+    def __init__(self, interval_ms: int):
+        self.interval = max(0.05, int(interval_ms) / 1000.0)
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_lock: asyncio.Lock | None = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    def _kick(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"{type(self).__name__} flush failed")
+
+    @abstractmethod
+    async def flush(self) -> int:
+        pass
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                pass
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(f"{type(self).__name__} final flush failed")
+
+
+class UserActivityBuffer(_PeriodicFlusher):
+    def __init__(self, interval_ms: int = 2000, max_entries: int = 500):
+        super().__init__(interval_ms)
+        self.max_entries = max(1, int(max_entries))
+        # ~5 bound parameters per user (two CASE maps + IN); old SQLite allows only 999 per statement
+        self.chunk_size = min(self.max_entries, _MAX_CHUNK_USERS)
+        # user_id -> [request_delta, last_seen]
+        self._pending: dict[int, list] = {}
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def touch(self, user_id: int, requests: int = 0, seen_at: datetime | None = None) -> None:
+        """Record activity for user_id (never touches the DB directly)."""
+        if not isinstance(user_id, int):
+            return
+        entry = self._pending.get(user_id)
+        seen_at = seen_at or datetime.now()
+        if entry is None:
+            self._pending[user_id] = [int(requests), seen_at]
+        else:
+            entry[0] += int(requests)
+            if seen_at > entry[1]:
+                entry[1] = seen_at
+
+        self.start()
+        if len(self._pending) >= self.max_entries:
+            self._kick()
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def pending_requests(self) -> int:
+        """Request increments not yet written to users.request_count."""
+        return sum(entry[0] for uid, entry in self._pending.items() if uid != 777000)
+
+    def _requeue(self, batch: dict[int, list]) -> None:
+        # Newer touches win for last_seen; deltas add up.
+        for uid, (delta, ts) in batch.items():
+            entry = self._pending.get(uid)
+            if entry is None:
+                self._pending[uid] = [delta, ts]
+            else:
+                entry[0] += delta
+                if ts > entry[1]:
+                    entry[1] = ts
+
+    async def _write_chunk(self, chunk: dict[int, list]) -> None:
+        ids = list(chunk.keys())
+        deltas = {uid: v[0] for uid, v in chunk.items() if v[0]}
+        seen = {uid: v[1] for uid, v in chunk.items()}
+
+        values = {
+            "last_seen": case(seen, value=User.id, else_=User.last_seen),
+            "is_active": True,
+        }
+        if deltas:
+            values["request_count"] = func.coalesce(User.request_count, 0) + case(deltas, value=User.id, else_=0)
+
+        async with session_maker() as session:
+            async with session.begin():
+                await session.execute(
+                    update(User)
+                    .where(User.id.in_(ids))
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+
+    async def flush(self) -> int:
+        """Write pending deltas, one UPDATE per chunk of chunk_size users. Returns the number of users flushed."""
+        if not self._pending:
+            return 0
+        lock = self._flush_lock or asyncio.Lock()
+        async with lock:
+            batch, self._pending = self._pending, {}
+            items = list(batch.items())
+            written = 0
+            for i in range(0, len(items), self.chunk_size):
+                chunk = dict(items[i:i + self.chunk_size])
+                try:
+                    await self._write_chunk(chunk)
+                except Exception:
+                    self.failed_flushes += 1
+                    # Chunks already written stay written; this one and the rest go back.
+                    self._requeue(dict(items[i:]))
+                    raise
+                self.flushes += 1
+                self.flushed_rows += len(chunk)
+                written += len(chunk)
+            return written
+
+
+class RequestHistoryWriter(_PeriodicFlusher):
+    def __init__(self, interval_ms: int = 1000, batch_size: int = 200, max_queue: int = 5000):
+        super().__init__(interval_ms)
+        self.batch_size = max(1, int(batch_size))
+        self.max_queue = max(1, int(max_queue))
+        self._queue: deque[dict] = deque()
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def enqueue(self, row: dict) -> bool:
+        """Queue a UserRequest row. Returns False if the queue is full (row dropped)."""
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return False
+        row.setdefault("created_at", datetime.now())
+        self._queue.append(row)
+        self.enqueued += 1
+        self.start()
+        if len(self._queue) >= self.batch_size:
+            self._kick()
+        return True
+
+    def pending_count(self) -> int:
+        return len(self._queue)
+
+    async def flush(self) -> int:
+        """Insert everything queued so far in executemany batches."""
+        if not self._queue:
+            return 0
+        lock = self._flush_lock or asyncio.Lock()
+        written = 0
+        async with lock:
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.batch_size:
+                    batch.append(self._queue.popleft())
+                try:
+                    async with session_maker() as session:
+                        async with session.begin():
+                            await session.execute(insert(UserRequest), batch)
+                except Exception:
+                    # History is best-effort: count the batch as dropped instead of retrying forever.
+                    self.failed_batches += 1
+                    self.dropped += len(batch)
+                    logger.exception("Failed to write user_requests batch")
+                    continue
+                self.flushed += len(batch)
+                written += len(batch)
+        return written
+
+
+activity_buffer = UserActivityBuffer(
+    interval_ms=settings.ACTIVITY_FLUSH_INTERVAL_MS,
+    max_entries=settings.ACTIVITY_FLUSH_MAX_ENTRIES,
+)
+history_writer = RequestHistoryWriter(
+    interval_ms=settings.HISTORY_FLUSH_INTERVAL_MS,
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    max_queue=settings.HISTORY_QUEUE_MAX,
+)
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Process-wide aiohttp sessions for outbound HTTP (Odesli, Spotify, Last.fm, TikTok API, ...).
+
+One session per TLS mode instead of a ClientSession per call: connections are kept
+alive and reused, DNS answers are cached (HTTP_DNS_TTL), and the pool is capped in
+total (HTTP_POOL_LIMIT) and per host (HTTP_POOL_PER_HOST).
+
+- sessions are created on first use (start() in on_startup just does it early) and
+  closed in on_shutdown;
+- the cookie jar is a DummyCookieJar: sessions are shared between users, so cookies
+  are passed per request (session.get(..., cookies=...));
+- page fetches that follow redirects setting cookies (Spotify link resolving, Yandex
+  Music HTML) use cookie_session(): a short-lived session with its own CookieJar on
+  the same pooled connector;
+- callers must NOT close the shared session (no `async with http_clients.session()`);
+- per-host request count, errors and latency are collected by a TraceConfig.
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+import aiohttp
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_HOSTS = 200  # hosts beyond this are counted as "other"
+
+
+class _HostStats:
+    __slots__ = ("requests", "errors", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.requests, 1) if self.requests else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class HttpClients:
+    def __init__(self):
+        self._sessions: dict[bool, aiohttp.ClientSession] = {}
+        self._hosts: dict[str, _HostStats] = {}
+
+    # --- tracing ---
+
+    def _host(self, host: str | None) -> _HostStats:
+        host = (host or "?").lower()
+        stats = self._hosts.get(host)
+        if stats is None:
+            if len(self._hosts) >= _MAX_HOSTS:
+                host = "other"
+                stats = self._hosts.get(host)
+            if stats is None:
+                stats = self._hosts[host] = _HostStats()
+        return stats
+
+    async def _on_start(self, session, ctx, params) -> None:
+        ctx.started = time.perf_counter()
+
+    def _record(self, ctx, host: str | None, error: bool) -> None:
+        stats = self._host(host)
+        ms = (time.perf_counter() - getattr(ctx, "started", time.perf_counter())) * 1000
+        stats.requests += 1
+        stats.total_ms += ms
+        stats.max_ms = max(stats.max_ms, ms)
+        if error:
+            stats.errors += 1
+
+    async def _on_end(self, session, ctx, params) -> None:
+        self._record(ctx, params.url.host, params.response.status >= 500)
+
+    async def _on_exception(self, session, ctx, params) -> None:
+        self._record(ctx, params.url.host, True)
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_start)
+        trace.on_request_end.append(self._on_end)
+        trace.on_request_exception.append(self._on_exception)
+        return trace
+
+    # --- sessions ---
+
+    def _create(self, verify_ssl: bool) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_PER_HOST,
+            ttl_dns_cache=settings.HTTP_DNS_TTL,
+            keepalive_timeout=30,
+            ssl=None if verify_ssl else False,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=60, sock_connect=15),
+            trace_configs=[self._trace_config()],
+        )
+
+    def session(self, verify_ssl: bool = True) -> aiohttp.ClientSession:
+        """Shared session; verify_ssl=False for the scrapers that always ran with ssl=False."""
+        current = self._sessions.get(verify_ssl)
+        if current is None or current.closed:
+            current = self._sessions[verify_ssl] = self._create(verify_ssl)
+        return current
+
+    def cookie_session(self, verify_ssl: bool = True, cookies: dict | None = None) -> aiohttp.ClientSession:
+        """Per-call session with a real CookieJar (Set-Cookie from redirects is kept).
+
+        Use as `async with http_clients.cookie_session(...) as s:`; closing it leaves the pool open.
+        """
+        shared = self.session(verify_ssl)
+        return aiohttp.ClientSession(
+            connector=shared.connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(),
+            cookies=cookies,
+            timeout=shared.timeout,
+            trace_configs=[self._trace_config()],
+        )
+
+    def start(self) -> None:
+        self.session(True)
+        self.session(False)
+
+    async def close(self) -> None:
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for s in sessions:
+            try:
+                await s.close()
+            except Exception as e:
+                logger.debug(f"http session close failed: {e}")
+
+    def stats(self, top: int = 5) -> dict:
+        hosts = sorted(self._hosts.items(), key=lambda kv: kv[1].requests, reverse=True)
+        return {
+            "requests": sum(s.requests for s in self._hosts.values()),
+            "errors": sum(s.errors for s in self._hosts.values()),
+            "hosts": {host: s.as_dict() for host, s in hosts[:top]},
+        }
+
+
+http_clients = HttpClients()
@@ -1,50 +1,190 @@
-import aiohttp
+import asyncio
 import logging
+import re
+import time
+from datetime import datetime
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import aiohttp
+from cachetools import LRUCache
+
+import settings
+from services.http_client import http_clients
+from services.url_cleaner import clean_url
 
 # API Odesli (Song.link)
 API_URL = "https://api.song.link/v1-alpha.1/links"
 
-async def get_links_by_url(url: str):
-    """
-    Отправляет ссылку (Spotify/YouTube/etc) в Odesli
-    и возвращает словарь с ссылками на другие платформы.
+# Какие сервисы нас интересуют
+_TARGETS = {
+    'spotify': 'Spotify',
+    'appleMusic': 'Apple Music',
+    'youtube': 'YouTube',
+    'yandex': 'Yandex Music',
+    'soundcloud': 'SoundCloud',
+    'deezer': 'Deezer'
+}
+
+# Публичный API медленный и с жестким лимитом, поэтому ответы кешируются:
+# - память (LRU) -> таблица odesli_cache (ODESLI_CACHE_TTL) -> сам API;
+# - неудачи тоже кешируются, но коротко (ODESLI_NEGATIVE_TTL);
+# - одновременные запросы одной ссылки идут в API один раз;
+# - token bucket держит нас в ODESLI_RATE_PER_MINUTE; если ждать дольше
+#   ODESLI_MAX_WAIT секунд, отвечаем None (ссылки - не критичная часть подписи).
+
+
+class _TokenBucket:
+    def __init__(self, rate_per_minute: int, burst: int):
+        self.rate = max(1, int(rate_per_minute)) / 60.0
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self, max_wait: float) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            return False
+        # Резервируем токен сразу (может уйти в минус), чтобы параллельные вызовы встали в очередь
+        self.tokens -= 1
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+
+_memory: LRUCache = LRUCache(maxsize=max(1, settings.ODESLI_MEMORY_CACHE_SIZE))  # url -> (expires monotonic, payload)
+_inflight: dict[str, asyncio.Task] = {}
+_bucket = _TokenBucket(settings.ODESLI_RATE_PER_MINUTE, burst=max(1, settings.ODESLI_RATE_PER_MINUTE // 2))
+odesli_stats = {"memory_hits": 0, "db_hits": 0, "fetched": 0, "failed": 0, "coalesced": 0, "throttled": 0}
+
+
+_SHARE_HOSTS = ("spotify.com", "music.yandex.", "music.apple.com", "itunes.apple.com")
+_SPOTIFY_INTL = re.compile(r"^/intl-[a-z]{2}(?:-[a-z]{2})?(?=/)", re.IGNORECASE)
+
+
+def _cache_key(url: str) -> str:
+    """Один трек = один ключ: clean_url + для Spotify/Yandex/Apple без share-параметров (?si=, utm_*).
+
+    У Apple оставляем только i= (id трека внутри альбома).
     """
+    try:
+        key = clean_url(url)
+    except Exception:
+        key = url.strip()
+    try:
+        parsed = urlparse(key)
+        host = parsed.netloc.lower()
+        if not any(h in host for h in _SHARE_HOSTS):
+            return key
+        path = parsed.path.rstrip("/") or "/"
+        if "spotify.com" in host:
+            path = _SPOTIFY_INTL.sub("", path)
+        query = ""
+        if "apple.com" in host:
+            track = parse_qs(parsed.query).get("i")
+            if track:
+                query = "?" + urlencode({"i": track[0]})
+        return f"https://{host}{path}{query}"
+    except Exception:
+        return key
+
+
+def _remember(key: str, payload: dict | None, ttl: float) -> None:
+    _memory[key] = (time.monotonic() + ttl, payload)
+
+
+async def _fetch(url: str) -> tuple[bool, dict | None]:
+    """(ok, links). ok=False - ошибка или лимит, такой ответ кешируется коротко."""
     params = {
         'url': url,
         'userCountry': 'US' # Можно менять на RU, но US дает больше глобальных ссылок
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(API_URL, params=params) as resp:
-                if resp.status != 200:
-                    return None
-                
-                data = await resp.json()
-                
-                # Разбираем ответ
-                links = {}
-                links_data = data.get('linksByPlatform', {})
-                
-                # Какие сервисы нас интересуют
-                targets = {
-                    'spotify': 'Spotify',
-                    'appleMusic': 'Apple Music',
-                    'youtube': 'YouTube',
-                    'yandex': 'Yandex Music',
-                    'soundcloud': 'SoundCloud',
-                    'deezer': 'Deezer'
-                }
-
-                for key, name in targets.items():
-                    if key in links_data:
-                        links[name] = links_data[key]['url']
-                
-                # Основная ссылка на song.link (сводная)
-                page_url = data.get('pageUrl')
-                
-                return {'page': page_url, 'links': links}
+        session = http_clients.session()
+        async with session.get(API_URL, params=params, timeout=aiohttp.ClientTimeout(total=15)) as resp:
+            if resp.status != 200:
+                logging.info(f"Odesli API HTTP {resp.status} for {url}")
+                return False, None
+
+            data = await resp.json()
+
+            # Разбираем ответ
+            links = {}
+            links_data = data.get('linksByPlatform', {})
+
+            for key, name in _TARGETS.items():
+                if key in links_data:
+                    links[name] = links_data[key]['url']
+
+            # Основная ссылка на song.link (сводная)
+            page_url = data.get('pageUrl')
+
+            return True, {'page': page_url, 'links': links}
 
     except Exception as e:
         logging.error(f"Odesli API Error: {e}")
-        return None
\ No newline at end of file
+        return False, None
+
+
+async def _lookup(key: str) -> dict | None:
+    try:
+        from services.database.repo import get_odesli_cache
+        found, payload, expires_at = await get_odesli_cache(key)
+        if found:
+            odesli_stats["db_hits"] += 1
+            ttl = (expires_at - datetime.now()).total_seconds() if expires_at else settings.ODESLI_NEGATIVE_TTL
+            _remember(key, payload, max(1.0, ttl))
+            return payload
+    except Exception as e:
+        logging.warning(f"Odesli cache read failed: {e}")
+
+    if not await _bucket.acquire(settings.ODESLI_MAX_WAIT):
+        # Наш собственный лимит, а не ответ Odesli: не кешируем
+        odesli_stats["throttled"] += 1
+        return None
+
+    ok, payload = await _fetch(key)
+    ttl = settings.ODESLI_CACHE_TTL if ok else settings.ODESLI_NEGATIVE_TTL
+    odesli_stats["fetched" if ok else "failed"] += 1
+    _remember(key, payload, ttl)
+    try:
+        from services.database.repo import set_odesli_cache
+        await set_odesli_cache(key, payload, ttl)
+    except Exception as e:
+        logging.warning(f"Odesli cache write failed: {e}")
+    return payload
+
+
+async def get_links_by_url(url: str):
+    """
+    Отправляет ссылку (Spotify/YouTube/etc) в Odesli
+    и возвращает словарь с ссылками на другие платформы.
+    """
+    if not url:
+        return None
+    key = _cache_key(url)
+
+    cached = _memory.get(key)
+    if cached is not None:
+        expires, payload = cached
+        if expires > time.monotonic():
+            odesli_stats["memory_hits"] += 1
+            return payload
+        _memory.pop(key, None)
+
+    task = _inflight.get(key)
+    if task is not None:
+        odesli_stats["coalesced"] += 1
+    else:
+        task = asyncio.ensure_future(_lookup(key))
+        _inflight[key] = task
+        task.add_done_callback(lambda t, k=key: _inflight.pop(k, None) if _inflight.get(k) is t else None)
+    try:
+        # shield: отмена одного вызывающего не отменяет общий запрос
+        return await asyncio.shield(task)
+    except Exception as e:
+        logging.error(f"Odesli lookup failed: {e}")
+        return None
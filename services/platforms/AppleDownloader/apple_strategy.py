@@ -4,6 +4,11 @@ import aiohttp
 import json
 from urllib.parse import unquote
 from services.platforms.common_downloader import CommonDownloader
+from services.platforms.http_download import read_limited
+from services.http_client import http_clients
+
+# Страница трека Apple Music весит сотни КБ; больше - значит что-то не то
+_PAGE_MAX_BYTES = 5 * 1024 * 1024
 
 class AppleStrategy(CommonDownloader):
     def get_platform_settings(self) -> dict:
@@ -24,9 +29,9 @@ class AppleStrategy(CommonDownloader):
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0 Safari/537.36'}
         
         try:
-            async with aiohttp.ClientSession(headers=headers, connector=aiohttp.TCPConnector(ssl=False)) as session:
-                async with session.get(self.url) as resp:
-                    text = await resp.text()
+            session = http_clients.session(verify_ssl=False)
+            async with session.get(self.url, headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as resp:
+                text = (await read_limited(resp, _PAGE_MAX_BYTES)).decode(resp.charset or "utf-8", errors="replace")
             
             track_name = None
             artist_name = None
@@ -1,12 +1,11 @@
 import re
 import os
-import aiohttp
 import base64
 import json
 import html
-import asyncio
-import yt_dlp
 from services.platforms.common_downloader import CommonDownloader
+from services.platforms.ytdlp_pool import ytdlp_pool
+from services.http_client import http_clients
 
 class SpotifyStrategy(CommonDownloader):
     
@@ -46,13 +45,10 @@ class SpotifyStrategy(CommonDownloader):
             'extract_flat': True, 'dump_single_json': True, 'quiet': True, 'ignoreerrors': True,
             'allow_unplayable_formats': True, 'check_formats': False,
         }
-        def _extract():
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                try: return ydl.extract_info(clean_url, download=False)
-                except: return None
-
-        loop = asyncio.get_event_loop()
-        info = await loop.run_in_executor(None, _extract)
+        try:
+            info = await ytdlp_pool.run("extract_info", clean_url, opts, download=False, timeout=120.0)
+        except Exception:
+            info = None
         
         if info and 'entries' in info and len(info['entries']) > 0:
             tracks = []
@@ -159,23 +155,24 @@ class SpotifyStrategy(CommonDownloader):
     async def _resolve_url(self, url: str):
         headers = {'User-Agent': 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'}
         cookies = self._get_cookies_dict()
-        async def fetch_recursive(target_url, depth=0):
+        async def fetch_recursive(session, target_url, depth=0):
             if depth > 5: return target_url, ""
             try:
-                async with aiohttp.ClientSession(headers=headers, cookies=cookies, connector=aiohttp.TCPConnector(ssl=False)) as session:
-                    async with session.get(target_url, allow_redirects=True) as resp:
-                        text = await resp.text()
-                        final = str(resp.url)
-                        m = re.search(r'<script id="urlSchemeConfig" type="text/plain">(.*?)</script>', text)
-                        if m:
-                            try:
-                                j = json.loads(base64.b64decode(m.group(1)).decode('utf-8'))
-                                real = j.get('redirectUrl') or j.get('urlScheme')
-                                if real: return await fetch_recursive(real, depth+1)
-                            except: pass
-                        return final, text
+                async with session.get(target_url, headers=headers, allow_redirects=True) as resp:
+                    text = await resp.text()
+                    final = str(resp.url)
+                    m = re.search(r'<script id="urlSchemeConfig" type="text/plain">(.*?)</script>', text)
+                    if m:
+                        try:
+                            j = json.loads(base64.b64decode(m.group(1)).decode('utf-8'))
+                            real = j.get('redirectUrl') or j.get('urlScheme')
+                            if real: return await fetch_recursive(session, real, depth+1)
+                        except: pass
+                    return final, text
             except: return target_url, ""
-        return await fetch_recursive(url)
+        # Своя cookie jar на всю цепочку: редиректы ставят куки
+        async with http_clients.cookie_session(verify_ssl=False, cookies=cookies) as session:
+            return await fetch_recursive(session, url)
 
     async def _parse_metadata(self, url, html_content):
         print("🔍 [Spotify Meta] Парсинг...")
@@ -185,12 +182,12 @@ class SpotifyStrategy(CommonDownloader):
         try:
             clean_url = url.split('?')[0]
             oembed_api = f"https://open.spotify.com/oembed?url={clean_url}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(oembed_api) as resp:
-                    if resp.status == 200:
-                        d = await resp.json()
-                        track_res = d.get("title")
-                        artist_res = d.get("author_name")
+            session = http_clients.session()
+            async with session.get(oembed_api) as resp:
+                if resp.status == 200:
+                    d = await resp.json()
+                    track_res = d.get("title")
+                    artist_res = d.get("author_name")
         except: pass
 
         # 2. JSON-LD
@@ -1,15 +1,28 @@
-import aiohttp
 import json
 import os
 import asyncio
 from services.platforms.common_downloader import CommonDownloader
+from services.http_client import http_clients
+from services.platforms.http_download import stream_to_file, FileTooLarge, HttpDownloadError
+
+MAX_SLIDES = 35
+SLIDE_CHUNK = 10  # media group size in Telegram
+SLIDE_CONCURRENCY = 6
 
 class TikTokStrategy(CommonDownloader):
     """
     Стратегия для ТикТок Видео (API Proxy).
     Использует внешний API (tikwm.com) для обхода блокировок IP и капчи.
     Включает обработку Rate Limit и удаленных видео.
+
+    on_slide_chunk(paths, meta): для фото-каруселей вызывается на каждые готовые
+    SLIDE_CHUNK слайдов по порядку, пока остальные еще качаются. Вызов идет внутри
+    слота загрузки, поэтому колбэк должен быстро вернуться (отправка - в отдельной задаче).
     """
+
+    def __init__(self, url: str, on_slide_chunk=None):
+        super().__init__(url)
+        self.on_slide_chunk = on_slide_chunk
     
     def get_platform_settings(self) -> dict:
         return {}
@@ -29,23 +42,23 @@ class TikTokStrategy(CommonDownloader):
         max_retries = 5
         for attempt in range(max_retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(api_url, data=data, headers=headers) as resp:
-                        # 502/504 Bad Gateway -> Retry
-                        if resp.status in [502, 504]:
-                            print(f"⚠️ [TikTok API] HTTP {resp.status}. Retrying...")
-                            await asyncio.sleep(2)
-                            continue
+                session = http_clients.session()
+                async with session.post(api_url, data=data, headers=headers) as resp:
+                    # 502/504 Bad Gateway -> Retry
+                    if resp.status in [502, 504]:
+                        print(f"⚠️ [TikTok API] HTTP {resp.status}. Retrying...")
+                        await asyncio.sleep(2)
+                        continue
                             
-                        if resp.status != 200:
-                            print(f"❌ [TikTok API] HTTP Error: {resp.status}")
-                            return None, None, f"API Error: {resp.status}", None
+                    if resp.status != 200:
+                        print(f"❌ [TikTok API] HTTP Error: {resp.status}")
+                        return None, None, f"API Error: {resp.status}", None
                         
-                        result_text = await resp.text()
-                        try:
-                            result = json.loads(result_text)
-                        except:
-                            return None, None, "API returned non-JSON", None
+                    result_text = await resp.text()
+                    try:
+                        result = json.loads(result_text)
+                    except:
+                        return None, None, "API returned non-JSON", None
                 
                 # Проверка лимитов (Code -1)
                 if result.get('code') == -1:
@@ -122,59 +135,75 @@ class TikTokStrategy(CommonDownloader):
                                 return v[0]
                         return None
 
-                    files: list[str] = []
-                    async with aiohttp.ClientSession() as session:
-                        for idx, img in enumerate(images[:35], start=1):
-                            img_url = await _extract_img_url(img)
-                            if not img_url:
-                                continue
-                            if not img_url.startswith("http"):
-                                img_url = f"https://www.tikwm.com{img_url}" if img_url.startswith("/") else img_url
-                            out_path = os.path.join(self.download_path, f"slide_{idx:02d}.jpg")
-                            try:
-                                async with session.get(img_url, timeout=30) as img_resp:
-                                    if img_resp.status != 200:
-                                        continue
-                                    with open(out_path, 'wb') as f:
-                                        f.write(await img_resp.read())
-                                files.append(out_path)
-                            except Exception:
-                                continue
+                    slide_jobs: list[tuple[str, str]] = []
+                    for idx, img in enumerate(images[:MAX_SLIDES], start=1):
+                        img_url = await _extract_img_url(img)
+                        if not img_url:
+                            continue
+                        if not img_url.startswith("http"):
+                            img_url = f"https://www.tikwm.com{img_url}" if img_url.startswith("/") else img_url
+                        slide_jobs.append((img_url, os.path.join(self.download_path, f"slide_{idx:02d}.jpg")))
 
-                        # Best-effort: download attached sound (if present)
-                        audio_url = _extract_audio_url(data_obj)
-                        if audio_url and isinstance(audio_url, str):
-                            # Some payloads return relative paths
-                            if not audio_url.startswith("http"):
-                                audio_url = f"https://www.tikwm.com{audio_url}" if audio_url.startswith("/") else audio_url
+                    final_meta = {
+                        'title': title,
+                        'artist': author,
+                        'uploader': author,
+                        'track': title,
+                    }
 
-                            audio_ext = ".mp3"
-                            try:
-                                lower = audio_url.lower().split("?", 1)[0]
-                                for ext in (".mp3", ".m4a", ".aac", ".opus", ".ogg"):
-                                    if lower.endswith(ext):
-                                        audio_ext = ext
-                                        break
-                            except Exception:
-                                audio_ext = ".mp3"
+                    files: list[str] = []
+                    sem = asyncio.Semaphore(SLIDE_CONCURRENCY)
 
-                            audio_path = os.path.join(self.download_path, f"sound{audio_ext}")
+                    async def _fetch(url: str, path: str) -> str | None:
+                        async with sem:
                             try:
-                                async with session.get(audio_url, timeout=30) as a_resp:
-                                    if a_resp.status == 200:
-                                        with open(audio_path, "wb") as f:
-                                            f.write(await a_resp.read())
-                                        files.append(audio_path)
+                                await stream_to_file(session, url, path, retries=1)
+                                return path
                             except Exception:
-                                pass
+                                return None
+
+                    session = http_clients.session()
+                    # Best-effort: download attached sound (if present), alongside the slides
+                    audio_task = None
+                    audio_url = _extract_audio_url(data_obj)
+                    if audio_url and isinstance(audio_url, str):
+                        # Some payloads return relative paths
+                        if not audio_url.startswith("http"):
+                            audio_url = f"https://www.tikwm.com{audio_url}" if audio_url.startswith("/") else audio_url
+
+                        audio_ext = ".mp3"
+                        try:
+                            lower = audio_url.lower().split("?", 1)[0]
+                            for ext in (".mp3", ".m4a", ".aac", ".opus", ".ogg"):
+                                if lower.endswith(ext):
+                                    audio_ext = ext
+                                    break
+                        except Exception:
+                            audio_ext = ".mp3"
+
+                        audio_path = os.path.join(self.download_path, f"sound{audio_ext}")
+                        audio_task = asyncio.create_task(_fetch(audio_url, audio_path))
+
+                    slide_tasks = [asyncio.create_task(_fetch(url, path)) for url, path in slide_jobs]
+                    try:
+                        # Slides are fetched in parallel but handed out in order, by album (10 per group):
+                        # the first album can be uploaded while the rest are still downloading.
+                        for chunk_start in range(0, len(slide_tasks), SLIDE_CHUNK):
+                            chunk = [p for p in await asyncio.gather(*slide_tasks[chunk_start:chunk_start + SLIDE_CHUNK]) if p]
+                            files.extend(chunk)
+                            if chunk and self.on_slide_chunk:
+                                try:
+                                    await self.on_slide_chunk(list(chunk), dict(final_meta))
+                                except Exception as e:
+                                    print(f"⚠️ [TikTok API] on_slide_chunk failed: {e}")
+
+                        if audio_task and await audio_task:
+                            files.append(audio_path)
+                    finally:
+                        for task in slide_tasks + ([audio_task] if audio_task else []):
+                            task.cancel()
 
                     if files:
-                        final_meta = {
-                            'title': title,
-                            'artist': author,
-                            'uploader': author,
-                            'track': title,
-                        }
                         return files, self.download_path, None, final_meta
 
                     return None, None, "Video unavailable", None
@@ -196,13 +225,13 @@ class TikTokStrategy(CommonDownloader):
                 if not os.path.exists(self.download_path): os.makedirs(self.download_path)
                 file_path = os.path.join(self.download_path, f"video.mp4")
                 
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(video_url) as vid_resp:
-                        if vid_resp.status == 200:
-                            with open(file_path, 'wb') as f:
-                                f.write(await vid_resp.read())
-                        else:
-                            return None, None, "Failed to download video file", None
+                try:
+                    session = http_clients.session()
+                    await stream_to_file(session, video_url, file_path)
+                except FileTooLarge:
+                    return None, None, "File is too big", None
+                except HttpDownloadError:
+                    return None, None, "Failed to download video file", None
 
                 final_meta = {
                     'title': title, 
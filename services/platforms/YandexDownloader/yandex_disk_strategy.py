@@ -1,9 +1,10 @@
 import os
 import re
-import aiohttp
 from urllib.parse import urlparse
 
 import settings
+from services.http_client import http_clients
+from services.platforms.http_download import stream_to_file, FileTooLarge, HttpDownloadError
 
 
 _INVALID_WIN_CHARS = re.compile(r"[<>:\\/?*\"|]+")
@@ -48,103 +49,89 @@ class YandexDiskPublicStrategy:
     async def download(self, save_path: str):
         os.makedirs(save_path, exist_ok=True)
 
-        connector = aiohttp.TCPConnector(ssl=False)
         headers = {
             "User-Agent": "Mozilla/5.0 (compatible; TelegramBot/1.0)",
         }
 
-        async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
-            # 1) Read metadata (name/size/type) if possible
-            name = None
-            size = None
-            resource_type = None
-            try:
-                params = {"public_key": self.url, "fields": "name,size,type,mime_type"}
-                async with session.get(f"{self.API_BASE}/resources", params=params) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        name = data.get("name")
-                        size = data.get("size")
-                        resource_type = data.get("type")
-            except Exception:
-                pass
-
-            if resource_type == "dir":
-                return None, save_path, "Yandex Disk folder links are not supported", None
-
-            # 2) Get one-time download URL
-            try:
-                async with session.get(f"{self.API_BASE}/resources/download", params={"public_key": self.url}) as resp:
-                    if resp.status != 200:
-                        try:
-                            data = await resp.json()
-                            msg = data.get("message") or data.get("description")
-                        except Exception:
-                            msg = None
-                        return None, save_path, msg or f"Yandex Disk API error: {resp.status}", None
+        session = http_clients.session(verify_ssl=False)
+        # 1) Read metadata (name/size/type) if possible
+        name = None
+        size = None
+        resource_type = None
+        try:
+            params = {"public_key": self.url, "fields": "name,size,type,mime_type"}
+            async with session.get(f"{self.API_BASE}/resources", params=params, headers=headers) as resp:
+                if resp.status == 200:
                     data = await resp.json()
-                    href = data.get("href")
-                    if not href:
-                        return None, save_path, "Yandex Disk: no download link", None
-            except Exception as e:
-                return None, save_path, f"Yandex Disk API request failed: {e}", None
-
-            # 3) Download
-            try:
-                async with session.get(href, allow_redirects=True) as resp:
-                    if resp.status != 200:
-                        return None, save_path, f"Yandex Disk download failed: {resp.status}", None
-
-                    cl = resp.headers.get("Content-Length")
-                    if cl:
-                        try:
-                            if int(cl) > int(getattr(settings, "MAX_FILE_SIZE", 50 * 1024 * 1024)):
-                                return None, save_path, "File is too big", None
-                        except Exception:
-                            pass
-
-                    cd = resp.headers.get("Content-Disposition")
-                    cd_name = _filename_from_cd(cd)
-
-                    filename = _safe_filename(cd_name or name or "yandex_file")
-
-                    # If filename has no extension but original URL has something, keep it.
-                    if "." not in filename:
-                        try:
-                            path = urlparse(self.url).path
-                            tail = os.path.basename(path)
-                            if "." in tail:
-                                filename = _safe_filename(filename + os.path.splitext(tail)[1])
-                        except Exception:
-                            pass
-
-                    out_path = os.path.join(save_path, filename)
-
-                    total = 0
-                    max_size = int(getattr(settings, "MAX_FILE_SIZE", 50 * 1024 * 1024))
-                    with open(out_path, "wb") as f:
-                        async for chunk in resp.content.iter_chunked(1024 * 256):
-                            if not chunk:
-                                continue
-                            total += len(chunk)
-                            if total > max_size:
-                                try:
-                                    f.close()
-                                except Exception:
-                                    pass
-                                try:
-                                    os.remove(out_path)
-                                except Exception:
-                                    pass
-                                return None, save_path, "File is too big", None
-                            f.write(chunk)
-
-                    meta = {
-                        "title": filename,
-                        "uploader": "Yandex Disk",
-                        "extractor": "yandex_disk_public",
-                    }
-                    return [out_path], save_path, None, meta
-
-            except Exception as e:
-                return None, save_path, f"Yandex Disk download error: {e}", None
+                    name = data.get("name")
+                    size = data.get("size")
+                    resource_type = data.get("type")
+        except Exception:
+            pass
+
+        if resource_type == "dir":
+            return None, save_path, "Yandex Disk folder links are not supported", None
+
+        try:
+            if size and int(size) > int(settings.MAX_FILE_SIZE):
+                return None, save_path, "File is too big", None
+        except (TypeError, ValueError):
+            pass
+
+        # 2) Get one-time download URL
+        try:
+            async with session.get(f"{self.API_BASE}/resources/download", params={"public_key": self.url}, headers=headers) as resp:
+                if resp.status != 200:
+                    try:
+                        data = await resp.json()
+                        msg = data.get("message") or data.get("description")
+                    except Exception:
+                        msg = None
+                    return None, save_path, msg or f"Yandex Disk API error: {resp.status}", None
+                data = await resp.json()
+                href = data.get("href")
+                if not href:
+                    return None, save_path, "Yandex Disk: no download link", None
+        except Exception as e:
+            return None, save_path, f"Yandex Disk API request failed: {e}", None
+
+        # 3) Download (streamed into a temp file, renamed once the name is known)
+        part_path = os.path.join(save_path, ".yandex_download.part")
+        try:
+            result = await stream_to_file(session, href, part_path, headers=headers)
+        except FileTooLarge:
+            return None, save_path, "File is too big", None
+        except HttpDownloadError as e:
+            if e.status:
+                return None, save_path, f"Yandex Disk download failed: {e.status}", None
+            return None, save_path, f"Yandex Disk download error: {e}", None
+        except Exception as e:
+            return None, save_path, f"Yandex Disk download error: {e}", None
+
+        try:
+            cd_name = _filename_from_cd(result.headers.get("Content-Disposition"))
+
+            filename = _safe_filename(cd_name or name or "yandex_file")
+
+            # If filename has no extension but original URL has something, keep it.
+            if "." not in filename:
+                try:
+                    path = urlparse(self.url).path
+                    tail = os.path.basename(path)
+                    if "." in tail:
+                        filename = _safe_filename(filename + os.path.splitext(tail)[1])
+                except Exception:
+                    pass
+
+            out_path = os.path.join(save_path, filename)
+            os.replace(part_path, out_path)
+
+            meta = {
+                "title": filename,
+                "uploader": "Yandex Disk",
+                "extractor": "yandex_disk_public",
+            }
+            return [out_path], save_path, None, meta
+
+        except Exception as e:
+            return None, save_path, f"Yandex Disk download error: {e}", None
@@ -1,9 +1,9 @@
 import re
 import html
 import os
-import aiohttp
 from urllib.parse import quote
 from services.platforms.common_downloader import CommonDownloader
+from services.http_client import http_clients
 
 class YandexStrategy(CommonDownloader):
     def get_platform_settings(self) -> dict:
@@ -100,19 +100,19 @@ class YandexStrategy(CommonDownloader):
         # OEmbed обычно публичный, куки не обязательны, но можно передать
         
         try:
-            async with aiohttp.ClientSession(headers=headers, connector=aiohttp.TCPConnector(ssl=False)) as session:
-                async with session.get(oembed_url) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        title = data.get('title')
-                        # Яндекс отдает title в формате "Track — Artist"
-                        if title and " — " in title:
-                            parts = title.split(" — ")
-                            return {'track': parts[0].strip(), 'artist': parts[1].strip()}
-                        elif title:
-                             return {'track': title, 'artist': ''}
-                    else:
-                        print(f"🔸 [Yandex OEmbed] Error: {resp.status}")
+            session = http_clients.session(verify_ssl=False)
+            async with session.get(oembed_url, headers=headers) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    title = data.get('title')
+                    # Яндекс отдает title в формате "Track — Artist"
+                    if title and " — " in title:
+                        parts = title.split(" — ")
+                        return {'track': parts[0].strip(), 'artist': parts[1].strip()}
+                    elif title:
+                         return {'track': title, 'artist': ''}
+                else:
+                    print(f"🔸 [Yandex OEmbed] Error: {resp.status}")
         except Exception as e:
             print(f"🔸 [Yandex OEmbed] Exception: {e}")
         return None
@@ -126,8 +126,9 @@ class YandexStrategy(CommonDownloader):
         cookies = self._get_cookies_dict()
         
         try:
-            async with aiohttp.ClientSession(headers=headers, cookies=cookies, connector=aiohttp.TCPConnector(ssl=False)) as session:
-                async with session.get(self.url) as resp:
+            # Своя cookie jar: редиректы Яндекса ставят куки
+            async with http_clients.cookie_session(verify_ssl=False, cookies=cookies) as session:
+                async with session.get(self.url, headers=headers) as resp:
                     if resp.status != 200: return None
                     text = await resp.text()
 
@@ -1,4 +1,3 @@
-import yt_dlp
 import os
 import shutil
 import uuid
@@ -7,6 +6,8 @@ import re
 import json
 from abc import ABC, abstractmethod
 import settings
+from services.cookie_store import cookie_store
+from services.platforms.ytdlp_pool import ytdlp_pool
 
 class ErrorCaptureLogger:
     def __init__(self):
@@ -87,7 +88,6 @@ class CommonDownloader(ABC):
         ydl_opts.update({
             'outtmpl': f'{self.download_path}/%(id)s.%(ext)s',
             'max_filesize': settings.MAX_FILE_SIZE,
-            'logger': capture_logger,
             'quiet': True,
             'writeinfojson': True, 
             'overwrites': True,
@@ -158,18 +158,13 @@ class CommonDownloader(ABC):
                 os.environ["PATH"] = f"{ffmpeg_dir}{os.pathsep}" + os.environ.get("PATH", "")
 
         if user_cookie_content:
-            cpath = os.path.join(self.download_path, "user.txt")
-            with open(cpath, "w", encoding="utf-8") as f: f.write(user_cookie_content)
-            ydl_opts['cookiefile'] = cpath
+            ydl_opts['cookiefile'] = cookie_store.materialize(user_cookie_content)
         elif os.path.exists("cookies.txt"):
             ydl_opts['cookiefile'] = "cookies.txt"
 
         try:
-            loop = asyncio.get_event_loop()
-            await asyncio.wait_for(
-                loop.run_in_executor(None, lambda: self._run_yt_dlp(ydl_opts)),
-                timeout=120.0
-            )
+            # yt-dlp worker process; on timeout the worker is killed, not left running
+            capture_logger.error_message = await self._run_yt_dlp(ydl_opts)
         except asyncio.TimeoutError:
             self._safe_remove()
             return None, None, "Timeout: Processing took too long", None
@@ -199,11 +194,9 @@ class CommonDownloader(ABC):
 
         return clean_files, self.download_path, None, metadata
 
-    def _run_yt_dlp(self, opts):
-        try:
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                ydl.download([self.url])
-        except Exception: pass
+    async def _run_yt_dlp(self, opts):
+        """Download in a worker process; returns the last yt-dlp error (ErrorCaptureLogger runs there)."""
+        return await ytdlp_pool.run("download", self.url, opts, timeout=120.0)
 
     def _get_files(self):
         found = []
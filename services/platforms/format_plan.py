@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Format planning for download_content: extract once, pick formats, then download.
+
+download_content used to call extract_info(download=True) up to three times with
+different format strings, each call fetching and extracting the page again, and
+found AV1/VP9 or still-image videos only after downloading them. Now the raw info
+(ytdlp_worker.extract_plan) is fetched once, plan_formats() turns its formats into
+an ordered list of format specs, and every attempt downloads from that same info
+(ytdlp_worker.download_info -> process_ie_result).
+
+The planned pick prefers H.264 (avc1) in mp4, fits the estimated size under
+MAX_FILE_SIZE and skips storyboard/still-image variants. It only goes first when
+the caller did not ask for a format itself (keep_format=False); the format from
+opts and the old generic fallbacks follow.
+"""
+from __future__ import annotations
+
+_FALLBACK_SPECS = ("best[ext=mp4]/best", "best")
+# Telegram limit minus room for the container/merge overhead
+_SIZE_MARGIN = 0.95
+
+
+def wants_audio_only(opts: dict) -> bool:
+    fmt = str(opts.get("format") or "")
+    if fmt.startswith("bestaudio") or fmt.startswith("ba"):
+        return True
+    return any((pp or {}).get("key") == "FFmpegExtractAudio" for pp in (opts.get("postprocessors") or []))
+
+
+def _is_video(f: dict) -> bool:
+    vcodec = f.get("vcodec")
+    return bool(vcodec) and vcodec != "none"
+
+
+def _has_audio(f: dict) -> bool:
+    acodec = f.get("acodec")
+    return bool(acodec) and acodec != "none"
+
+
+def _is_avc(f: dict) -> bool:
+    vcodec = str(f.get("vcodec") or "").lower()
+    return vcodec.startswith("avc1") or vcodec.startswith("h264")
+
+
+def _looks_static(f: dict) -> bool:
+    """Storyboards and "image + audio" variants (Instagram) that play as a still picture."""
+    if f.get("ext") == "mhtml" or "storyboard" in str(f.get("format_note") or "").lower():
+        return True
+    fps = f.get("fps")
+    try:
+        return fps is not None and float(fps) < 2
+    except (TypeError, ValueError):
+        return False
+
+
+def _size(f: dict, duration) -> float | None:
+    size = f.get("filesize") or f.get("filesize_approx")
+    if size:
+        return float(size)
+    tbr = f.get("tbr")
+    if tbr and duration:
+        return float(tbr) * 1000 / 8 * float(duration)
+    return None
+
+
+def _rank(f: dict) -> tuple:
+    return (
+        _is_avc(f),
+        f.get("ext") == "mp4",
+        f.get("height") or 0,
+        f.get("tbr") or 0,
+    )
+
+
+def _pick(formats: list[dict], duration, max_size: float) -> list[str]:
+    """Format specs that fit max_size, best first: "video+audio" pairs and progressive formats."""
+    videos = [f for f in formats if _is_video(f) and f.get("format_id") and not _looks_static(f)]
+    if not videos:
+        return []
+
+    audios = [f for f in formats if _has_audio(f) and not _is_video(f) and f.get("format_id")]
+    # m4a/aac merges into mp4 without re-encoding
+    audios.sort(key=lambda a: (a.get("ext") == "m4a", a.get("abr") or a.get("tbr") or 0), reverse=True)
+    audio = audios[0] if audios else None
+    audio_size = (_size(audio, duration) or 0) if audio else 0
+
+    candidates: list[tuple[tuple, str]] = []
+    for f in videos:
+        size = _size(f, duration)
+        if _has_audio(f):
+            total, spec = size, f["format_id"]
+        elif audio is not None:
+            total, spec = (size + audio_size) if size is not None else None, f"{f['format_id']}+{audio['format_id']}"
+        else:
+            continue
+        if total is not None and total > max_size:
+            continue
+        candidates.append((_rank(f), spec))
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    specs: list[str] = []
+    for _, spec in candidates:
+        if spec not in specs:
+            specs.append(spec)
+        if len(specs) >= 2:
+            break
+    return specs
+
+
+def plan_formats(info: dict | None, opts: dict, max_size: int, keep_format: bool = False) -> list[str | None]:
+    """Ordered format specs for the download attempts.
+
+    Planned picks first (unless keep_format), then opts["format"] and the fallbacks.
+    None stands for "opts without a format", i.e. yt-dlp's own default selection.
+    """
+    specs: list[str | None] = []
+    if not keep_format and isinstance(info, dict) and info.get("formats") and not wants_audio_only(opts):
+        try:
+            specs = _pick(list(info["formats"]), info.get("duration"), max_size * _SIZE_MARGIN)
+        except Exception:
+            specs = []
+    for spec in (opts.get("format") or None, *_FALLBACK_SPECS):
+        if spec not in specs:
+            specs.append(spec)
+    return specs
+
+
+def strict_video_spec(exclude: str | None) -> str:
+    """Format for the still-image retry: H.264 video + audio, never the spec that produced the still file."""
+    fmt = "bv*[vcodec^=avc1][ext=mp4]+ba[ext=m4a]/bv*+ba/b"
+    if exclude and "/" not in exclude:
+        video_id = exclude.split("+", 1)[0]
+        fmt = f"bv*[vcodec^=avc1][ext=mp4][format_id!={video_id}]+ba[ext=m4a]/bv*[format_id!={video_id}]+ba/b"
+    return fmt
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Streaming HTTP downloads for the API-based strategies (TikTok, Yandex Disk, ...).
+
+The body goes to disk in fixed-size chunks, so memory per job does not depend on the
+file size. MAX_FILE_SIZE is enforced both on Content-Length and mid-stream. A dropped
+connection or a 5xx is retried; when some bytes are already on disk the retry asks for
+the rest with a Range header and falls back to a full restart if the server ignores it.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+
+import aiohttp
+from multidict import CIMultiDict
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+_RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+_CONTENT_RANGE_TOTAL = re.compile(r"/(\d+)\s*$")
+
+
+class HttpDownloadError(Exception):
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class FileTooLarge(HttpDownloadError):
+    pass
+
+
+class StreamResult:
+    __slots__ = ("path", "size", "status", "headers", "attempts", "resumed")
+
+    def __init__(self, path: str, size: int, status: int, headers: CIMultiDict, attempts: int, resumed: bool):
+        self.path = path
+        self.size = size
+        self.status = status
+        self.headers = headers  # case-insensitive, like resp.headers
+        self.attempts = attempts
+        self.resumed = resumed
+
+
+class _Counters:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.retries = 0
+        self.resumed = 0
+        self.too_large = 0
+        self.failed = 0
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+http_stats = _Counters()
+
+
+def _expected_total(resp: aiohttp.ClientResponse, offset: int) -> int | None:
+    """Full file size from Content-Range (206) or Content-Length (200)."""
+    if resp.status == 206:
+        m = _CONTENT_RANGE_TOTAL.search(resp.headers.get("Content-Range") or "")
+        if m:
+            return int(m.group(1))
+        length = resp.content_length
+        return offset + length if length is not None else None
+    return resp.content_length
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def stream_to_file(
+    session: aiohttp.ClientSession,
+    url: str,
+    path: str,
+    *,
+    max_size: int | None = None,
+    retries: int | None = None,
+    read_timeout: float | None = None,
+    headers: dict | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> StreamResult:
+    """GET url into path. Raises FileTooLarge / HttpDownloadError; a partial file is removed on failure."""
+    max_size = int(settings.MAX_FILE_SIZE if max_size is None else max_size)
+    retries = max(0, int(settings.HTTP_DOWNLOAD_RETRIES if retries is None else retries))
+    read_timeout = float(settings.HTTP_DOWNLOAD_READ_TIMEOUT if read_timeout is None else read_timeout)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=read_timeout)
+
+    written = 0
+    resumed = False
+    last_error: Exception | None = None
+    f = open(path, "wb")
+    try:
+        for attempt in range(1, retries + 2):
+            req_headers = dict(headers or {})
+            if written:
+                req_headers["Range"] = f"bytes={written}-"
+            try:
+                async with session.get(url, headers=req_headers, timeout=timeout, allow_redirects=True) as resp:
+                    if resp.status in _RETRY_STATUSES:
+                        raise HttpDownloadError(f"HTTP {resp.status}", resp.status)
+                    if resp.status not in (200, 206):
+                        http_stats.failed += 1
+                        raise HttpDownloadError(f"HTTP {resp.status}", resp.status)
+                    if resp.status == 206 and written:
+                        resumed = True
+                        http_stats.resumed += 1
+                    elif written:
+                        # Range ignored: the server sends the whole file again.
+                        f.seek(0)
+                        f.truncate()
+                        written = 0
+
+                    total = _expected_total(resp, written)
+                    if total is not None and total > max_size:
+                        raise FileTooLarge(f"File is too big ({total} bytes)")
+
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        if not chunk:
+                            continue
+                        if written + len(chunk) > max_size:
+                            raise FileTooLarge(f"File is too big (>{max_size} bytes)")
+                        f.write(chunk)
+                        written += len(chunk)
+                        http_stats.bytes += len(chunk)
+
+                    if total is not None and written < total:
+                        raise aiohttp.ClientPayloadError(f"connection closed at {written}/{total} bytes")
+
+                    http_stats.files += 1
+                    return StreamResult(path, written, resp.status, resp.headers.copy(), attempt, resumed)
+            except FileTooLarge:
+                http_stats.too_large += 1
+                raise
+            except HttpDownloadError as e:
+                if e.status not in _RETRY_STATUSES:
+                    raise
+                last_error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = e
+
+            if attempt <= retries:
+                http_stats.retries += 1
+                logger.info(f"download retry {attempt}/{retries} at {written} bytes: {last_error!r}")
+                await asyncio.sleep(min(1.0 * attempt, 5.0))
+
+        http_stats.failed += 1
+        raise HttpDownloadError(f"Download failed: {last_error}") from last_error
+    except BaseException:
+        f.close()
+        _remove(path)
+        raise
+    finally:
+        if not f.closed:
+            f.close()
+
+
+async def read_limited(resp: aiohttp.ClientResponse, max_bytes: int) -> bytes:
+    """Body of a small response (HTML/JSON page) with a hard cap instead of an unbounded read()."""
+    buf = bytearray()
+    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise FileTooLarge(f"Response is larger than {max_bytes} bytes")
+    return bytes(buf)
@@ -4,13 +4,18 @@ import shutil
 import uuid
 import logging
 import re
-import asyncio
-import yt_dlp
-from services.database.repo import get_user_cookie, get_global_cookie
+from core.download_scheduler import LANE_CHAT, download_scheduler
+from services.cookie_store import cookie_store
 from services.odesli_service import get_links_by_url
+from services.platforms.single_flight import download_flights
+from services.platforms.ytdlp_pool import ytdlp_pool
+from services.platforms.format_plan import plan_formats, strict_video_spec
+import settings
+from services.url_cleaner import clean_url
 import subprocess
 import json
 import shutil
+import hashlib
 
 logger = logging.getLogger(__name__)
 # URL patterns for different platforms
@@ -37,16 +42,104 @@ def is_valid_url(text):
             return True
     return False
 
-async def download_content(url, custom_opts=None, user_id=None):
-    """Download content from URL using yt-dlp"""
+def platform_for_url(url: str) -> str:
+    """Scheduler key (see core.download_scheduler): first matching URL_PATTERNS name, else "other"."""
+    for platform, pattern in URL_PATTERNS.items():
+        if url and re.search(pattern, url):
+            return platform
+    return "other"
+
+
+def cookie_service_for_url(url: str) -> str:
+    """Cookie platform key (user/global cookies tables) for a download URL."""
+    url = url or ""
+    if "tiktok" in url:
+        return "tiktok"
+    if "instagram" in url:
+        return "instagram"
+    if "vk" in url:
+        return "vk"
+    if "twitch" in url:
+        return "twitch"
+    if "soundcloud" in url:
+        return "soundcloud"
+    if "spotify" in url:
+        return "spotify"
+    return "youtube"
+
+
+# yt-dlp options that change the produced file (and therefore its Telegram file_id)
+_PROFILE_KEYS = ("format", "merge_output_format", "postprocessors", "remuxvideo", "keepvideo", "writethumbnail")
+
+
+def options_profile(custom_opts: dict | None) -> str:
+    """Short stable id of the download options, used as cache/dedup key part."""
+    data = {k: custom_opts.get(k) for k in _PROFILE_KEYS if custom_opts and k in custom_opts}
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+async def download_content(url, custom_opts=None, user_id=None, lane=LANE_CHAT, on_queue_position=None, on_slide_chunk=None):
+    """Download content from URL using yt-dlp.
+
+    Concurrent calls for the same cleaned URL + options profile share one download
+    (see single_flight); each caller still gets its own folder to clean up.
+    Users with personal cookies never share downloads with others.
+    The shared download waits for a download_scheduler slot (lane = priority,
+    on_queue_position(pos) is awaited while it is queued).
+    on_slide_chunk(paths, meta) gets TikTok carousel albums as they are ready (only when
+    this call starts the download; coalesced callers just get the full result). It runs
+    inside the scheduler slot, so it should only hand the album off (e.g. to a task).
+    """
+    try:
+        key_url = clean_url(url or "")
+    except Exception:
+        key_url = url or ""
+    scope = "nocookies"
+    if custom_opts and custom_opts.get('user_cookie_content'):
+        scope = "inline:" + hashlib.sha1(str(custom_opts['user_cookie_content']).encode("utf-8")).hexdigest()[:16]
+    elif user_id:
+        scope = "global"
+        try:
+            if await cookie_store.has_personal_cookies(user_id):
+                scope = f"user:{user_id}"
+        except Exception:
+            scope = f"user:{user_id}"
+    key = (key_url, options_profile(custom_opts), scope)
+    return await download_flights.run(
+        key,
+        lambda: download_scheduler.run(
+            platform_for_url(url),
+            user_id,
+            lambda: _download_content(url, custom_opts, user_id, on_slide_chunk=on_slide_chunk),
+            lane=lane,
+            on_position=on_queue_position,
+        ),
+    )
+
+
+def _clear_folder(path: str) -> None:
+    """Drop partial files of a failed attempt before the next one."""
+    for root, _, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                os.remove(os.path.join(root, fn))
+            except Exception:
+                pass
+
+
+async def _download_content(url, custom_opts=None, user_id=None, on_slide_chunk=None):
     original_url = url
+    # Raw cookie text from handlers is not a yt-dlp option.
+    custom_opts = dict(custom_opts or {})
+    inline_cookies = custom_opts.pop('user_cookie_content', None)
 
     # TikTok: prefer API-based strategy (fixes yt-dlp "Unsupported URL" for /photo/)
     try:
         if url and re.search(URL_PATTERNS.get('tiktok', r'$^'), url):
             from services.platforms.TikTokDownloader.tiktok_strategy import TikTokStrategy
 
-            strategy = TikTokStrategy(url)
+            strategy = TikTokStrategy(url, on_slide_chunk=on_slide_chunk)
             files, folder, error, meta = await strategy.download()
             if files:
                 return files, folder, None, meta or {}
@@ -110,35 +203,16 @@ async def download_content(url, custom_opts=None, user_id=None):
     os.makedirs(save_path, exist_ok=True)
 
     cookie_path = None
-    
-    # Try to get cookies from database
-    if user_id:
-        # Determine service from URL
-        service = "youtube"
-        if "tiktok" in url:
-            service = "tiktok"
-        elif "instagram" in url:
-            service = "instagram"
-        elif "vk" in url:
-            service = "vk"
-        elif "twitch" in url:
-            service = "twitch"
-        elif "soundcloud" in url:
-            service = "soundcloud"
-        elif "spotify" in url:
-            service = "spotify"
-        
-        # Try user cookies first
-        cookie_data = await get_user_cookie(user_id, service)
-        
-        # If no user cookies, try global cookies
-        if not cookie_data:
-            cookie_data = await get_global_cookie(service)
-        
-        if cookie_data:
-            cookie_path = os.path.join(save_path, "cookies.txt")
-            with open(cookie_path, "w", encoding="utf-8") as f:
-                f.write(cookie_data)
+
+    # User cookies first, then global ones (memoized content-addressed file, see cookie_store)
+    try:
+        if inline_cookies:
+            cookie_path = cookie_store.materialize(str(inline_cookies))
+        elif user_id:
+            cookie_path, _ = await cookie_store.resolve(user_id, cookie_service_for_url(url))
+    except Exception as e:
+        logger.warning(f"Cookie lookup failed for {url}: {e}")
+        cookie_path = None
 
     ydl_opts = {
         'outtmpl': os.path.join(save_path, '%(title)s.%(ext)s'),
@@ -214,14 +288,26 @@ async def download_content(url, custom_opts=None, user_id=None):
     error = None
     files = []
 
-    # Base attempts: retry with fallback formats for cases where merging is required
-    base_attempts = [
-        dict(ydl_opts),
-        {**ydl_opts, 'format': 'best[ext=mp4]/best'},
-        {**ydl_opts, 'format': 'best'},
-    ]
-
-    attempts = base_attempts
+    # Extract once, then try the planned formats (see format_plan) against the same info.
+    # No plan (playlist, lazy entries, extraction error) -> old way: extract_info(download=True) per attempt.
+    plan_info = None
+    plan_failed = False
+    try:
+        plan_info = await ytdlp_pool.run("extract_plan", url, ydl_opts)
+    except Exception as e:
+        plan_failed = True
+        logger.warning(f"Error extracting {url}, downloading without a plan: {e}")
+    keep_format = bool(custom_opts and custom_opts.get('format'))
+    specs = plan_formats(plan_info, ydl_opts, settings.MAX_FILE_SIZE, keep_format=keep_format)
+    if plan_failed:
+        # Extraction itself failed: one more full try is enough (private/removed videos fail the same way)
+        specs = specs[:1]
+    used_spec = None
+
+    async def _run_attempt(opts: dict):
+        if plan_info:
+            return await ytdlp_pool.run("download_info", plan_info, opts)
+        return await ytdlp_pool.run("extract_info", url, opts, download=True)
 
     def _find_ffprobe() -> str | None:
         try:
@@ -364,20 +450,19 @@ async def download_content(url, custom_opts=None, user_id=None):
             return False
         return False
 
-    def _extract_sync(opts: dict):
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            return ydl.extract_info(url, download=True)
-
-    for idx, opts in enumerate(attempts, start=1):
+    for idx, spec in enumerate(specs, start=1):
         try:
-            info = await asyncio.to_thread(_extract_sync, opts)
+            # Runs in a yt-dlp worker process; the worker makes the private cookiefile copy.
+            info = await _run_attempt({**ydl_opts, 'format': spec} if spec else ydl_opts)
             meta = info
-            logger.info(f"Successfully downloaded from: {url} (attempt {idx})")
+            used_spec = spec
+            logger.info(f"Successfully downloaded from: {url} (attempt {idx}, format {spec})")
             error = None
             break
         except Exception as e:
             error = str(e)
-            logger.error(f"Error downloading {url} (attempt {idx}): {error}")
+            logger.error(f"Error downloading {url} (attempt {idx}, format {spec}): {error}")
+            _clear_folder(save_path)
 
     # TikTok: normalize common private/blocked/deleted errors.
     if error and original_url and re.search(URL_PATTERNS.get('tiktok', r'$^'), original_url):
@@ -390,7 +475,7 @@ async def download_content(url, custom_opts=None, user_id=None):
             try:
                 from services.platforms.TikTokDownloader.tiktok_strategy import TikTokStrategy
 
-                strategy = TikTokStrategy(original_url)
+                strategy = TikTokStrategy(original_url, on_slide_chunk=on_slide_chunk)
                 s_files, s_folder, s_error, s_meta = await strategy.download()
                 if s_files:
                     return s_files, s_folder, None, s_meta or {}
@@ -412,18 +497,13 @@ async def download_content(url, custom_opts=None, user_id=None):
         if maybe_video and _looks_like_static_video(maybe_video):
             logger.warning("Instagram download looks static; retrying with stricter format selection")
             try:
-                # Clean folder and retry
-                for root, _, filenames in os.walk(save_path):
-                    for fn in filenames:
-                        try:
-                            os.remove(os.path.join(root, fn))
-                        except Exception:
-                            pass
+                # Clean folder and retry (from the same extracted info when there is one)
+                _clear_folder(save_path)
                 retry_opts = dict(ydl_opts)
-                retry_opts['format'] = 'bv*[vcodec^=avc1][ext=mp4]+ba[ext=m4a]/bv*+ba/b'
+                retry_opts['format'] = strict_video_spec(used_spec)
                 retry_opts['merge_output_format'] = 'mp4'
                 retry_opts['remuxvideo'] = 'mp4'
-                info = await asyncio.to_thread(_extract_sync, retry_opts)
+                info = await _run_attempt(retry_opts)
                 meta = info
                 error = None
 
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Single-flight registry for download_content.
+
+Concurrent requests for the same (cleaned URL, options profile, cookie scope)
+share ONE download. When it finishes every waiter gets its own tempfiles/<uuid>
+folder (hard links, copy as fallback), so handlers keep cleaning up their
+folder with shutil.rmtree exactly as before.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from typing import Awaitable, Callable
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except Exception:
+        shutil.copy2(src, dst)
+
+
+def _clone_result(result: tuple) -> tuple:
+    """Give a waiter a private copy of (files, folder, error, meta)."""
+    files, folder, error, meta = result
+    meta_copy = dict(meta) if isinstance(meta, dict) else meta
+    if not folder or not os.path.isdir(folder):
+        return list(files or []), folder, error, meta_copy
+
+    new_folder = os.path.join(settings.TEMP_DIR, str(uuid.uuid4()))
+    src_root = os.path.abspath(folder)
+    for root, _, filenames in os.walk(folder):
+        rel = os.path.relpath(root, folder)
+        dst_root = new_folder if rel == "." else os.path.join(new_folder, rel)
+        os.makedirs(dst_root, exist_ok=True)
+        for fn in filenames:
+            _link_or_copy(os.path.join(root, fn), os.path.join(dst_root, fn))
+    os.makedirs(new_folder, exist_ok=True)
+
+    new_files = []
+    for f in files or []:
+        try:
+            abs_f = os.path.abspath(f)
+            if abs_f.startswith(src_root + os.sep):
+                new_files.append(os.path.join(new_folder, os.path.relpath(abs_f, src_root)))
+            else:
+                new_files.append(f)
+        except Exception:
+            new_files.append(f)
+    return new_files, new_folder, error, meta_copy
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class DownloadSingleFlight:
+    def __init__(self):
+        self._flights: dict[tuple, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self._flights)}
+
+    async def run(self, key: tuple, factory: Callable[[], Awaitable[tuple]]) -> tuple:
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.create_task(factory())
+            flight = _Flight(task)
+            self._flights[key] = flight
+            self.started += 1
+            task.add_done_callback(lambda _t, k=key, f=flight: self._forget(k, f))
+        else:
+            self.coalesced += 1
+            logger.info(f"Download coalesced with in-flight request: {key[0]}")
+        flight.waiters += 1
+
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            flight.waiters -= 1
+            if flight.task.done():
+                self._release_if_last(flight)
+            elif flight.waiters <= 0:
+                # Nobody is interested anymore.
+                flight.task.cancel()
+            raise
+        except Exception:
+            flight.waiters -= 1
+            raise
+
+        flight.waiters -= 1
+        if flight.waiters <= 0:
+            # Last consumer takes the original folder.
+            return result
+        try:
+            # Linking/copying every file is blocking disk I/O: keep it off the event loop.
+            return await asyncio.to_thread(_clone_result, result)
+        except Exception as e:
+            logger.warning(f"Failed to clone shared download result: {e}")
+            return [], None, str(e), {}
+
+    def _forget(self, key: tuple, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            self._flights.pop(key, None)
+
+    @staticmethod
+    def _release_if_last(flight: _Flight) -> None:
+        if flight.waiters > 0 or flight.task.cancelled() or flight.task.exception() is not None:
+            return
+        try:
+            folder = flight.task.result()[1]
+            if folder and os.path.isdir(folder):
+                shutil.rmtree(folder, ignore_errors=True)
+        except Exception:
+            pass
+
+
+download_flights = DownloadSingleFlight()
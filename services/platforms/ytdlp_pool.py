@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""Pool of yt-dlp worker processes.
+
+yt-dlp is mostly pure-Python CPU work (extraction, signature JS, JSON). In the
+default thread pool concurrent jobs fight the bot's event loop for the GIL; here
+each job runs in a separate long-lived process (ytdlp_worker) that keeps yt_dlp and
+its extractors imported between jobs.
+
+- YTDLP_POOL_SIZE workers at most, started on demand (YTDLP_POOL_WARM at startup);
+- a job that exceeds its timeout or whose caller is cancelled kills its worker,
+  together with the ffmpeg/ffprobe it started (each worker is its own process group);
+- a worker is recycled after YTDLP_WORKER_MAX_JOBS jobs.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import pickle
+import signal
+import struct
+import sys
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class YtdlpJobError(Exception):
+    """Exception raised inside the worker; str() is the original message."""
+
+    def __init__(self, exc_type: str, message: str):
+        super().__init__(message)
+        self.exc_type = exc_type
+
+
+class YtdlpJobTimeout(asyncio.TimeoutError):
+    pass
+
+
+class _Worker:
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+        self.jobs = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def _read(self):
+        header = await self.proc.stdout.readexactly(_HEADER.size)
+        (size,) = _HEADER.unpack(header)
+        return pickle.loads(await self.proc.stdout.readexactly(size))
+
+    async def wait_ready(self) -> None:
+        frame = await self._read()
+        if not (isinstance(frame, tuple) and frame and frame[0] == "ready"):
+            raise RuntimeError(f"unexpected worker hello: {frame!r}")
+
+    async def call(self, name: str, args: tuple, kwargs: dict):
+        data = pickle.dumps((name, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+        self.proc.stdin.write(_HEADER.pack(len(data)) + data)
+        await self.proc.stdin.drain()
+        self.jobs += 1
+        response = await self._read()
+        if response[0] == "ok":
+            return response[1]
+        raise YtdlpJobError(response[1], response[2])
+
+    async def kill(self) -> None:
+        # The whole group: ffmpeg merges/remuxes would otherwise outlive the worker.
+        # Even if the worker already exited, its children may still be running.
+        try:
+            if os.name == "posix":
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            elif self.alive:
+                self.proc.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            await asyncio.wait_for(self.proc.wait(), timeout=5)
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        """Graceful stop: EOF on stdin ends the worker loop."""
+        if not self.alive:
+            return
+        try:
+            self.proc.stdin.close()
+            await asyncio.wait_for(self.proc.wait(), timeout=5)
+        except Exception:
+            await self.kill()
+
+
+class YtdlpPool:
+    def __init__(self, size: int, job_timeout: float, max_jobs_per_worker: int = 100):
+        self.size = max(1, int(size))
+        self.job_timeout = float(job_timeout)
+        self.max_jobs_per_worker = max(1, int(max_jobs_per_worker))
+        self._idle: list[_Worker] = []
+        self._workers: set[_Worker] = set()
+        self._slots: asyncio.Semaphore | None = None
+        self._warm_task: asyncio.Task | None = None
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+        self.killed = 0
+
+    def _sem(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        return self._slots
+
+    async def _spawn(self) -> _Worker:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = _BASE_DIR + (os.pathsep + env["PYTHONPATH"] if env.get("PYTHONPATH") else "")
+        env.setdefault("PYTHONIOENCODING", "utf-8")
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "services.platforms.ytdlp_worker",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=env,
+            # Relative paths in yt-dlp opts (downloads/, tempfiles/, cookies.txt) resolve like in the bot.
+            cwd=os.getcwd(),
+            limit=2**20,
+            # Own session/process group so kill() reaches ffmpeg too (ignored on Windows)
+            start_new_session=True,
+        )
+        worker = _Worker(proc)
+        try:
+            await asyncio.wait_for(worker.wait_ready(), timeout=60)
+        except BaseException:
+            await worker.kill()
+            raise
+        self._workers.add(worker)
+        logger.info(f"yt-dlp worker started (pid {proc.pid})")
+        return worker
+
+    async def _acquire(self) -> _Worker:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.alive:
+                return worker
+            self._workers.discard(worker)
+        return await self._spawn()
+
+    async def _release(self, worker: _Worker, reusable: bool) -> None:
+        if reusable and worker.alive and not self._closed and worker.jobs < self.max_jobs_per_worker:
+            self._idle.append(worker)
+            return
+        self._workers.discard(worker)
+        if worker.alive:
+            await worker.close()
+
+    async def run(self, name: str, *args, timeout: float | None = None, **kwargs):
+        """Run ytdlp_worker.JOBS[name](*args, **kwargs) in a worker process."""
+        if self._closed:
+            raise RuntimeError("yt-dlp pool is closed")
+        timeout = self.job_timeout if timeout is None else timeout
+        async with self._sem():
+            worker = await self._acquire()
+            reusable = False
+            try:
+                result = await asyncio.wait_for(worker.call(name, args, kwargs), timeout=timeout if timeout > 0 else None)
+                reusable = True
+                self.completed += 1
+                return result
+            except YtdlpJobError:
+                reusable = True
+                self.failed += 1
+                raise
+            except asyncio.TimeoutError:
+                self.killed += 1
+                await worker.kill()
+                raise YtdlpJobTimeout(f"yt-dlp job '{name}' timed out after {timeout:.0f}s")
+            except BaseException:
+                # Cancelled caller or a broken pipe: the worker state is unknown, kill it.
+                self.killed += 1
+                await worker.kill()
+                raise
+            finally:
+                await self._release(worker, reusable)
+
+    def start(self, warm: int = 0) -> None:
+        """Pre-spawn `warm` workers in the background so the first jobs don't pay the yt_dlp import."""
+        self._closed = False
+        if warm > 0 and (self._warm_task is None or self._warm_task.done()):
+            self._warm_task = asyncio.create_task(self._warm(min(int(warm), self.size)))
+
+    async def _warm(self, count: int) -> None:
+        for _ in range(count):
+            async with self._sem():
+                if self._closed or len(self._workers) >= count:
+                    return
+                try:
+                    self._idle.append(await self._spawn())
+                except Exception as e:
+                    logger.warning(f"yt-dlp worker warm-up failed: {e}")
+                    return
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+        workers = list(self._workers)
+        self._idle.clear()
+        self._workers.clear()
+        await asyncio.gather(*(w.close() for w in workers), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "workers": len(self._workers),
+            "idle": len(self._idle),
+            "completed": self.completed,
+            "failed": self.failed,
+            "killed": self.killed,
+        }
+
+
+ytdlp_pool = YtdlpPool(
+    size=settings.YTDLP_POOL_SIZE,
+    job_timeout=settings.YTDLP_JOB_TIMEOUT,
+    max_jobs_per_worker=settings.YTDLP_WORKER_MAX_JOBS,
+)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""yt-dlp worker process (see ytdlp_pool). Started as `python -m services.platforms.ytdlp_worker`.
+
+Protocol on stdin/stdout: 4-byte big-endian length + pickle.
+  request:  (job_name, args, kwargs)
+  response: ("ok", result) | ("err", exc_type_name, message)
+The process is reused for many jobs, so yt_dlp and its extractor classes are imported once.
+Everything yt-dlp/ffmpeg print goes to stderr; stdout carries only frames.
+"""
+from __future__ import annotations
+
+import os
+import pickle
+import struct
+import sys
+
+_HEADER = struct.Struct(">I")
+
+
+def read_frame(stream):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (size,) = _HEADER.unpack(header)
+    return pickle.loads(stream.read(size))
+
+
+def write_frame(stream, obj) -> None:
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+class _ErrorCaptureLogger:
+    """Same role as common_downloader.ErrorCaptureLogger: keep the last yt-dlp error."""
+
+    def __init__(self):
+        self.error_message = None
+
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        self.error_message = msg
+        print(f"[YT-DLP ERROR] {msg}", file=sys.stderr)
+
+
+def _ydl(opts: dict):
+    import yt_dlp
+    from services.cookie_store import cookie_store
+
+    # Store-managed cookie files become a private in-memory copy (yt-dlp writes the jar back on close).
+    return yt_dlp.YoutubeDL(cookie_store.with_private_cookiefile(opts))
+
+
+# === JOBS ===
+
+def extract_info(url: str, opts: dict, download: bool = False):
+    with _ydl(opts) as ydl:
+        info = ydl.extract_info(url, download=download)
+        return ydl.sanitize_info(info) if info else info
+
+
+def extract_plan(url: str, opts: dict) -> dict | None:
+    """Raw extractor result (extract_info(process=False)) for download_info, or None if it can't be reused.
+
+    Not sanitized: sanitize_info would repr() generators and other non-JSON values and
+    process_ie_result would get a broken dict. Only single videos with formats are
+    returned; playlists/url results (lazy entries) and anything that doesn't pickle
+    make the caller fall back to plain extract_info(download=True).
+    """
+    with _ydl(opts) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+    if not isinstance(info, dict) or info.get("_type", "video") != "video" or not info.get("formats"):
+        return None
+    try:
+        pickle.dumps(info, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    return info
+
+
+def download_info(info: dict, opts: dict):
+    """Download from an info dict returned by extract_plan (no second page fetch), like --load-info-json."""
+    with _ydl(opts) as ydl:
+        result = ydl.process_ie_result(info, download=True)
+        return ydl.sanitize_info(result) if result else result
+
+
+def download(url: str, opts: dict) -> str | None:
+    """ydl.download() with errors swallowed; returns the last error yt-dlp logged."""
+    capture = _ErrorCaptureLogger()
+    try:
+        with _ydl({**opts, "logger": capture}) as ydl:
+            ydl.download([url])
+    except Exception as e:
+        return capture.error_message or str(e)
+    return capture.error_message
+
+
+def search(query: str, opts: dict) -> list:
+    with _ydl(opts) as ydl:
+        try:
+            info = ydl.extract_info(query, download=False)
+        except Exception:
+            return []
+        if not info or "entries" not in info:
+            return []
+        return [ydl.sanitize_info(e) if e else e for e in (info.get("entries") or [])]
+
+
+JOBS = {
+    "extract_info": extract_info,
+    "extract_plan": extract_plan,
+    "download_info": download_info,
+    "download": download,
+    "search": search,
+}
+
+
+def _warm_up() -> None:
+    try:
+        import yt_dlp  # noqa: F401
+        from yt_dlp.extractor import gen_extractor_classes
+
+        gen_extractor_classes()
+    except Exception:
+        pass
+
+
+def main() -> None:
+    # Frames go to the original stdout; fd 1 (and sys.stdout) now point at stderr so
+    # prints from yt-dlp, our code and child ffmpeg processes can't corrupt the channel.
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    inp = sys.stdin.buffer
+
+    _warm_up()
+    write_frame(out, ("ready", os.getpid()))
+
+    while True:
+        try:
+            request = read_frame(inp)
+        except Exception:
+            return
+        if request is None:
+            return
+        name, args, kwargs = request
+        try:
+            result = JOBS[name](*args, **kwargs)
+            response = ("ok", result)
+        except BaseException as e:  # noqa: BLE001 - everything goes back to the parent
+            response = ("err", type(e).__name__, str(e))
+        try:
+            write_frame(out, response)
+        except Exception as e:
+            write_frame(out, ("err", type(e).__name__, f"unpicklable result: {e}"))
+
+
+if __name__ == "__main__":
+    main()
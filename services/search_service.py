@@ -1,5 +1,4 @@
-import asyncio
-import yt_dlp
+from services.platforms.ytdlp_pool import ytdlp_pool
 
 
 def _norm_duration(seconds: int | None) -> str:
@@ -46,18 +45,10 @@ async def _run_ytdlp_search(query: str, engine: str, limit: int):
         'no_warnings': True,
     }
 
-    def _search():
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                info = ydl.extract_info(search_query, download=False)
-                if not info: return []
-                if 'entries' in info: return info['entries']
-                return []
-            except Exception:
-                return []
-
-    loop = asyncio.get_event_loop()
-    raw_results = await loop.run_in_executor(None, _search)
+    try:
+        raw_results = await ytdlp_pool.run("search", search_query, ydl_opts, timeout=60.0)
+    except Exception:
+        raw_results = []
     
     clean = []
     if raw_results:
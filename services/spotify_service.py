@@ -3,9 +3,8 @@ import base64
 import logging
 from datetime import datetime, timedelta
 
-import aiohttp
-
 from core.config import config
+from services.http_client import http_clients
 from services.database.repo import get_user_oauth_token, upsert_user_oauth_token
 
 logger = logging.getLogger(__name__)
@@ -30,12 +29,12 @@ async def _refresh_spotify_token(user_id: int) -> str | None:
         "refresh_token": tok.refresh_token,
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(token_url, data=data, headers=headers, timeout=20) as resp:
-            payload = await resp.json(content_type=None)
-            if resp.status >= 400:
-                logger.error("Spotify refresh failed: %s %s", resp.status, payload)
-                return None
+    session = http_clients.session()
+    async with session.post(token_url, data=data, headers=headers, timeout=20) as resp:
+        payload = await resp.json(content_type=None)
+        if resp.status >= 400:
+            logger.error("Spotify refresh failed: %s %s", resp.status, payload)
+            return None
 
     access_token = (payload.get("access_token") or "").strip()
     if not access_token:
@@ -85,16 +84,16 @@ async def spotify_get_json(user_id: int, url: str, params: dict | None = None) -
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers, params=params, timeout=20) as resp:
-            if resp.status == 204:
-                return {"status": 204, "data": None}
-            try:
-                payload = await resp.json(content_type=None)
-            except Exception:
-                payload = {"status": resp.status, "text": await resp.text()}
+    session = http_clients.session()
+    async with session.get(url, headers=headers, params=params, timeout=20) as resp:
+        if resp.status == 204:
+            return {"status": 204, "data": None}
+        try:
+            payload = await resp.json(content_type=None)
+        except Exception:
+            payload = {"status": resp.status, "text": await resp.text()}
 
-            return {"status": resp.status, "data": payload}
+        return {"status": resp.status, "data": payload}
 
 
 async def spotify_dump_all(user_id: int) -> dict:
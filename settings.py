@@ -61,6 +61,67 @@ DISCORD_LOG_THREAD_ID_TEST = _env_int("DISCORD_LOG_THREAD_ID_TEST", 0)
 
 MAX_FILE_SIZE = 2000 * 1024 * 1024 if USE_LOCAL_SERVER else 50 * 1024 * 1024
 
+# Cross-user content cache (url + media type + format profile -> file_id). Off by default.
+SHARED_MEDIA_CACHE = os.getenv("SHARED_MEDIA_CACHE", "False").lower() in ("true", "1", "yes")
+
+# In-memory hot tier in front of media_cache lookups
+MEDIA_CACHE_HOT_SIZE = _env_int("MEDIA_CACHE_HOT_SIZE", 4096)
+MEDIA_CACHE_HOT_TTL = _env_int("MEDIA_CACHE_HOT_TTL", 600)
+
+# Process cache of system_settings (module toggles, placeholders, ...): reload interval, 0 = never
+SYSTEM_SETTINGS_CACHE_TTL = _env_int("SYSTEM_SETTINGS_CACHE_TTL", 30)
+
+# /status user counters: full re-aggregation interval, seconds
+USER_STATS_RESYNC_SECONDS = _env_int("USER_STATS_RESYNC_SECONDS", 300)
+
+# Memoized cookie resolution for downloads (services/cookie_store.py), seconds
+COOKIE_CACHE_TTL = _env_int("COOKIE_CACHE_TTL", 600)
+
+# Write-behind for last_seen / request_count / is_active (services/database/write_behind.py)
+ACTIVITY_FLUSH_INTERVAL_MS = _env_int("ACTIVITY_FLUSH_INTERVAL_MS", 2000)
+ACTIVITY_FLUSH_MAX_ENTRIES = _env_int("ACTIVITY_FLUSH_MAX_ENTRIES", 500)
+
+# Background writer for user_requests history (services/database/write_behind.py)
+HISTORY_FLUSH_INTERVAL_MS = _env_int("HISTORY_FLUSH_INTERVAL_MS", 1000)
+HISTORY_BATCH_SIZE = _env_int("HISTORY_BATCH_SIZE", 200)
+HISTORY_QUEUE_MAX = _env_int("HISTORY_QUEUE_MAX", 5000)
+
+# Nightly DB maintenance (services/database/maintenance.py). Retention 0 = keep forever.
+DB_MAINTENANCE_DAILY_AT = (os.getenv("DB_MAINTENANCE_DAILY_AT") or "04:30").strip()
+USER_REQUESTS_RETENTION_DAYS = _env_int("USER_REQUESTS_RETENTION_DAYS", 180)
+DB_MAINTENANCE_BATCH = _env_int("DB_MAINTENANCE_BATCH", 2000)
+# Free pages above this size trigger a one-time VACUUM into auto_vacuum=INCREMENTAL
+DB_VACUUM_MIN_FREE_MB = _env_int("DB_VACUUM_MIN_FREE_MB", 32)
+
+# yt-dlp worker processes (services/platforms/ytdlp_pool.py). Job timeout 0 = none.
+YTDLP_POOL_SIZE = _env_int("YTDLP_POOL_SIZE", min(4, os.cpu_count() or 2))
+YTDLP_POOL_WARM = _env_int("YTDLP_POOL_WARM", 1)
+YTDLP_JOB_TIMEOUT = _env_int("YTDLP_JOB_TIMEOUT", 900)
+YTDLP_WORKER_MAX_JOBS = _env_int("YTDLP_WORKER_MAX_JOBS", 100)
+
+# Global download scheduler (core/download_scheduler.py): total cap and per-platform caps
+DOWNLOAD_GLOBAL_LIMIT = _env_int("DOWNLOAD_GLOBAL_LIMIT", 6)
+DOWNLOAD_PLATFORM_LIMITS = (os.getenv("DOWNLOAD_PLATFORM_LIMITS") or "youtube=3,tiktok=2,instagram=2,vk=2").strip()
+
+# Shared outbound HTTP sessions (services/http_client.py): pool size, per-host cap, DNS cache TTL in s
+HTTP_POOL_LIMIT = _env_int("HTTP_POOL_LIMIT", 100)
+HTTP_POOL_PER_HOST = _env_int("HTTP_POOL_PER_HOST", 10)
+HTTP_DNS_TTL = _env_int("HTTP_DNS_TTL", 300)
+
+# song.link lookups (services/odesli_service.py): cache TTLs in s, API rate limit, max wait for a token in s
+ODESLI_CACHE_TTL = _env_int("ODESLI_CACHE_TTL", 7 * 24 * 3600)
+ODESLI_NEGATIVE_TTL = _env_int("ODESLI_NEGATIVE_TTL", 600)
+ODESLI_MEMORY_CACHE_SIZE = _env_int("ODESLI_MEMORY_CACHE_SIZE", 2000)
+ODESLI_RATE_PER_MINUTE = _env_int("ODESLI_RATE_PER_MINUTE", 10)
+ODESLI_MAX_WAIT = _env_int("ODESLI_MAX_WAIT", 3)
+
+# Streaming HTTP downloads (services/platforms/http_download.py): retries with Range resume, read timeout in s
+HTTP_DOWNLOAD_RETRIES = _env_int("HTTP_DOWNLOAD_RETRIES", 3)
+HTTP_DOWNLOAD_READ_TIMEOUT = _env_int("HTTP_DOWNLOAD_READ_TIMEOUT", 30)
+
+# Per-user serial queue (core/queue_manager.py): tasks one user may have queued at once
+USER_QUEUE_MAX_PENDING = _env_int("USER_QUEUE_MAX_PENDING", 5)
+
 # Все доступные платформы
 MODULES_LIST = [
     "AppleMusic",